@@ -0,0 +1,39 @@
+# -*- coding: utf-8 -*-
+"""
+Performance benchmarks for the parsers and input writers of the plugin.
+
+Each entry point is run in a fresh child process, so that the peak
+memory reported belongs to that call only.
+"""
+
+
+def _measure(func, args):
+    import resource
+    import time
+
+    rss0 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    t0 = time.time()
+    func(*args)
+    elapsed = time.time() - t0
+    rss1 = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+    # ru_maxrss is given in kB on Linux
+    return elapsed, (rss1 - rss0) / 1024.0
+
+
+def profile(func, *args):
+    """
+    Runs func(*args) in a child process.
+
+    :param func: a module-level function (it has to be picklable)
+    :return: a tuple (wall time in seconds, increase of the peak
+        resident memory in MB)
+    """
+    import multiprocessing
+
+    pool = multiprocessing.Pool(processes=1)
+    try:
+        return pool.apply(_measure, (func, args))
+    finally:
+        pool.close()
+        pool.join()
@@ -0,0 +1,83 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the reader of band-structure files with the element-by-element
+loop it replaced, for files of increasing size. The size of the final
+array of energies is given as a reference for the peak memory.
+
+Usage: python -m aiida_siesta.benchmarks.bands [nbands]
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from aiida_siesta.benchmarks import profile
+from aiida_siesta.benchmarks.generators import write_bands_file
+
+
+def loop_path(bands_path):
+    # The BandLines branch of the old SiestaParser.get_bands
+    tottx = open(bands_path).read().split()
+    nbands, nspins, nkpoints = int(tottx[5]), int(tottx[6]), int(tottx[7])
+    spinup = np.zeros((nkpoints, nbands))
+    spindown = np.zeros((nkpoints, nbands))
+    coords = np.zeros(nkpoints)
+    block_length = nbands * nspins
+    for i in range(nkpoints):
+        coords[i] = float(tottx[i * (block_length + 1) + 8])
+        for j in range(nbands):
+            spinup[i, j] = float(tottx[i * (block_length + 1) + 8 + j + 1])
+            if nspins == 2:
+                spindown[i, j] = float(
+                    tottx[i * (nbands * 2 + 1) + 8 + j + 1 + nbands])
+    return coords
+
+
+def vectorized_path(bands_path):
+    from aiida_siesta.parsers.bands import read_bands_file
+
+    return read_bands_file(bands_path, band_lines=True)[1]
+
+
+def run(nbands=200, kpoints=(1000, 10000, 50000), nspin=2):
+    """
+    Returns a list of dictionaries with the timings (s) and peak memory
+    increase (MB) of both readers for each number of k-points.
+    """
+    results = []
+    workdir = tempfile.mkdtemp()
+    try:
+        bands_path = os.path.join(workdir, 'aiida.bands')
+        for nkpoints in kpoints:
+            write_bands_file(bands_path, nkpoints=nkpoints, nbands=nbands,
+                             nspin=nspin)
+            result = {
+                'nkpoints': nkpoints,
+                'nbands': nbands,
+                'nspin': nspin,
+                'size_mb': os.path.getsize(bands_path) / 1024.0**2,
+                'array_mb': 8.0 * nkpoints * nbands * nspin / 1024.0**2,
+            }
+            for name, func in [('loop', loop_path),
+                               ('vectorized', vectorized_path)]:
+                elapsed, memory = profile(func, bands_path)
+                result[name + '_time'] = elapsed
+                result[name + '_memory'] = memory
+            results.append(result)
+    finally:
+        shutil.rmtree(workdir)
+
+    return results
+
+
+if __name__ == "__main__":
+    nbands = int(sys.argv[1]) if len(sys.argv) > 1 else 200
+    print("{:>9} {:>9} {:>9} {:>9} {:>9} {:>13} {:>13}".format(
+        "nkpoints", "size(MB)", "array(MB)", "loop(s)", "loop(MB)",
+        "vectorized(s)", "vectorized(MB)"))
+    for r in run(nbands):
+        print("{nkpoints:9d} {size_mb:9.1f} {array_mb:9.1f} {loop_time:9.2f} "
+              "{loop_memory:9.1f} {vectorized_time:13.2f} "
+              "{vectorized_memory:13.1f}".format(**r))
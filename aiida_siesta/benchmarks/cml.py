@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the streaming CML reader with a full xml.dom.minidom parse,
+for runs of increasing length.
+
+Usage: python -m aiida_siesta.benchmarks.cml [natoms]
+"""
+import os
+import shutil
+import sys
+import tempfile
+
+from aiida_siesta.benchmarks import profile
+from aiida_siesta.benchmarks.generators import write_cml_file
+
+
+def minidom_path(xml_path):
+    from xml.dom import minidom
+
+    xmldoc = minidom.parse(xml_path)
+    # The old helpers walked the modules of the full tree
+    return len(xmldoc.getElementsByTagName('module'))
+
+
+def streaming_path(xml_path):
+    from aiida_siesta.parsers.cml import parse_cml_file
+
+    cml_index = parse_cml_file(xml_path)
+    return cml_index.variable_geometry
+
+
+def run(natoms=64, steps=(1, 10, 100, 400), nscf=10):
+    """
+    Returns a list of dictionaries with the timings (s) and peak memory
+    increase (MB) of both readers for each number of geometry steps.
+    """
+    results = []
+    workdir = tempfile.mkdtemp()
+    try:
+        xml_path = os.path.join(workdir, 'aiida.xml')
+        for nsteps in steps:
+            write_cml_file(xml_path, natoms=natoms, nsteps=nsteps, nscf=nscf)
+            result = {
+                'natoms': natoms,
+                'nsteps': nsteps,
+                'nscf': nscf,
+                'size_mb': os.path.getsize(xml_path) / 1024.0**2,
+            }
+            for name, func in [('minidom', minidom_path),
+                               ('streaming', streaming_path)]:
+                elapsed, memory = profile(func, xml_path)
+                result[name + '_time'] = elapsed
+                result[name + '_memory'] = memory
+            results.append(result)
+    finally:
+        shutil.rmtree(workdir)
+
+    return results
+
+
+if __name__ == "__main__":
+    natoms = int(sys.argv[1]) if len(sys.argv) > 1 else 64
+    print("{:>6} {:>9} {:>12} {:>12} {:>12} {:>12}".format(
+        "nsteps", "size(MB)", "minidom(s)", "minidom(MB)", "stream(s)",
+        "stream(MB)"))
+    for r in run(natoms):
+        print("{nsteps:6d} {size_mb:9.1f} {minidom_time:12.2f} "
+              "{minidom_memory:12.1f} {streaming_time:12.2f} "
+              "{streaming_memory:12.1f}".format(**r))
@@ -0,0 +1,119 @@
+# -*- coding: utf-8 -*-
+"""
+Compares the array-based writer of the atomic positions of the fdf
+input (see calculations.fdf_writer) with the former per-site loop, for
+structures of up to 1M atoms, and checks that both give the same
+bytes.
+
+The structures are given as the raw 'sites' attribute of a
+StructureData, so that no database is needed; the per-site loop goes
+through objects with the accessors of the AiiDA Site class (whose
+'position' returns a deep copy).
+
+Usage: python -m aiida_siesta.benchmarks.fdf [max_natoms]
+"""
+import copy
+import sys
+
+import numpy as np
+
+from aiida_siesta.benchmarks import profile
+
+SIZES = (1000, 10000, 100000, 1000000)
+
+
+class _Site(object):
+    # The accessors of aiida.orm.data.structure.Site
+
+    def __init__(self, raw):
+        self._kind_name = unicode(raw['kind_name'])
+        self._position = tuple(float(i) for i in raw['position'])
+
+    @property
+    def kind_name(self):
+        return self._kind_name
+
+    @property
+    def position(self):
+        return copy.deepcopy(self._position)
+
+
+def make_sites(natoms, seed=0):
+    """
+    Returns the raw sites of a random structure with three kinds.
+    """
+    rng = np.random.RandomState(seed)
+    positions = rng.uniform(-50.0, 50.0, (natoms, 3))
+    names = [u'Si', u'O', u'H']
+    return [{
+        'position': list(position),
+        'kind_name': names[i % 3]
+    } for i, position in enumerate(positions.tolist())]
+
+
+def loop_writer(sites):
+    spind = {u'Si': 1, u'O': 2, u'H': 3}
+    atomic_positions_card_list = [
+        "%block atomiccoordinatesandatomicspecies\n"
+    ]
+    countatm = 0
+    for site in [_Site(raw) for raw in sites]:
+        countatm += 1
+        atomic_positions_card_list.append(
+            "{0:18.10f} {1:18.10f} {2:18.10f} {3:4} {4:6} {5:6}\n".format(
+                site.position[0], site.position[1], site.position[2],
+                spind[site.kind_name], site.kind_name.rjust(6), countatm))
+    atomic_positions_card = "".join(atomic_positions_card_list)
+    atomic_positions_card += "%endblock atomiccoordinatesandatomicspecies\n"
+    return atomic_positions_card
+
+
+def array_writer(sites):
+    from aiida_siesta.calculations.fdf_writer import get_atomic_positions_card
+
+    spind = {u'Si': 1, u'O': 2, u'H': 3}
+    positions = np.array([site['position'] for site in sites], dtype=float)
+    kind_names = [site['kind_name'] for site in sites]
+    return get_atomic_positions_card(positions, kind_names, spind)
+
+
+def _run_writer(func, natoms):
+    sites = make_sites(natoms)
+    if func is not None:
+        func(sites)
+
+
+def _write_both(natoms):
+    sites = make_sites(natoms)
+    return loop_writer(sites) == array_writer(sites)
+
+
+def run(sizes=SIZES):
+    """
+    Returns a list of dictionaries with the timings (s) and peak memory
+    increase (MB) of both writers for each number of atoms, and whether
+    their outputs are identical.
+    """
+    results = []
+    for natoms in sizes:
+        result = {'natoms': natoms}
+        # The generation of the sites is subtracted
+        base_time, base_memory = profile(_run_writer, None, natoms)
+        for name, func in [('loop', loop_writer), ('array', array_writer)]:
+            elapsed, memory = profile(_run_writer, func, natoms)
+            result[name + '_time'] = elapsed - base_time
+            result[name + '_memory'] = memory - base_memory
+        result['identical'] = _write_both(natoms)
+        results.append(result)
+    return results
+
+
+if __name__ == "__main__":
+    max_natoms = int(sys.argv[1]) if len(sys.argv) > 1 else SIZES[-1]
+    print("{:>8} {:>9} {:>9} {:>9} {:>9} {:>9}".format(
+        "natoms", "loop(s)", "loop(MB)", "array(s)", "array(MB)",
+        "identical"))
+    for r in run([n for n in SIZES if n <= max_natoms]):
+        print("{natoms:8d} {loop_time:9.2f} {loop_memory:9.1f} "
+              "{array_time:9.2f} {array_memory:9.1f} {identical!s:>9}"
+              .format(**r))
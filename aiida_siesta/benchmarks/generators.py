@@ -0,0 +1,278 @@
+# -*- coding: utf-8 -*-
+"""
+Writers of synthetic Siesta output files, with the same layout as the
+real ones, and sizes given by the caller.
+"""
+import numpy as np
+
+_CML_HEADER = """<?xml version="1.0" encoding="UTF-8"?>
+<cml xmlns="http://www.xml-cml.org/schema"
+ xmlns:siesta="http://www.uam.es/siesta/namespace"
+ xmlns:siestaUnits="http://www.uam.es/siesta/namespace/units"
+ xmlns:cmlUnits="http://www.xml-cml.org/units/units"
+ xmlns:xsd="http://www.w3.org/2001/XMLSchema">
+ <metadataList>
+  <metadata name="siesta:Program" content="Siesta"/>
+  <metadata name="siesta:Version" content="siesta-4.1-b3"/>
+  <metadata name="siesta:Nodes" content="1"/>
+ </metadataList>
+"""
+
+_ELEMENTS = ['Si', 'O', 'H', 'C']
+
+
+def _scalar_property(dict_ref, value, units="siestaUnits:eV"):
+    return ('<property dictRef="{}"><scalar dataType="xsd:double" '
+            'units="{}">{:.8f}</scalar></property>\n'.format(
+                dict_ref, units, value))
+
+
+def _write_geometry(f, symbols, positions, cell):
+    f.write('<molecule>\n<atomArray>\n')
+    for i, (symbol, (x, y, z)) in enumerate(zip(symbols, positions)):
+        f.write('<atom elementType="{}" x3="{:.8f}" y3="{:.8f}" z3="{:.8f}" '
+                'ref="siesta:e{:03d}"/>\n'.format(symbol, x, y, z, i + 1))
+    f.write('</atomArray>\n</molecule>\n')
+    f.write('<lattice dictRef="siesta:ucell">\n')
+    for vector in cell:
+        f.write('<latticeVector units="siestaUnits:angstrom" '
+                'dictRef="cml:latticeVector">{:.8f} {:.8f} {:.8f}'
+                '</latticeVector>\n'.format(*vector))
+    f.write('</lattice>\n')
+
+
+def write_cml_file(path, natoms=8, nsteps=1, nscf=10, seed=0):
+    """
+    Writes a CML file for a run with natoms atoms, nsteps geometry
+    steps (a single-point calculation if nsteps is 1) and nscf SCF
+    iterations per geometry step.
+    """
+    rng = np.random.RandomState(seed)
+    side = 2.0 * max(natoms, 1) ** (1.0 / 3.0)
+    cell = np.eye(3) * side
+    symbols = [_ELEMENTS[i % len(_ELEMENTS)] for i in range(natoms)]
+    positions = rng.uniform(0.0, side, size=(natoms, 3))
+    step_type = "Single-Point" if nsteps == 1 else "CG"
+
+    with open(path, 'w') as f:
+        f.write(_CML_HEADER)
+        f.write('<module title="Initial System">\n')
+        _write_geometry(f, symbols, positions, cell)
+        f.write('</module>\n')
+
+        for istep in range(nsteps):
+            f.write('<module serial="{}" dictRef="{}" role="step">\n'.format(
+                istep + 1, step_type))
+            _write_geometry(f, symbols, positions, cell)
+            f.write('<property dictRef="siesta:no_u"><scalar '
+                    'dataType="xsd:integer" units="cmlUnits:countable">'
+                    '{}</scalar></property>\n'.format(13 * natoms))
+            f.write('<property dictRef="siesta:nnz"><scalar '
+                    'dataType="xsd:integer" units="cmlUnits:countable">'
+                    '{}</scalar></property>\n'.format(169 * natoms * 20))
+            f.write('<property dictRef="siesta:ntm"><array size="3" '
+                    'dataType="xsd:integer">30 30 30</array></property>\n')
+
+            energy = -100.0 * natoms - istep
+            for iscf in range(nscf):
+                f.write('<module serial="{}" dictRef="SCF" role="step">\n'
+                        .format(iscf + 1))
+                residual = 10.0 ** (-iscf)
+                f.write(_scalar_property("siesta:Eharrs",
+                                         energy + residual))
+                f.write(_scalar_property("siesta:E_KS", energy + residual))
+                f.write(_scalar_property("siesta:FreeE", energy + residual))
+                f.write(_scalar_property("siesta:Ef", -4.0 + residual))
+                f.write(_scalar_property("siesta:dDmax", residual,
+                                         "siestaUnits:none"))
+                f.write(_scalar_property("siesta:dHmax", residual))
+                f.write('</module>\n')
+
+            forces = rng.uniform(-1.0, 1.0, size=(natoms, 3))
+            stress = rng.uniform(-0.1, 0.1, size=(3, 3))
+            f.write('<module title="SCF Finalization">\n')
+            f.write('<propertyList title="Energy Decomposition">\n')
+            f.write(_scalar_property("siesta:Ebs", energy / 3.0))
+            f.write(_scalar_property("siesta:E_KS", energy))
+            f.write(_scalar_property("siesta:FreeE", energy))
+            f.write(_scalar_property("siesta:E_Fermi", -4.0))
+            f.write('</propertyList>\n')
+            # (as Siesta does: 3 rows, one column per atom, the
+            # values in Fortran order)
+            f.write('<property dictRef="siesta:forces"><matrix rows="3" '
+                    'columns="{}" dataType="xsd:double" '
+                    'units="siestaUnits:evpa">{}</matrix></property>\n'.format(
+                        natoms, " ".join("{:.8f}".format(v)
+                                         for v in forces.ravel())))
+            f.write('<property dictRef="siesta:stress"><matrix rows="3" '
+                    'columns="3" dataType="xsd:double" '
+                    'units="siestaUnits:eV_Ang__3">{}</matrix></property>\n'
+                    .format(" ".join("{:.8f}".format(v)
+                                     for v in stress.ravel())))
+            f.write('</module>\n')
+            f.write('</module>\n')
+
+            positions = positions + rng.uniform(-0.01, 0.01,
+                                                size=(natoms, 3))
+
+        f.write('<module title="Finalization">\n')
+        _write_geometry(f, symbols, positions, cell)
+        f.write('</module>\n')
+        f.write('</cml>\n')
+
+
+def write_bands_file(path, nkpoints=100, nbands=20, nspin=1, band_lines=True,
+                     seed=0):
+    """
+    Writes a band-structure file (SystemLabel.bands) with nkpoints
+    k-points, nbands bands and nspin spin channels, in the BandLines
+    layout (a path with labels) or the BandPoints one.
+    """
+    rng = np.random.RandomState(seed)
+    energies = np.sort(rng.uniform(-20.0, 10.0,
+                                   size=(nkpoints, nspin, nbands)))
+    path_coords = np.linspace(0.0, 3.0, nkpoints)
+
+    with open(path, 'w') as f:
+        f.write('  {:.6f}\n'.format(-4.0))
+        if band_lines:
+            f.write('  {:.6f}  {:.6f}\n'.format(path_coords[0],
+                                                 path_coords[-1]))
+        f.write('  {:.6f}  {:.6f}\n'.format(energies.min(), energies.max()))
+        f.write('  {}  {}  {}\n'.format(nbands, nspin, nkpoints))
+        for ik in range(nkpoints):
+            if band_lines:
+                coords = [path_coords[ik]]
+            else:
+                coords = rng.uniform(-0.5, 0.5, size=3)
+            values = ["{:.6f}".format(v) for v in coords]
+            values += ["{:.4f}".format(e) for e in energies[ik].ravel()]
+            # As Siesta, ten values per line
+            for i in range(0, len(values), 10):
+                f.write(" ".join(values[i:i + 10]) + "\n")
+        if band_lines:
+            f.write('  2\n')
+            f.write('  {:.6f}  \'Gamma\'\n'.format(path_coords[0]))
+            f.write('  {:.6f}  \'X\'\n'.format(path_coords[-1]))
+
+
+def write_eig_file(path, nkpoints=100, nbands=20, nspin=1, seed=0):
+    """
+    Writes an eigenvalue file (SystemLabel.EIG) with nkpoints k-points,
+    nbands bands and nspin spin channels.
+    """
+    rng = np.random.RandomState(seed)
+    energies = np.sort(rng.uniform(-20.0, 10.0,
+                                   size=(nkpoints, nspin, nbands)))
+
+    with open(path, 'w') as f:
+        f.write('{:14.4f}\n'.format(-4.0))
+        f.write('{:6d}{:6d}{:6d}\n'.format(nbands, nspin, nkpoints))
+        for ik in range(nkpoints):
+            values = ["{:12.5f}".format(e) for e in energies[ik].ravel()]
+            # Fortran format (i5,10f12.5,/,(5x,10f12.5))
+            f.write("{:5d}".format(ik + 1) + "".join(values[:10]) + "\n")
+            for i in range(10, len(values), 10):
+                f.write("     " + "".join(values[i:i + 10]) + "\n")
+
+
+def write_kp_file(path, nkpoints=100, seed=0):
+    """
+    Writes a k-point file (SystemLabel.KP) with nkpoints k-points of
+    equal weight.
+    """
+    rng = np.random.RandomState(seed)
+    kpoints = rng.uniform(-0.5, 0.5, size=(nkpoints, 3))
+
+    with open(path, 'w') as f:
+        f.write('{:6d}\n'.format(nkpoints))
+        for ik in range(nkpoints):
+            f.write('{:6d}{:12.6f}{:12.6f}{:12.6f}{:12.6f}\n'.format(
+                ik + 1, kpoints[ik, 0], kpoints[ik, 1], kpoints[ik, 2],
+                1.0 / nkpoints))
+
+
+def write_messages_file(path, nwarnings=10, completed=True):
+    """
+    Writes a MESSAGES file with nwarnings warnings, ending as a
+    completed job or not.
+    """
+    with open(path, 'w') as f:
+        f.write('INFO: Using a tree timer\n')
+        for i in range(nwarnings):
+            f.write('WARNING: SCF_NOT_CONV: SCF did not converge in '
+                    'geometry step {}\n'.format(i + 1))
+        if completed:
+            f.write('INFO: Job completed\n')
+
+
+def write_time_json(path, seed=0):
+    """
+    Writes a time.json file, with the sections of the timer of Siesta
+    that the parser reads.
+    """
+    import json
+
+    rng = np.random.RandomState(seed)
+
+    def section(**children):
+        # At least the time of the subsections
+        d = {
+            '_time': float(rng.uniform(0.1, 1.0)) + sum(
+                c['_time'] for c in children.values()),
+            '_calls': int(rng.randint(1, 100)),
+        }
+        d.update(children)
+        return d
+
+    data = {
+        'global_section': {
+            'siesta': section(
+                IterGeom=section(
+                    state_init=section(),
+                    Setup_H0=section(nlefsm=section()),
+                    IterSCF=section(setup_H=section(), compute_dm=section()),
+                    PostSCF=section(nlefsm=section())),
+                siesta_analysis=section())
+        }
+    }
+    with open(path, 'w') as f:
+        json.dump(data, f, indent=1)
+
+
+def write_stm_file(path, nx=50, ny=50):
+    """
+    Writes a plot file of plstm (e.g. aiida.CH.STM), with nx lines
+    (of constant X) of ny points, separated by blank lines.
+    """
+    xs = np.linspace(0.0, 10.0, nx)
+    ys = np.linspace(0.0, 10.0, ny)
+
+    with open(path, 'w') as f:
+        for x in xs:
+            for y in ys:
+                z = 3.0 + 0.1 * np.sin(x) * np.cos(y)
+                f.write('{:14.6f}{:14.6f}{:14.6f}\n'.format(x, y, z))
+            f.write('\n')
+
+
+def write_vibra_output(path, natoms=8, ncells=27, nwarnings=0):
+    """
+    Writes the standard output (aiida.out) of a Vibra run for natoms
+    atoms in the unit cell and ncells cells in the supercell.
+    """
+    with open(path, 'w') as f:
+        f.write('Vibra: System Name = aiida\n')
+        f.write('Vibra: System Label = aiida\n')
+        f.write('Vibra: Number of unit cells in Supercell = {}\n'.format(
+            ncells))
+        f.write('Vibra: Eigenvectors = .true.\n')
+        for i in range(nwarnings):
+            f.write('Vibra: Warning: small imaginary frequency {}\n'.format(
+                i + 1))
+        for i in range(natoms * ncells):
+            f.write('Vibra: atom {:6d} species {:2d} mass {:10.4f}\n'.format(
+                i + 1, i % len(_ELEMENTS) + 1, 28.0855))
+        f.write('Vibra: Zero point energy = {:.6f} eV\n'.format(
+            0.05 * natoms))
+
@@ -0,0 +1,246 @@
+# -*- coding: utf-8 -*-
+"""
+Times and memory-profiles every entry point of the parsers on synthetic
+output files (see generators), and emits the results as JSON, so that
+runs of different versions of the plugin can be compared.
+
+Usage: python -m aiida_siesta.benchmarks.suite [-s small|large] [-o file]
+"""
+import argparse
+import datetime
+import json
+import os
+import platform
+import shutil
+import sys
+import tempfile
+
+import numpy as np
+
+from aiida_siesta.benchmarks import profile
+from aiida_siesta.benchmarks import generators
+
+# Sizes of the synthetic files
+SIZES = {
+    'small': {
+        'natoms': 64,
+        'nsteps': 10,
+        'nscf': 10,
+        'nkpoints': 1000,
+        'nbands': 50,
+        'nspin': 2,
+        'nwarnings': 100,
+        'stm_points': 100,
+        'vibra_cells': 27,
+    },
+    'large': {
+        'natoms': 512,
+        'nsteps': 200,
+        'nscf': 20,
+        'nkpoints': 20000,
+        'nbands': 200,
+        'nspin': 2,
+        'nwarnings': 10000,
+        'stm_points': 1000,
+        'vibra_cells': 125,
+    },
+}
+
+# The entry points, with the files they read
+
+
+def parse_cml(xml_path):
+    from aiida_siesta.parsers.cml import parse_cml_file
+
+    parse_cml_file(xml_path)
+
+
+def extract_results(paths):
+    from aiida_siesta.parsers.siesta import extract_results
+
+    extract_results(paths['output'], paths['messages'], paths['xml'],
+                    paths['json'], paths['bands'], True, paths['eig'],
+                    paths['kp'])
+
+
+def classify_messages(messages_path):
+    from aiida_siesta.parsers.messages import classify_messages
+
+    with open(messages_path) as f:
+        classify_messages(f)
+
+
+def get_timing_info(json_path):
+    from aiida_siesta.parsers.json_time import get_timing_info
+
+    get_timing_info(json_path)
+
+
+def read_bands_file(bands_path):
+    from aiida_siesta.parsers.bands import read_bands_file
+
+    read_bands_file(bands_path, band_lines=True)
+
+
+def read_eig_file(eig_path):
+    from aiida_siesta.parsers.bands import read_eig_file
+
+    read_eig_file(eig_path)
+
+
+def read_kp_file(kp_path):
+    from aiida_siesta.parsers.bands import read_kp_file
+
+    read_kp_file(kp_path)
+
+
+def read_stm_file(plot_path):
+    from aiida_siesta.parsers.stm import read_stm_file
+
+    read_stm_file(plot_path)
+
+
+def read_vibra_output(output_path):
+    from aiida_siesta.parsers.vibra import (read_vibra_errors,
+                                            read_vibra_output,
+                                            read_vibra_warnings)
+
+    read_vibra_errors(output_path)
+    read_vibra_warnings(output_path)
+    read_vibra_output(output_path)
+
+
+def read_vibra_bands(bands_path):
+    from aiida_siesta.parsers.vibra import read_vibra_bands
+
+    read_vibra_bands(bands_path, band_lines=True)
+
+
+def write_files(workdir, sizes):
+    """
+    Writes the synthetic files in workdir.
+
+    :return: a dictionary with their paths
+    """
+    paths = {
+        name: os.path.join(workdir, filename)
+        for name, filename in [
+            ('output', 'aiida.out'),
+            ('messages', 'MESSAGES'),
+            ('xml', 'aiida.xml'),
+            ('json', 'time.json'),
+            ('bands', 'aiida.bands'),
+            ('eig', 'aiida.EIG'),
+            ('kp', 'aiida.KP'),
+            ('stm', 'aiida.CH.STM'),
+            ('vibra_output', 'vibra.out'),
+            ('vibra_bands', 'aiida.vibra.bands'),
+        ]
+    }
+
+    open(paths['output'], 'w').close()
+    generators.write_messages_file(paths['messages'], sizes['nwarnings'])
+    generators.write_cml_file(paths['xml'], sizes['natoms'], sizes['nsteps'],
+                              sizes['nscf'])
+    generators.write_time_json(paths['json'])
+    generators.write_bands_file(paths['bands'], sizes['nkpoints'],
+                                sizes['nbands'], sizes['nspin'])
+    generators.write_eig_file(paths['eig'], sizes['nkpoints'],
+                              sizes['nbands'], sizes['nspin'])
+    generators.write_kp_file(paths['kp'], sizes['nkpoints'])
+    generators.write_stm_file(paths['stm'], sizes['stm_points'],
+                              sizes['stm_points'])
+    generators.write_vibra_output(paths['vibra_output'], sizes['natoms'],
+                                  sizes['vibra_cells'], sizes['nwarnings'])
+    # Vibra writes the phonon bands in the format of Siesta
+    generators.write_bands_file(paths['vibra_bands'], sizes['nkpoints'],
+                                3 * sizes['natoms'], 1)
+
+    return paths
+
+
+def run(size='small'):
+    """
+    Profiles every entry point on files of the given size (a key of
+    SIZES).
+
+    :return: a dictionary with the environment of the run and, for each
+        entry point, the size (MB) of the files read, the wall time (s)
+        and the peak memory increase (MB)
+    """
+    sizes = SIZES[size]
+    workdir = tempfile.mkdtemp()
+    try:
+        paths = write_files(workdir, sizes)
+
+        def file_mb(*names):
+            return sum(
+                os.path.getsize(paths[name]) for name in names) / 1024.0**2
+
+        entries = [
+            ('cml.parse_cml_file', parse_cml, paths['xml'], ['xml']),
+            ('siesta.extract_results', extract_results, paths,
+             ['messages', 'xml', 'json', 'bands', 'eig', 'kp']),
+            ('messages.classify_messages', classify_messages,
+             paths['messages'], ['messages']),
+            ('json_time.get_timing_info', get_timing_info, paths['json'],
+             ['json']),
+            ('bands.read_bands_file', read_bands_file, paths['bands'],
+             ['bands']),
+            ('bands.read_eig_file', read_eig_file, paths['eig'], ['eig']),
+            ('bands.read_kp_file', read_kp_file, paths['kp'], ['kp']),
+            ('stm.read_stm_file', read_stm_file, paths['stm'], ['stm']),
+            ('vibra.read_vibra_output', read_vibra_output,
+             paths['vibra_output'], ['vibra_output']),
+            ('vibra.read_vibra_bands', read_vibra_bands,
+             paths['vibra_bands'], ['vibra_bands']),
+        ]
+
+        results = []
+        for name, func, arg, files in entries:
+            elapsed, memory = profile(func, arg)
+            results.append({
+                'entry_point': name,
+                'size_mb': file_mb(*files),
+                'time': elapsed,
+                'memory_mb': memory,
+            })
+    finally:
+        shutil.rmtree(workdir)
+
+    return {
+        'version': _get_version(),
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'date': datetime.datetime.now().isoformat(),
+        'size': size,
+        'parameters': sizes,
+        'results': results,
+    }
+
+
+def _get_version():
+    try:
+        import pkg_resources
+        return pkg_resources.get_distribution('aiida-siesta').version
+    except Exception:
+        return None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Profiles the parsers of the plugin on synthetic files.")
+    parser.add_argument(
+        '-s', '--size', choices=sorted(SIZES), default='small',
+        help="Size of the synthetic files")
+    parser.add_argument(
+        '-o', '--output', help="Write the results to this file (JSON)")
+    args = parser.parse_args()
+
+    report = run(args.size)
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, sort_keys=True)
+    else:
+        json.dump(report, sys.stdout, indent=2, sort_keys=True)
+        sys.stdout.write('\n')
@@ -0,0 +1,80 @@
+# -*- coding: utf-8 -*-
+"""
+Parallelization settings of Siesta derived from the k-point sampling,
+the number of orbitals and the MPI/OpenMP layout of the job (see the
+'AUTO_PARALLEL' setting of SiestaCalculation).
+
+* With at least as many k-points as MPI processes (and a small enough
+  basis), each process diagonalizes whole k-points
+  (Diag.ParallelOverK), which avoids the communication of the
+  distributed diagonalization and is much faster for small cells with
+  many k-points.
+* Otherwise the orbitals are distributed in blocks (BlockSize), of the
+  largest power of two that gives every process at least one block.
+* Each MPI process runs the OpenMP threads of the cores assigned to it
+  by the resources of the job (if they give the number of cores).
+"""
+
+# Above this number of orbitals, each process would need too much
+# memory to hold whole k-points
+PARALLEL_OVER_K_MAX_ORBITALS = 3000
+
+MAX_BLOCK_SIZE = 64
+
+
+def count_irreducible_kpoints(mesh):
+    """
+    Returns an estimate of the number of k-points that Siesta uses for
+    a Monkhorst-Pack mesh: time-reversal symmetry halves them (other
+    symmetries are not used).
+    """
+    nkpoints = 1
+    for n in mesh:
+        nkpoints *= n
+    if nkpoints == 1:
+        return 1
+    return (nkpoints + 1) // 2
+
+
+def get_num_threads(job_resource):
+    """
+    Returns the number of OpenMP threads per MPI process for a job
+    resource of the scheduler: its 'num_cores_per_mpiproc' or else the
+    cores of a machine shared among its processes (None if not known).
+    """
+    num_cores_per_mpiproc = getattr(job_resource, 'num_cores_per_mpiproc',
+                                    None)
+    if num_cores_per_mpiproc:
+        return num_cores_per_mpiproc
+
+    num_cores_per_machine = getattr(job_resource, 'num_cores_per_machine',
+                                    None)
+    num_mpiprocs_per_machine = getattr(job_resource,
+                                       'num_mpiprocs_per_machine', None)
+    if num_cores_per_machine and num_mpiprocs_per_machine:
+        return max(1, num_cores_per_machine // num_mpiprocs_per_machine)
+
+    return None
+
+
+def get_parallel_settings(nprocs, nkpoints, no_u=None):
+    """
+    Returns a list of (fdf key, value) tuples with the parallelization
+    options for a run.
+
+    :param nprocs: the number of MPI processes
+    :param nkpoints: the number of k-points
+    :param no_u: the number of orbitals, or None if not known
+    """
+    over_k = (nprocs > 1 and nkpoints >= nprocs and
+              (no_u is None or no_u <= PARALLEL_OVER_K_MAX_ORBITALS))
+    settings = [('diag-parallelOverK', 'T' if over_k else 'F')]
+
+    if not over_k and nprocs > 1 and no_u is not None:
+        block_size = 1
+        while (2 * block_size <= MAX_BLOCK_SIZE and
+               2 * block_size * nprocs <= no_u):
+            block_size *= 2
+        settings.append(('blocksize', block_size))
+
+    return settings
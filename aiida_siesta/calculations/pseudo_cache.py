@@ -0,0 +1,186 @@
+# -*- coding: utf-8 -*-
+"""
+Content-addressed cache of the pseudopotentials on a remote computer
+(the 'pseudo_cache' setting of SiestaCalculation).
+
+Every pseudo is stored once in the cache directory, as <md5>.psf, and
+calculations get a remote symlink to it, named <kind>.psf, instead of
+an uploaded copy. A pseudo is only linked once a calculation on that
+computer has stored it in the cache: until then it is uploaded as
+usual, and the submission script copies it into the cache.
+
+The submission script also checks the cache (see get_cache_commands):
+it writes a file (CHECK_FILE_NAME, retrieved with the outputs) with
+the pseudos that are verified to be in the cache, and those whose link
+is dangling (e.g. because the cache directory was removed). In the
+latter case it stops before running Siesta. The parser then records
+the verified pseudos in an extra of the PsfData nodes (see mark_cached)
+and drops the records of the missing ones, so that they are uploaded
+again by the next calculation, and flags the failed calculation in its
+output parameters.
+"""
+import pipes
+import posixpath
+
+# Extra of the PsfData nodes with the caches that hold them
+CACHE_EXTRA = 'siesta_remote_caches'
+
+# File written by the submission script with the result of the checks
+CHECK_FILE_NAME = 'aiida.pseudo_cache'
+
+
+def _cache_key(computer, cache_dir):
+    return "{}:{}".format(computer.uuid, posixpath.normpath(cache_dir))
+
+
+def get_cache_path(cache_dir, pseudo):
+    """
+    Returns the path of a PsfData in the cache directory.
+    """
+    return posixpath.join(cache_dir, "{}.psf".format(pseudo.md5sum))
+
+
+def is_cached(pseudo, computer, cache_dir):
+    """
+    Returns True if a PsfData is recorded in the cache directory of a
+    computer.
+    """
+    return _cache_key(computer, cache_dir) in pseudo.get_extra(CACHE_EXTRA,
+                                                               [])
+
+
+def mark_cached(pseudo, computer, cache_dir):
+    """
+    Records that a PsfData is in the cache directory of a computer.
+    """
+    key = _cache_key(computer, cache_dir)
+    caches = pseudo.get_extra(CACHE_EXTRA, [])
+    if key not in caches:
+        pseudo.set_extra(CACHE_EXTRA, caches + [key])
+
+
+def unmark_cached(pseudo, computer, cache_dir):
+    """
+    Drops the record of a PsfData in the cache directory of a computer.
+
+    :return: True if the PsfData was recorded in the cache
+    """
+    key = _cache_key(computer, cache_dir)
+    caches = pseudo.get_extra(CACHE_EXTRA, [])
+    if key not in caches:
+        return False
+    pseudo.set_extra(CACHE_EXTRA, [c for c in caches if c != key])
+    return True
+
+
+def forget_cache(computer, cache_dir):
+    """
+    Drops the records of a cache directory of a computer (e.g. after
+    it was removed), so that its pseudos are uploaded again.
+
+    :return: the number of PsfData nodes updated
+    """
+    from aiida.orm.querybuilder import QueryBuilder
+    from aiida_siesta.data.psf import PsfData
+
+    qb = QueryBuilder()
+    qb.append(PsfData, project=['*'])
+
+    count = 0
+    for pseudo, in qb.iterall():
+        if unmark_cached(pseudo, computer, cache_dir):
+            count += 1
+    return count
+
+
+def get_cache_commands(cache_dir, seeds, links):
+    """
+    Returns the shell commands of the submission script that copy the
+    uploaded pseudos into the cache directory, unless they are already
+    there, and check the cache. Every file is copied to a temporary name
+    and renamed, so that calculations running at the same time never
+    see it incomplete.
+
+    The md5 of the pseudos found in the cache (identical to the uploaded
+    copy, or at the end of a link) are written to CHECK_FILE_NAME as
+    'cached <md5>', and those of dangling links as 'missing <md5>'; if
+    there are any of the latter, the script exits.
+
+    :param seeds: a list of (file name in the working directory, path
+        in the cache, md5) tuples of the uploaded pseudos
+    :param links: a list of (file name in the working directory, md5)
+        tuples of the pseudos linked to the cache
+    """
+    check_file = pipes.quote(CHECK_FILE_NAME)
+    lines = [
+        ": > {}".format(check_file),
+        "mkdir -p {}".format(pipes.quote(cache_dir)),
+    ]
+    for filename, cache_path, md5sum in seeds:
+        filename = pipes.quote(filename)
+        cache_path = pipes.quote(cache_path)
+        lines.append("[ -e {1} ] || {{ cp {0} {1}.$$ && mv {1}.$$ {1}; }}"
+                     .format(filename, cache_path))
+        lines.append("if cmp -s {} {}; then echo 'cached {}' >> {}; fi"
+                     .format(filename, cache_path, md5sum, check_file))
+    for filename, md5sum in links:
+        lines.append(
+            "if [ -e {0} ]; then echo 'cached {1}' >> {2}; "
+            "else echo 'missing {1}' >> {2}; fi".format(
+                pipes.quote(filename), md5sum, check_file))
+    if links:
+        lines.append("if grep -q '^missing' {}; then\n"
+                     "  echo 'Pseudos missing from the cache' {} >&2\n"
+                     "  exit 1\n"
+                     "fi".format(check_file, pipes.quote(cache_dir)))
+    return "\n".join(lines)
+
+
+def read_check_file(path):
+    """
+    Returns the sets of the md5 of the pseudos found in the cache and of
+    those missing from it, from the file written by the commands of
+    get_cache_commands.
+    """
+    checks = {'cached': set(), 'missing': set()}
+    with open(path) as f:
+        for line in f:
+            tokens = line.split()
+            if len(tokens) == 2 and tokens[0] in checks:
+                checks[tokens[0]].add(tokens[1])
+    return checks['cached'], checks['missing']
+
+
+def update_calculation_pseudos(calc, check_path):
+    """
+    Records the pseudos of a SiestaCalculation that used the
+    'pseudo_cache' setting that its submission script found in the
+    cache of its computer, and drops the records of those that it found
+    missing.
+
+    :param check_path: the path of the retrieved CHECK_FILE_NAME
+    :return: the list of the PsfData nodes missing from the cache
+    """
+    inputs = calc.get_inputs_dict()
+    settings = inputs.get(calc.get_linkname('settings'))
+    if settings is None:
+        return []
+    cache_dir = dict((k.upper(), v)
+                     for k, v in settings.get_dict().items()).get(
+                         'PSEUDO_CACHE')
+    if not cache_dir:
+        return []
+
+    cached, missing = read_check_file(check_path)
+    computer = calc.get_computer()
+    prefix = calc._get_linkname_pseudo_prefix()
+    missing_pseudos = []
+    for link, node in inputs.items():
+        if not link.startswith(prefix):
+            continue
+        if node.md5sum in missing:
+            unmark_cached(node, computer, cache_dir)
+            missing_pseudos.append(node)
+        elif node.md5sum in cached:
+            mark_cached(node, computer, cache_dir)
+    return missing_pseudos
@@ -1,7 +1,6 @@
 # -*- coding: utf-8 -*-
 import os
 
-from aiida.common.constants import elements
 from aiida.common.datastructures import CalcInfo, CodeInfo
 from aiida.common.exceptions import InputValidationError
 from aiida.common.utils import classproperty
@@ -11,6 +10,12 @@ from aiida.orm.data.parameter import ParameterData
 from aiida.orm.data.remote import RemoteData
 from aiida.orm.data.structure import StructureData
 
+from aiida_siesta.calculations.fdf_writer import (
+    get_atomic_positions_card, get_atomic_species_card,
+    get_lattice_vectors_card, get_species_indices, get_structure_arrays,
+    write_atomic_positions_file)
+from aiida_siesta.calculations.pseudo_cache import (
+    CHECK_FILE_NAME, get_cache_commands, get_cache_path, is_cached)
 from aiida_siesta.data.psf import PsfData, get_pseudos_from_structure
 # Module with fdf-aware dictionary
 from tkdict import FDFDict
@@ -56,6 +61,8 @@ class SiestaCalculation(JobCalculation):
         self._DEFAULT_JSON_FILE = 'time.json'
         self._DEFAULT_MESSAGES_FILE = 'MESSAGES'
         self._DEFAULT_BANDS_FILE = 'aiida.bands'
+        self._DEFAULT_EIG_FILE = 'aiida.EIG'
+        self._DEFAULT_KP_FILE = 'aiida.KP'
 
         self._PSEUDO_SUBFOLDER = './'
         self._OUTPUT_SUBFOLDER = './'
@@ -66,6 +73,9 @@ class SiestaCalculation(JobCalculation):
         self._JSON_FILE_NAME = 'time.json'
         self._MESSAGES_FILE_NAME = 'MESSAGES'
         self._BANDS_FILE_NAME = 'aiida.bands'
+        self._EIG_FILE_NAME = 'aiida.EIG'
+        self._KP_FILE_NAME = 'aiida.KP'
+        self._COORDINATES_FILE_NAME = 'aiida.coords'
 
         # in restarts, it will copy from the parent the following
         # (fow now, just the density matrix file)
@@ -154,6 +164,7 @@ class SiestaCalculation(JobCalculation):
 
         local_copy_list = []
         remote_copy_list = []
+        remote_symlink_list = []
 
         # Process the settings dictionary first
         # Settings can be undefined, and defaults to an empty dictionary
@@ -300,8 +311,12 @@ class SiestaCalculation(JobCalculation):
         input_params.update({'use-tree-timer': 'T'})
         input_params.update({'xml-write': 'T'})
 
+        # The sites are taken as arrays, without building a Site object
+        # per atom (see fdf_writer)
+        positions, kind_names = get_structure_arrays(structure)
+
         input_params.update({'number-of-species': len(structure.kinds)})
-        input_params.update({'number-of-atoms': len(structure.sites)})
+        input_params.update({'number-of-atoms': len(kind_names)})
         #
         # Regarding the lattice-constant parameter:
         # -- The variable "alat" is not typically kept anywhere, and
@@ -323,11 +338,7 @@ class SiestaCalculation(JobCalculation):
         #
 
         # ------------ CELL_PARAMETERS -----------
-        cell_parameters_card = "%block lattice-vectors\n"
-        for vector in structure.cell:
-            cell_parameters_card += ("{0:18.10f} {1:18.10f} {2:18.10f}"
-                                     "\n".format(*vector))
-        cell_parameters_card += "%endblock lattice-vectors\n"
+        cell_parameters_card = get_lattice_vectors_card(structure.cell)
 
         # ------------- ATOMIC_SPECIES ------------
         # I create the subfolder that will contain the pseudopotentials
@@ -335,47 +346,51 @@ class SiestaCalculation(JobCalculation):
         # I create the subfolder with the output data
         tempfolder.get_subfolder(self._OUTPUT_SUBFOLDER, create=True)
 
-        atomic_species_card_list = []
-
-        # Dictionary to get the atomic number of a given element
-        datmn = dict([(v['symbol'], k) for k, v in elements.iteritems()])
+        # Optional cache of the pseudos on the computer (see
+        # pseudo_cache): the cached ones are linked, the others are
+        # uploaded and then stored in the cache by the job
+        pseudo_cache = settings_dict.pop('PSEUDO_CACHE', None)
+        if pseudo_cache and not os.path.isabs(pseudo_cache):
+            raise InputValidationError(
+                "The 'pseudo_cache' setting must be an absolute path")
+        pseudo_seeds = []
+        pseudo_links = []
 
-        spind = {}
-        spcount = 0
+        spind = get_species_indices(structure.kinds)
         for kind in structure.kinds:
 
             ps = pseudos[kind.name]
+            psf_filename = os.path.join(self._PSEUDO_SUBFOLDER,
+                                        kind.name + ".psf")
+
+            if pseudo_cache and is_cached(ps, self.get_computer(),
+                                          pseudo_cache):
+                remote_symlink_list.append(
+                    (self.get_computer().uuid,
+                     get_cache_path(pseudo_cache, ps), psf_filename))
+                pseudo_links.append((psf_filename, ps.md5sum))
+                continue
 
             # I add this pseudo file to the list of files to copy,
             # with the appropiate name
-            local_copy_list.append((ps.get_file_abs_path(), os.path.join(
-                self._PSEUDO_SUBFOLDER, kind.name + ".psf")))
-            spcount += 1
-            spind[kind.name] = spcount
-            atomic_species_card_list.append("{0:5} {1:5} {2:5}\n".format(
-                spind[kind.name], datmn[kind.symbol], kind.name.rjust(6)))
-
-        atomic_species_card_list = (
-            ["%block chemicalspecieslabel\n"] + list(atomic_species_card_list))
-        atomic_species_card = "".join(atomic_species_card_list)
-        atomic_species_card += "%endblock chemicalspecieslabel\n"
-        # Free memory
-        del atomic_species_card_list
+            local_copy_list.append((ps.get_file_abs_path(), psf_filename))
+            if pseudo_cache:
+                pseudo_seeds.append((psf_filename,
+                                     get_cache_path(pseudo_cache, ps),
+                                     ps.md5sum))
+
+        atomic_species_card = get_atomic_species_card(structure.kinds, spind)
 
         # ------------ ATOMIC_POSITIONS -----------
-        atomic_positions_card_list = [
-            "%block atomiccoordinatesandatomicspecies\n"
-        ]
-        countatm = 0
-        for site in structure.sites:
-            countatm += 1
-            atomic_positions_card_list.append(
-                "{0:18.10f} {1:18.10f} {2:18.10f} {3:4} {4:6} {5:6}\n".format(
-                    site.position[0], site.position[1], site.position[2],
-                    spind[site.kind_name], site.kind_name.rjust(6), countatm))
-        atomic_positions_card = "".join(atomic_positions_card_list)
-        del atomic_positions_card_list  # Free memory
-        atomic_positions_card += "%endblock atomiccoordinatesandatomicspecies\n"
+        # Optionally in a separate file, included from the fdf input,
+        # which then stays small for large structures
+        if settings_dict.pop('COORDINATES_FILE', False):
+            atomic_positions_card = write_atomic_positions_file(
+                tempfolder.get_abs_path(self._COORDINATES_FILE_NAME),
+                positions, kind_names, spind)
+        else:
+            atomic_positions_card = get_atomic_positions_card(
+                positions, kind_names, spind)
 
         # --------------- K-POINTS ----------------
         if kpoints is not None:
@@ -449,6 +464,32 @@ class SiestaCalculation(JobCalculation):
                 fbkpoints_card += "%endblock BandLines\n"
             del bandskpoints_card_list
 
+        # --------------- PARALLEL SETTINGS ----------------
+        # Opt-in: derived from the k-points, the (estimated) number of
+        # orbitals and the resources of the job, unless they are
+        # given in the parameters
+        parallel_settings = []
+        prepend_lines = []
+        if settings_dict.pop('AUTO_PARALLEL', False):
+            parallel_settings, num_threads, summary = \
+                self._get_parallel_settings(structure, kind_names,
+                                            input_basis, kpoints)
+            parallel_settings = [
+                (k, v) for k, v in parallel_settings
+                if input_params.get_last_key(k) is None
+            ]
+            parallel_card = "".join(
+                get_input_data_text(k, v) for k, v in parallel_settings)
+            # Otherwise the OpenMP settings of the computer are kept
+            if num_threads is not None:
+                prepend_lines.append(
+                    "export OMP_NUM_THREADS={}".format(num_threads))
+
+        if pseudo_cache:
+            prepend_lines.append(get_cache_commands(pseudo_cache,
+                                                    pseudo_seeds,
+                                                    pseudo_links))
+
         # ================ Namelists and cards ===================
 
         input_filename = tempfolder.get_abs_path(self._INPUT_FILE_NAME)
@@ -470,6 +511,11 @@ class SiestaCalculation(JobCalculation):
                 for k, v in input_basis.iteritems():
                     infile.write(get_input_data_text(k, v))
 
+            if parallel_settings:
+                infile.write("#\n# -- Parallel settings (automatic: {})\n#\n"
+                             .format(summary))
+                infile.write(parallel_card)
+
             # Write previously generated cards now
             infile.write("#\n# -- Structural Info follows\n#\n")
             infile.write(atomic_species_card)
@@ -522,8 +568,11 @@ class SiestaCalculation(JobCalculation):
 
         if cmdline_params:
             calcinfo.cmdline_params = list(cmdline_params)
+        if prepend_lines:
+            calcinfo.prepend_text = "\n".join(prepend_lines)
         calcinfo.local_copy_list = local_copy_list
         calcinfo.remote_copy_list = remote_copy_list
+        calcinfo.remote_symlink_list = remote_symlink_list
 
         calcinfo.stdin_name = self._INPUT_FILE_NAME
         calcinfo.stdout_name = self._OUTPUT_FILE_NAME
@@ -558,6 +607,16 @@ class SiestaCalculation(JobCalculation):
         if flagbands:
             calcinfo.retrieve_list.append(self._BANDS_FILE_NAME)
 
+        # The eigenvalues (and k-points) of the SCF cycle are written
+        # in every run, but only retrieved (and parsed) if requested
+        if settings_dict.pop('RETRIEVE_EIGENVALUES', False):
+            calcinfo.retrieve_list.append(self._EIG_FILE_NAME)
+            calcinfo.retrieve_list.append(self._KP_FILE_NAME)
+
+        # The checks of the cache of the pseudos, for the parser
+        if pseudo_cache:
+            calcinfo.retrieve_list.append(CHECK_FILE_NAME)
+
         # Any other files specified in the settings dictionary
         settings_retrieve_list = settings_dict.pop('ADDITIONAL_RETRIEVE_LIST',
                                                    [])
@@ -565,6 +624,46 @@ class SiestaCalculation(JobCalculation):
 
         return calcinfo
 
+    def _get_parallel_settings(self, structure, kind_names, input_basis,
+                               kpoints):
+        """
+        Returns the parallelization options (see the 'parallel' module)
+        for the resources of this calculation, the number of OpenMP
+        threads per MPI process (None if not known), and a summary of the
+        layout.
+        """
+        from aiida_siesta.calculations.parallel import (
+            count_irreducible_kpoints, get_num_threads, get_parallel_settings)
+        from aiida_siesta.tools.resources import estimate_num_orbitals
+
+        job_resource = self.get_computer().get_scheduler().create_job_resource(
+            **self.get_resources(full=True))
+        nprocs = job_resource.get_tot_num_mpiprocs()
+        num_threads = get_num_threads(job_resource)
+
+        if kpoints is None:
+            nkpoints = 1
+        else:
+            try:
+                mesh, _ = kpoints.get_kpoints_mesh()
+                nkpoints = count_irreducible_kpoints(mesh)
+            except AttributeError:
+                nkpoints = len(kpoints.get_kpoints())
+
+        symbols = dict((kind.name, kind.symbol) for kind in structure.kinds)
+        kinds = [(name, symbols[name]) for name in kind_names]
+        try:
+            no_u = estimate_num_orbitals(kinds, input_basis)
+        except ValueError:
+            no_u = None
+
+        summary = "{} MPI processes x {} threads, {} k-points, {} orbitals" \
+            .format(nprocs, num_threads if num_threads is not None else "?",
+                    nkpoints, no_u if no_u is not None else "?")
+
+        return (get_parallel_settings(nprocs, nkpoints, no_u), num_threads,
+                summary)
+
     @classmethod
     def _get_linkname_pseudo_prefix(cls):
         """
@@ -126,13 +126,18 @@ def listfamilies(element, with_description):
 
 
 @psfdata.command()
+@click.option(
+    '-a',
+    '--archive',
+    is_flag=True,
+    help="OPTIONAL: Write a compressed archive (tar.gz) with a manifest "
+    "of the elements, MD5 and headers, instead of a directory.")
 @click.argument('family')
-@click.argument(
-    'directory',
-    type=click.Path(exists=False, file_okay=False, resolve_path=True))
-def exportfamily(family, directory):
+@click.argument('directory', type=click.Path(exists=False, resolve_path=True))
+def exportfamily(archive, family, directory):
     """
-    Export a pseudopotential family into a new directory.
+    Export a pseudopotential family into a new directory, or into a
+    compressed archive (to be imported with importfamily).
     """
     from aiida import is_dbenv_loaded, load_dbenv
     if not is_dbenv_loaded():
@@ -147,6 +152,19 @@ def exportfamily(family, directory):
         group = PsfData.get_psf_group(family)
     except NotExistent:
         click.echo("PSF family {} not found".format(family), err=True)
+        sys.exit(1)
+
+    if archive:
+        import aiida_siesta.data.psf as psf
+
+        if os.path.exists(directory):
+            click.echo(
+                "Destination archive {} exists; aborted".format(directory),
+                err=True)
+            sys.exit(1)
+        nexported = psf.export_psf_family(family, directory)
+        click.echo("PSF files exported: {}".format(nexported))
+        return
 
     try:
         os.makedirs(directory)
@@ -160,3 +178,45 @@ def exportfamily(family, directory):
         click.echo(
             "Destination directory {} exists; aborted".format(directory),
             err=True)
+
+
+@psfdata.command()
+@click.option(
+    '-n',
+    '--name',
+    help="OPTIONAL: Group name (by default, that of the exported family).")
+@click.option(
+    '-d',
+    '--description',
+    help="OPTIONAL: Brief description of the group (by default, that of "
+    "the exported family).")
+@click.option(
+    '-S',
+    '--stop-if-existing',
+    is_flag=True,
+    help=
+    "OPTIONAL: Stop if some pseudo files are already registered in the database."
+)
+@click.argument(
+    'archive',
+    type=click.Path(exists=True, dir_okay=False, resolve_path=True))
+def importfamily(name, description, stop_if_existing, archive):
+    """
+    Import a pseudopotential family from an archive written by
+    exportfamily --archive. The pseudos already in the database
+    (with the same MD5) are reused, not imported again.
+
+    Returns the numbers of pseudos in the archive and the number of nodes
+    imported.
+    """
+    from aiida import is_dbenv_loaded, load_dbenv
+    if not is_dbenv_loaded():
+        load_dbenv()
+
+    import aiida_siesta.data.psf as psf
+
+    files_found, files_imported = psf.import_psf_family(
+        archive, name, description, stop_if_existing)
+
+    click.echo("PSF files found: {}. New files imported: {}".format(
+        files_found, files_imported))
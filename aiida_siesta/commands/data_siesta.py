@@ -0,0 +1,368 @@
+# -*- coding: utf-8 -*-
+"""
+Verdi command definition for the results of Siesta calculations.
+`verdi data siesta`
+"""
+import click
+
+from aiida.cmdline.commands import data_cmd
+
+CONTEXT_SETTINGS = dict(help_option_names=['-h', '--help'])
+
+
+@data_cmd.group('siesta', context_settings=CONTEXT_SETTINGS)
+def siestadata():
+    """Results of SIESTA calculations command line interface."""
+    pass
+
+
+def _extract(task):
+    """
+    Runs the extraction functions of the parser over the retrieved files
+    of a calculation. It is run in the worker processes, so it does not
+    access the database.
+
+    :param task: a tuple (pk, paths, band_lines), with the paths as
+        returned by SiestaParser._fetch_output_files
+    :return: a tuple (pk, results or None, error message or None)
+    """
+    from aiida_siesta.parsers.siesta import extract_results_cached
+
+    pk, paths, band_lines = task
+    output_path, messages_path, xml_path, json_path, bands_path, \
+        eig_path, kp_path, _ = paths
+    try:
+        results = extract_results_cached(output_path, messages_path,
+                                         xml_path, json_path, bands_path,
+                                         band_lines, eig_path, kp_path)
+    except Exception as e:
+        return pk, None, "{}: {}".format(type(e).__name__, e)
+
+    return pk, results, None
+
+
+def _select_calculations(pks, group, filters, limit):
+    """
+    Returns the pks of the SiestaCalculations selected by the options
+    of the reparse command.
+    """
+    from aiida.orm.querybuilder import QueryBuilder
+    from aiida.orm.group import Group
+    from aiida_siesta.calculations.siesta import SiestaCalculation
+
+    calc_filters = dict(filters)
+    if pks:
+        calc_filters['id'] = {'in': list(pks)}
+
+    qb = QueryBuilder()
+    if group:
+        qb.append(Group, tag='group', filters={'name': group})
+        qb.append(SiestaCalculation, tag='calc', member_of='group',
+                  filters=calc_filters, project=['id'])
+    else:
+        qb.append(SiestaCalculation, tag='calc', filters=calc_filters,
+                  project=['id'])
+    qb.order_by({'calc': ['id']})
+    if limit:
+        qb.limit(limit)
+
+    return [pk for pk, in qb.all()]
+
+
+def _prepare_task(pk):
+    """
+    Returns the task of _extract for a calculation, or None if it has
+    no retrieved files.
+    """
+    from aiida.orm import load_node
+    from aiida_siesta.parsers.siesta import SiestaParser
+
+    calc = load_node(pk)
+    retrieved = calc.get_retrieved_node()
+    if retrieved is None:
+        return None
+
+    parser = SiestaParser(calc)
+    paths = parser._fetch_output_files({
+        calc._get_linkname_retrieved(): retrieved
+    })
+    band_lines = None
+    if paths[4] is not None:
+        band_lines = calc.inp.bandskpoints.labels is not None
+
+    return pk, paths, band_lines
+
+
+def _store_outputs(pk, results):
+    """
+    Stores the output nodes of a calculation, created by an
+    InlineCalculation with the retrieved folder and the input
+    structure of the calculation as inputs, and returns the latter.
+
+    The nodes are stored as by make_inline, but without committing (it
+    is run within a BatchTransaction): the calculation is sealed before
+    it is stored, since sealing a stored node commits.
+    """
+    from aiida.common.links import LinkType
+    from aiida.orm import load_node
+    from aiida.orm.calculation.inline import InlineCalculation
+    from aiida.orm.data.parameter import ParameterData
+    from aiida.utils.calculation import add_source_info
+    from aiida_siesta.parsers.siesta import SiestaParser
+
+    calc = load_node(pk)
+    output_nodes = dict(SiestaParser(calc).build_output_nodes(results))
+
+    def reparse_siesta_inline(**kwargs):
+        return output_nodes
+
+    inline_calc = InlineCalculation()
+    inline_calc.add_link_from(calc.get_retrieved_node(), label='retrieved')
+    inline_calc.add_link_from(calc.inp.structure, label='structure')
+    inline_calc.add_link_from(
+        ParameterData(dict={'reparsed_calculation': calc.uuid}),
+        label='parameters')
+    add_source_info(inline_calc, reparse_siesta_inline)
+    inline_calc.seal()
+
+    for label, node in output_nodes.items():
+        node.add_link_from(inline_calc, label=label,
+                           link_type=LinkType.CREATE)
+
+    inline_calc.store_all(with_transaction=False)
+    for node in output_nodes.values():
+        node.store(with_transaction=False)
+
+    return inline_calc
+
+
+@siestadata.command()
+@click.argument('pks', nargs=-1, type=int)
+@click.option(
+    '-g', '--group', help="OPTIONAL: Only the calculations in this group.")
+@click.option(
+    '-f',
+    '--filters',
+    default='{}',
+    help="OPTIONAL: QueryBuilder filters on the calculations, as a JSON "
+    "dictionary, e.g. '{\"ctime\": {\">\": \"2018-01-01\"}}'.")
+@click.option(
+    '-l', '--limit', type=int, help="OPTIONAL: Maximum number of calculations.")
+@click.option(
+    '-n',
+    '--num-processes',
+    type=int,
+    help="OPTIONAL: Number of worker processes (default: number of CPUs).")
+@click.option(
+    '-b',
+    '--batch-size',
+    type=int,
+    default=100,
+    help="OPTIONAL: Number of calculations stored per transaction.")
+@click.option(
+    '-d',
+    '--dry-run',
+    is_flag=True,
+    help="OPTIONAL: Parse the files, but do not store anything.")
+def reparse(pks, group, filters, limit, num_processes, batch_size, dry_run):
+    """
+    Re-parse the retrieved files of existing Siesta calculations.
+
+    The calculations are selected by pk, group and/or QueryBuilder
+    filters. The files are parsed in parallel by a pool of worker
+    processes, and the new output nodes are stored in batches, each
+    set created by an InlineCalculation with the retrieved folder and
+    the input structure of the calculation as inputs.
+    """
+    from aiida import is_dbenv_loaded, load_dbenv
+    if not is_dbenv_loaded():
+        load_dbenv()
+
+    import json
+    import multiprocessing
+    import time
+    from aiida_siesta.tools.transaction import BatchTransaction
+
+    try:
+        filters = json.loads(filters)
+    except ValueError as e:
+        click.echo("Invalid filters: {}".format(e), err=True)
+        raise click.Abort()
+
+    calc_pks = _select_calculations(pks, group, filters, limit)
+    total = len(calc_pks)
+    if total == 0:
+        click.echo("No Siesta calculations found.", err=True)
+        return
+    click.echo("Re-parsing {} calculations{}".format(
+        total, " (dry run)" if dry_run else ""))
+
+    t0 = time.time()
+    done = 0
+    skipped = []
+    failed = []
+
+    def prepare(batch):
+        tasks = []
+        for pk in batch:
+            try:
+                task = _prepare_task(pk)
+            except Exception as e:
+                failed.append((pk, "{}: {}".format(type(e).__name__, e)))
+                continue
+            if task is None:
+                skipped.append(pk)
+            else:
+                tasks.append(task)
+        return tasks
+
+    batches = [
+        calc_pks[i:i + batch_size] for i in range(0, total, batch_size)
+    ]
+
+    pool = multiprocessing.Pool(processes=num_processes)
+    try:
+        # The workers extract the results of a batch while the
+        # previous one is being stored
+        pending = pool.map_async(_extract, prepare(batches[0]))
+        for ibatch in range(len(batches)):
+            extracted = pending.get()
+            if ibatch + 1 < len(batches):
+                pending = pool.map_async(_extract,
+                                         prepare(batches[ibatch + 1]))
+
+            parsed = []
+            for pk, results, error in extracted:
+                if error is None:
+                    parsed.append((pk, results))
+                else:
+                    failed.append((pk, error))
+
+            if not dry_run:
+                with BatchTransaction() as batch:
+                    for pk, results in parsed:
+                        try:
+                            with batch.savepoint():
+                                _store_outputs(pk, results)
+                        except Exception as e:
+                            failed.append((pk, "{}: {}".format(
+                                type(e).__name__, e)))
+
+            done += len(batches[ibatch])
+            elapsed = time.time() - t0
+            click.echo("{}/{} calculations ({:.1f} calcs/s)".format(
+                done, total, done / elapsed if elapsed > 0 else 0.0))
+    finally:
+        pool.close()
+        pool.join()
+
+    for pk, error in failed:
+        click.echo("Calculation {}: {}".format(pk, error), err=True)
+
+    elapsed = time.time() - t0
+    reparsed = total - len(failed) - len(skipped)
+    click.echo("{} {} calculations in {:.1f} s ({:.1f} calcs/s); {} failed, "
+               "{} without retrieved files".format(
+                   "Parsed" if dry_run else "Re-parsed", reparsed, elapsed,
+                   total / elapsed if elapsed > 0 else 0.0, len(failed),
+                   len(skipped)))
+
+
+@siestadata.command()
+@click.option('-c', '--code', help="OPTIONAL: Only the calculations of this code.")
+@click.option(
+    '-C', '--computer', help="OPTIONAL: Only the calculations on this computer.")
+@click.option(
+    '--no-u-min', type=int, help="OPTIONAL: Minimum number of orbitals.")
+@click.option(
+    '--no-u-max', type=int, help="OPTIONAL: Maximum number of orbitals.")
+@click.option(
+    '--mesh-min', type=int, help="OPTIONAL: Minimum number of mesh points.")
+@click.option(
+    '--mesh-max', type=int, help="OPTIONAL: Maximum number of mesh points.")
+@click.option(
+    '-f',
+    '--filters',
+    default='{}',
+    help="OPTIONAL: QueryBuilder filters on the calculations, as a JSON "
+    "dictionary.")
+@click.option(
+    '-l', '--limit', type=int, help="OPTIONAL: Maximum number of calculations.")
+@click.option(
+    '-t',
+    '--threshold',
+    type=float,
+    default=3.5,
+    help="OPTIONAL: Modified z-score above which a calculation is an "
+    "outlier.")
+@click.option(
+    '-o',
+    '--outliers-only',
+    is_flag=True,
+    help="OPTIONAL: List only the outliers.")
+def timing(code, computer, no_u_min, no_u_max, mesh_min, mesh_max, filters,
+           limit, threshold, outliers_only):
+    """
+    Timing analytics of Siesta calculations.
+
+    The global time of every selected calculation is divided by its
+    number of orbitals, of mesh points and of SCF iterations. The
+    calculations whose values are far from the rest (by their modified
+    z-score) are flagged as outliers, and the medians are summarized
+    per computer.
+    """
+    from aiida import is_dbenv_loaded, load_dbenv
+    if not is_dbenv_loaded():
+        load_dbenv()
+
+    import json
+    import numpy as np
+    from aiida_siesta.tools.timing import (query_timings, analyze_timings,
+                                           summarize_by)
+
+    try:
+        filters = json.loads(filters)
+    except ValueError as e:
+        click.echo("Invalid filters: {}".format(e), err=True)
+        raise click.Abort()
+
+    records = query_timings(
+        code=code,
+        computer=computer,
+        no_u_range=(no_u_min, no_u_max),
+        filters=filters,
+        limit=limit)
+    table = analyze_timings(
+        records, mesh_range=(mesh_min, mesh_max), threshold=threshold)
+    if len(table['pk']) == 0:
+        click.echo("No Siesta calculations with timing information found.",
+                   err=True)
+        return
+
+    click.echo("{:>8} {:>16} {:>10} {:>7} {:>10} {:>5} {:>12} {:>12} {:>12} "
+               "{}".format("pk", "computer", "time(s)", "no_u", "mesh",
+                           "scf", "s/orbital", "s/meshpt", "s/scf",
+                           "outlier"))
+    for i in range(len(table['pk'])):
+        if outliers_only and not table['outlier'][i]:
+            continue
+        click.echo(
+            "{:8d} {:>16} {:10.1f} {:7.0f} {:10.0f} {:5.0f} {:12.4e} {:12.4e} "
+            "{:12.4e} {}".format(
+                table['pk'][i], table['computer'][i][:16],
+                table['global_time'][i], table['no_u'][i],
+                table['mesh_points'][i], table['num_scf_iterations'][i],
+                table['time_per_orbital'][i], table['time_per_mesh_point'][i],
+                table['time_per_scf_iteration'][i], "*"
+                if table['outlier'][i] else ""))
+
+    click.echo("")
+    click.echo("{:>16} {:>6} {:>8} {:>12} {:>12} {:>12}".format(
+        "computer", "calcs", "outliers", "s/orbital", "s/meshpt", "s/scf"))
+    for name, count, outliers, medians in summarize_by(table, 'computer'):
+        click.echo("{:>16} {:6d} {:8d} {:12.4e} {:12.4e} {:12.4e}".format(
+            name[:16], count, outliers, medians['time_per_orbital'],
+            medians['time_per_mesh_point'],
+            medians['time_per_scf_iteration']))
+    click.echo("{} calculations, {} outliers (medians per computer)".format(
+        len(table['pk']), int(np.sum(table['outlier']))))
@@ -2,6 +2,7 @@
 """
 This module manages the PSF pseudopotentials in the local repository.
 """
+import re
 
 from aiida.common.utils import classproperty
 from aiida.orm.data.singlefile import SinglefileData
@@ -13,6 +14,28 @@ __contributors__ = "Victor M. Garcia-Suarez, Andrea Cepellotti"
 
 PSFGROUP_TYPE = 'data.psf.family'
 
+# Format of the family archives (see export_psf_family)
+PSF_ARCHIVE_VERSION = 1
+PSF_ARCHIVE_MANIFEST = 'manifest.json'
+_MD5_RE = re.compile(r'^[0-9a-f]{32}$')
+
+# Attributes of PsfData parsed from the header of the file (see
+# parse_psf), besides the element
+PSF_HEADER_ATTRIBUTES = [
+    'z_valence', 'xc_functional', 'relativistic', 'core_correction',
+    'cutoff_radii', 'num_grid_points'
+]
+
+_PSF_HEADER_LINES = 4
+_CUTOFF_RADIUS_RE = re.compile(r'(\d[spdfg])\s+-?[\d.]+\w?\s+r=\s*([\d.]+)')
+# Fortran drops the 'E' of exponents of three digits (e.g. 0.96-100)
+_FORTRAN_EXPONENT_RE = re.compile(r'(\d)([+-]\d{3})(?=\s|$)')
+_PSF_RADIAL_SECTIONS = {
+    'Radial': 'radial_grid',
+    'Core': 'core_charge',
+    'Valence': 'valence_charge',
+}
+
 
 def get_pseudos_from_structure(structure, family_name):
     """
@@ -25,66 +48,147 @@ def get_pseudos_from_structure(structure, family_name):
     :raise NotExistent: if no PSF for an element in the group is
        found in the group.
     """
-    from aiida.common.exceptions import NotExistent, MultipleObjectsError
-
-    family_pseudos = {}
-    family = PsfData.get_psf_group(family_name)
-    for node in family.nodes:
-        if isinstance(node, PsfData):
-            if node.element in family_pseudos:
-                raise MultipleObjectsError(
-                    "More than one PSF for element {} found in "
-                    "family {}".format(node.element, family_name))
-            family_pseudos[node.element] = node
-
-    pseudo_list = {}
+    from aiida.common.exceptions import NotExistent
+    from aiida.orm.querybuilder import QueryBuilder
+
+    family_index = get_family_element_index(family_name)
+
+    pks = {}
     for kind in structure.kinds:
         symbol = kind.symbol
         try:
-            pseudo_list[kind.name] = family_pseudos[symbol]
+            pks[kind.name] = family_index[symbol]
         except KeyError:
             raise NotExistent("No PSF for element {} found in family {}".
                               format(symbol, family_name))
 
-    return pseudo_list
+    # Only the pseudos of the structure are loaded
+    qb = QueryBuilder()
+    qb.append(
+        PsfData,
+        filters={'id': {
+            'in': list(set(pks.values()))
+        }},
+        project=['*'])
+    pseudos = dict((pseudo.pk, pseudo) for pseudo, in qb.iterall())
 
+    return dict((name, pseudos[pk]) for name, pk in pks.items())
 
-def upload_psf_family(folder,
-                      group_name,
-                      group_description,
-                      stop_if_existing=True):
+
+# The element index of the families (see get_family_element_index), by
+# name, with the pks of their members
+_family_index_cache = {}
+
+
+def _query_family(family_name, project):
+    from aiida.orm import Group
+    from aiida.orm.querybuilder import QueryBuilder
+
+    qb = QueryBuilder()
+    qb.append(
+        Group,
+        tag='family',
+        filters={
+            'name': family_name,
+            'type': PSFGROUP_TYPE
+        })
+    qb.append(PsfData, member_of='family', project=project)
+    return qb.all()
+
+
+def get_family_element_index(family_name):
     """
-    Upload a set of PSF files in a given group.
+    Return a dictionary with the pk of the PsfData of each element in a
+    family.
 
-    :param folder: a path containing all PSF files to be added.
-        Only files ending in .PSF (case-insensitive) are considered.
-    :param group_name: the name of the group to create. If it exists and is
-        non-empty, a UniquenessError is raised.
-    :param group_description: a string to be set as the group description.
-        Overwrites previous descriptions, if the group was existing.
-    :param stop_if_existing: if True, check for the md5 of the files and,
-        if the file already exists in the DB, raises a MultipleObjectsError.
-        If False, simply adds the existing PsfData node to the group.
+    The index is computed with a single projected query, and kept in
+    memory: later calls only query the pks of the members of the group
+    (without their attributes) to check that it has not changed.
+
+    :raise MultipleObjectsError: if more than one PSF for the same element is
+       found in the group.
+    :raise NotExistent: if the family does not exist.
+    """
+    from aiida.common.exceptions import MultipleObjectsError
+
+    members = frozenset(pk for pk, in _query_family(family_name, ['id']))
+    if not members:
+        # Raises NotExistent if there is no such family
+        PsfData.get_psf_group(family_name)
+
+    cached = _family_index_cache.get(family_name)
+    if cached is not None and cached[0] == members:
+        return dict(cached[1])
+
+    family_index = {}
+    for pk, element in _query_family(family_name,
+                                     ['id', 'attributes.element']):
+        if element in family_index:
+            raise MultipleObjectsError(
+                "More than one PSF for element {} found in "
+                "family {}".format(element, family_name))
+        family_index[element] = pk
+
+    _family_index_cache[family_name] = (members, family_index)
+    return dict(family_index)
+
+
+def md5_files(files, num_threads=8):
+    """
+    Returns the md5 checksums of a list of files, computed in a pool of
+    threads (hashlib and the reads release the GIL).
+    """
+    from multiprocessing.pool import ThreadPool
+    import aiida.common.utils
+
+    if num_threads <= 1 or len(files) <= 1:
+        return [aiida.common.utils.md5_file(f) for f in files]
+
+    pool = ThreadPool(min(num_threads, len(files)))
+    try:
+        return pool.map(aiida.common.utils.md5_file, files)
+    finally:
+        pool.close()
+        pool.join()
+
+
+def get_psf_by_md5(md5sums):
+    """
+    Returns a dictionary with the PsfData (the first stored, if there
+    are several) of each of the md5 checksums found in the DB, found
+    with a single query.
     """
-    import os
-    import aiida.common
-    from aiida.common import aiidalogger
-    from aiida.orm import Group
-    from aiida.common.exceptions import UniquenessError, NotExistent
-    from aiida.backends.utils import get_automatic_user
     from aiida.orm.querybuilder import QueryBuilder
-    if not os.path.isdir(folder):
-        raise ValueError("folder must be a directory")
 
-    # only files, and only those ending with .psf or .PSF;
-    # go to the real file if it is a symlink
-    files = [
-        os.path.realpath(os.path.join(folder, i)) for i in os.listdir(folder)
-        if os.path.isfile(os.path.join(folder, i)) and
-        i.lower().endswith('.psf')
-    ]
+    md5sums = list(set(md5sums))
+    if not md5sums:
+        return {}
+
+    qb = QueryBuilder()
+    qb.append(
+        PsfData,
+        tag='psf',
+        filters={'attributes.md5': {
+            'in': md5sums
+        }},
+        project=['*', 'attributes.md5'])
+    qb.order_by({'psf': ['id']})
+
+    pseudos = {}
+    for pseudo, md5sum in qb.iterall():
+        pseudos.setdefault(md5sum, pseudo)
+    return pseudos
 
-    nfiles = len(files)
+
+def _get_psf_family_group(group_name, group_description):
+    """
+    Return the PsfFamily group with the given name (unstored if it is
+    new) and whether it was created, after checking that it belongs to
+    the current user, and set its description.
+    """
+    from aiida.orm import Group
+    from aiida.common.exceptions import UniquenessError, NotExistent
+    from aiida.backends.utils import get_automatic_user
 
     try:
         group = Group.get(name=group_name, type_string=PSFGROUP_TYPE)
@@ -105,33 +209,21 @@ def upload_psf_family(folder,
     # Always update description, even if the group already existed
     group.description = group_description
 
-    # NOTE: GROUP SAVED ONLY AFTER CHECKS OF UNICITY
+    return group, group_created
 
-    pseudo_and_created = []
-
-    for f in files:
-        md5sum = aiida.common.utils.md5_file(f)
-        qb = QueryBuilder()
-        qb.append(PsfData, filters={'attributes.md5': {'==': md5sum}})
-        existing_psf = qb.first()
 
-        #existing_psf = PsfData.query(dbattributes__key="md5",
-        #                            dbattributes__tval = md5sum)
+def _store_psf_family(group, group_created, pseudo_and_created):
+    """
+    Check that there is a single pseudo per element in the group, and
+    store the group, the new pseudos and their membership in one
+    transaction.
 
-        if existing_psf is None:
-            # return the psfdata instances, not stored
-            pseudo, created = PsfData.get_or_create(
-                f, use_first=True, store_psf=False)
-            # to check whether only one psf per element exists
-            # NOTE: actually, created has the meaning of "to_be_created"
-            pseudo_and_created.append((pseudo, created))
-        else:
-            if stop_if_existing:
-                raise ValueError("A PSF with identical MD5 to "
-                                 " {} cannot be added with stop_if_existing"
-                                 "".format(f))
-            existing_psf = existing_psf[0]
-            pseudo_and_created.append((existing_psf, False))
+    :param pseudo_and_created: a list of (PsfData, created) tuples, with
+        created True for the unstored nodes
+    """
+    from aiida.common import aiidalogger
+    from aiida.common.exceptions import UniquenessError
+    from aiida_siesta.tools.transaction import BatchTransaction
 
     # check whether pseudo are unique per element
     elements = [(i[0].element, i[0].md5sum) for i in pseudo_and_created]
@@ -155,33 +247,288 @@ def upload_psf_family(folder,
         raise UniquenessError("More than one PSF found for the elements: " +
                               duplicates_string + ".")
 
-    # At this point, save the group, if still unstored
-    if group_created:
-        group.store()
+    # The group, the new nodes and the membership in one transaction
+    with BatchTransaction():
+        # At this point, save the group, if still unstored
+        if group_created:
+            group.store()
 
-    # save the psf in the database, and add them to group
-    for pseudo, created in pseudo_and_created:
-        if created:
-            pseudo.store()
+        # save the psf in the database, and add them to group
+        for pseudo, created in pseudo_and_created:
+            if created:
+                pseudo.store(with_transaction=False)
 
-            aiidalogger.debug("New node {} created for file {}".format(
-                pseudo.uuid, pseudo.filename))
-        else:
-            aiidalogger.debug("Reusing node {} for file {}".format(
-                pseudo.uuid, pseudo.filename))
+                aiidalogger.debug("New node {} created for file {}".format(
+                    pseudo.uuid, pseudo.filename))
+            else:
+                aiidalogger.debug("Reusing node {} for file {}".format(
+                    pseudo.uuid, pseudo.filename))
 
-    # Add elements to the group all togetehr
-    group.add_nodes(pseudo for pseudo, created in pseudo_and_created)
+        # Add elements to the group all togetehr
+        group.add_nodes(pseudo for pseudo, created in pseudo_and_created)
+
+
+def upload_psf_family(folder,
+                      group_name,
+                      group_description,
+                      stop_if_existing=True,
+                      num_threads=8):
+    """
+    Upload a set of PSF files in a given group.
+
+    :param folder: a path containing all PSF files to be added.
+        Only files ending in .PSF (case-insensitive) are considered.
+    :param group_name: the name of the group to create. If it exists and is
+        non-empty, a UniquenessError is raised.
+    :param group_description: a string to be set as the group description.
+        Overwrites previous descriptions, if the group was existing.
+    :param stop_if_existing: if True, check for the md5 of the files and,
+        if the file already exists in the DB, raises a MultipleObjectsError.
+        If False, simply adds the existing PsfData node to the group.
+    :param num_threads: the number of threads that compute the md5 of
+        the files.
+    """
+    import os
+    if not os.path.isdir(folder):
+        raise ValueError("folder must be a directory")
+
+    # only files, and only those ending with .psf or .PSF;
+    # go to the real file if it is a symlink
+    files = [
+        os.path.realpath(os.path.join(folder, i)) for i in os.listdir(folder)
+        if os.path.isfile(os.path.join(folder, i)) and
+        i.lower().endswith('.psf')
+    ]
+
+    nfiles = len(files)
+
+    group, group_created = _get_psf_family_group(group_name,
+                                                 group_description)
+
+    # NOTE: GROUP SAVED ONLY AFTER CHECKS OF UNICITY
+
+    # The md5 of all the files, and the existing nodes with one query
+    md5sums = md5_files(files, num_threads)
+    pseudo_and_created = _get_pseudo_and_created(
+        files, md5sums, stop_if_existing)
+
+    _store_psf_family(group, group_created, pseudo_and_created)
 
     nuploaded = len([_ for _, created in pseudo_and_created if created])
 
     return nfiles, nuploaded
 
 
+def _get_pseudo_and_created(files, md5sums, stop_if_existing):
+    """
+    Return a list of (PsfData, created) tuples for the files: the
+    existing node with the same md5 (found with a single query), or a
+    new unstored node (created True).
+    """
+    existing_psfs = get_psf_by_md5(md5sums)
+
+    pseudo_and_created = []
+    new_psfs = {}
+
+    for f, md5sum in zip(files, md5sums):
+        existing_psf = existing_psfs.get(md5sum)
+
+        if existing_psf is None:
+            if md5sum in new_psfs:
+                # An identical file in the folder: a single node
+                continue
+            # the psfdata instances, not stored
+            pseudo = PsfData(file=f)
+            new_psfs[md5sum] = pseudo
+            # to check whether only one psf per element exists
+            # NOTE: actually, created has the meaning of "to_be_created"
+            pseudo_and_created.append((pseudo, True))
+        else:
+            if stop_if_existing:
+                raise ValueError("A PSF with identical MD5 to "
+                                 " {} cannot be added with stop_if_existing"
+                                 "".format(f))
+            pseudo_and_created.append((existing_psf, False))
+
+    return pseudo_and_created
+
+
+def export_psf_family(family_name, archive_path):
+    """
+    Export a pseudopotential family to a compressed (tar.gz) archive,
+    with a manifest (manifest.json) that has the name and description
+    of the family and, for every pseudo, its file name, element, md5,
+    header attributes (see PSF_HEADER_ATTRIBUTES) and path in the
+    archive.
+
+    :return: the number of pseudos exported
+    """
+    import io
+    import json
+    import tarfile
+
+    group = PsfData.get_psf_group(family_name)
+    pseudos = [node for node in group.nodes if isinstance(node, PsfData)]
+
+    manifest = {
+        'version': PSF_ARCHIVE_VERSION,
+        'name': group.name,
+        'description': group.description,
+        'pseudos': [],
+    }
+
+    paths = []
+    for pseudo in sorted(pseudos, key=lambda node: node.element):
+        # The md5 keeps apart files with the same name
+        path = "pseudos/{}/{}".format(pseudo.md5sum, pseudo.filename)
+        entry = {
+            'filename': pseudo.filename,
+            'element': pseudo.element,
+            'md5': pseudo.md5sum,
+            'path': path,
+        }
+        entry.update((key, pseudo.get_attr(key))
+                     for key in PSF_HEADER_ATTRIBUTES
+                     if pseudo.get_attr(key, None) is not None)
+        manifest['pseudos'].append(entry)
+        paths.append((pseudo.get_file_abs_path(), path))
+
+    # The manifest goes first, so that it is read without decompressing
+    # the whole archive
+    data = json.dumps(manifest, indent=2, sort_keys=True).encode('utf-8')
+    info = tarfile.TarInfo(PSF_ARCHIVE_MANIFEST)
+    info.size = len(data)
+    with tarfile.open(archive_path, 'w:gz') as archive:
+        archive.addfile(info, io.BytesIO(data))
+        for abs_path, path in paths:
+            archive.add(abs_path, arcname=path)
+
+    return len(pseudos)
+
+
+def read_psf_archive_manifest(archive_path):
+    """
+    Return the manifest of a pseudopotential family archive (see
+    export_psf_family).
+    """
+    import json
+    import tarfile
+
+    with tarfile.open(archive_path, 'r:gz') as archive:
+        manifest = json.loads(
+            archive.extractfile(PSF_ARCHIVE_MANIFEST).read().decode('utf-8'))
+
+    if manifest.get('version') != PSF_ARCHIVE_VERSION:
+        raise ValueError("Unsupported version {} of the archive {}".format(
+            manifest.get('version'), archive_path))
+    for entry in manifest['pseudos']:
+        _check_psf_archive_entry(entry)
+    return manifest
+
+
+def _check_psf_archive_entry(entry):
+    # The md5 and file name end up in paths of the extracted files:
+    # only those written by export_psf_family are accepted
+    import os
+
+    md5sum = entry.get('md5')
+    filename = entry.get('filename')
+    if not isinstance(md5sum, basestring) or not _MD5_RE.match(md5sum):
+        raise ValueError("Invalid MD5 {!r} in the manifest".format(md5sum))
+    if (not isinstance(filename, basestring) or
+            filename in ('', '.', '..') or
+            os.path.basename(filename) != filename):
+        raise ValueError(
+            "Invalid file name {!r} in the manifest".format(filename))
+    if entry.get('path') != "pseudos/{}/{}".format(md5sum, filename):
+        raise ValueError("Invalid path {!r} in the manifest".format(
+            entry.get('path')))
+
+
+def import_psf_family(archive_path,
+                      group_name=None,
+                      group_description=None,
+                      stop_if_existing=False):
+    """
+    Import a pseudopotential family from an archive written by
+    export_psf_family. The pseudos already in the DB (by the md5 of the
+    manifest, with a single query) are not extracted, and the new ones
+    are stored in one transaction, with the group.
+
+    :param group_name: the name of the group, by default that of the
+        exported family.
+    :param group_description: the description of the group, by default
+        that of the exported family.
+    :param stop_if_existing: if True, raise a ValueError if a pseudo is
+        already in the DB.
+    :return: the number of pseudos in the archive and the number of new
+        nodes.
+    """
+    import os
+    import shutil
+    import tarfile
+    import tempfile
+
+    manifest = read_psf_archive_manifest(archive_path)
+    # A single entry for each md5
+    entries = []
+    md5sums = set()
+    for entry in manifest['pseudos']:
+        if entry['md5'] not in md5sums:
+            md5sums.add(entry['md5'])
+            entries.append(entry)
+    if group_name is None:
+        group_name = manifest['name']
+    if group_description is None:
+        group_description = manifest['description']
+
+    group, group_created = _get_psf_family_group(group_name,
+                                                 group_description)
+
+    existing_psfs = get_psf_by_md5([entry['md5'] for entry in entries])
+    if stop_if_existing and existing_psfs:
+        raise ValueError("PSFs with identical MD5 to {} cannot be added "
+                         "with stop_if_existing".format(", ".join(
+                             entry['filename'] for entry in entries
+                             if entry['md5'] in existing_psfs)))
+
+    workdir = tempfile.mkdtemp()
+    try:
+        # Only the new files are extracted
+        new_entries = [
+            entry for entry in entries if entry['md5'] not in existing_psfs
+        ]
+        files = []
+        with tarfile.open(archive_path, 'r:gz') as archive:
+            for entry in new_entries:
+                path = os.path.join(workdir, entry['md5'], entry['filename'])
+                os.makedirs(os.path.dirname(path))
+                with open(path, 'wb') as f:
+                    shutil.copyfileobj(archive.extractfile(entry['path']), f)
+                files.append(path)
+
+        for entry, md5sum in zip(new_entries, md5_files(files)):
+            if md5sum != entry['md5']:
+                raise ValueError("The MD5 of {} in the archive does not "
+                                 "match the manifest".format(entry['path']))
+
+        pseudo_and_created = [(existing_psfs[entry['md5']], False)
+                              for entry in entries
+                              if entry['md5'] in existing_psfs]
+        pseudo_and_created.extend((PsfData(file=f), True) for f in files)
+
+        _store_psf_family(group, group_created, pseudo_and_created)
+    finally:
+        shutil.rmtree(workdir)
+
+    return len(entries), len(files)
+
+
 def parse_psf(fname, check_filename=True):
     """
-    Try to get relevant information from the PSF. For the moment, only the
-    element name.
+    Get the relevant information from the header of the PSF (only the
+    first lines are read): the element name and, if they can be parsed,
+    the attributes in PSF_HEADER_ATTRIBUTES.
     If check_filename is True, raise a ParsingError exception if the filename
     does not start with the element name.
     """
@@ -194,37 +541,148 @@ def parse_psf(fname, check_filename=True):
     parsed_data = {}
 
     with open(fname) as f:
+        header = [f.readline() for _ in range(_PSF_HEADER_LINES)]
+
+    # Parse the element
+    element = None
+    for element in header[0].split():
+        break
+
+    # Only first letter capitalized!
+    if element is None:
+        raise ParsingError(
+            "Unable to find the element of PSF {}".format(fname))
+    element = element.capitalize()
+    if element not in _valid_symbols:
+        raise ParsingError(
+            "Unknown element symbol {} for file {}".format(element, fname))
+
+    if check_filename:
+        if not os.path.basename(fname).lower().startswith(element.lower()):
+            raise ParsingError("Filename {0} was recognized for element "
+                               "{1}, but the filename does not start "
+                               "with {1}".format(fname, element))
+
+    parsed_data['element'] = element
+    parsed_data.update(_parse_psf_header(header))
 
-        # Parse the element
-        element = None
-        for element in f.read().split():
-            break
+    return parsed_data
 
-        # Only first letter capitalized!
-        if element is None:
-            raise ParsingError(
-                "Unable to find the element of PSF {}".format(fname))
-        element = element.capitalize()
-        if element not in _valid_symbols:
-            raise ParsingError(
-                "Unknown element symbol {} for file {}".format(element, fname))
 
-        if check_filename:
-            if not os.path.basename(fname).lower().startswith(element.lower()):
-                raise ParsingError("Filename {0} was recognized for element "
-                                   "{1}, but the filename does not start "
-                                   "with {1}".format(fname, element))
+def _parse_psf_header(header):
+    # The first line has the element and the codes of the functional,
+    # of the relativistic treatment and of the core correction
+    tokens = header[0].split()
+    if len(tokens) >= 4:
+        parsed_data = {
+            'xc_functional': tokens[1],
+            'relativistic': tokens[2] == 'rel',
+            'core_correction': tokens[3] != 'nc',
+        }
+    else:
+        parsed_data = {}
+
+    # The valence configuration, with the cutoff radius of each
+    # channel, is in the title (e.g. "3s 2.00  r= 1.89/3p 2.00  r= 1.89/")
+    cutoff_radii = dict((orbital, float(radius))
+                        for orbital, radius in _CUTOFF_RADIUS_RE.findall(
+                            header[1] + header[2]))
+    if cutoff_radii:
+        parsed_data['cutoff_radii'] = cutoff_radii
 
-        parsed_data['element'] = element
+    try:
+        sizes = _read_psf_sizes(header[3])
+    except ValueError:
+        return parsed_data
+    parsed_data['num_grid_points'] = sizes['num_grid_points']
+    parsed_data['z_valence'] = sizes['z_valence']
 
     return parsed_data
 
 
+def _read_psf_sizes(line):
+    # Fortran format (1x,2i3,i5,3g20.12): the number of down and up
+    # pseudopotentials, of grid points, the grid parameters b and a,
+    # and the valence charge
+    return {
+        'num_down': int(line[1:4]),
+        'num_up': int(line[4:7]),
+        'num_grid_points': int(line[7:12]),
+        'z_valence': float(line[12:].split()[2]),
+    }
+
+
+def read_psf_radial_arrays(fname):
+    """
+    Read the radial grid of a PSF file and the functions given on it,
+    as written in the file.
+
+    :return: a dictionary with the arrays 'radial_grid', 'down_l' and
+        'down' (the angular momenta and the pseudopotentials, of shape
+        (number of pseudopotentials, number of grid points)), 'up_l' and
+        'up', 'core_charge' and 'valence_charge'
+    :raise ParsingError: if the file cannot be parsed
+    """
+    import numpy as np
+    from aiida.common.exceptions import ParsingError
+
+    with open(fname) as f:
+        lines = f.readlines()
+
+    try:
+        nr = _read_psf_sizes(lines[_PSF_HEADER_LINES - 1])['num_grid_points']
+    except (IndexError, ValueError):
+        raise ParsingError("Unable to read the sizes of PSF {}".format(fname))
+
+    # Sections of values, each after a "... follows" line
+    sections = []
+    read_l = False
+    for line in lines[_PSF_HEADER_LINES:]:
+        if 'follows' in line:
+            sections.append([line.split()[0], None, []])
+            read_l = '(l on next line)' in line
+        elif read_l:
+            sections[-1][1] = int(line.split()[0])
+            read_l = False
+        elif sections:
+            sections[-1][2].append(line)
+
+    arrays = {'down_l': [], 'down': [], 'up_l': [], 'up': []}
+    for name, l, values in sections:
+        text = _FORTRAN_EXPONENT_RE.sub(r'\1E\2', "".join(values))
+        try:
+            values = np.array(text.split(), dtype=float)
+        except ValueError as exc:
+            raise ParsingError("Unable to read the values after '{} ... "
+                               "follows' in PSF {}: {}".format(
+                                   name, fname, exc))
+        if len(values) != nr:
+            raise ParsingError("Found {} values instead of {} after '{} "
+                               "... follows' in PSF {}".format(
+                                   len(values), nr, name, fname))
+        if name in ('Down', 'Up'):
+            arrays[name.lower() + '_l'].append(l)
+            arrays[name.lower()].append(values)
+        elif name in _PSF_RADIAL_SECTIONS:
+            arrays[_PSF_RADIAL_SECTIONS[name]] = values
+
+    for name in ('down', 'up'):
+        arrays[name + '_l'] = np.array(arrays[name + '_l'], dtype=int)
+        arrays[name] = np.array(arrays[name], dtype=float).reshape(-1, nr)
+
+    return arrays
+
+
 class PsfData(SinglefileData):
     """
     Function not yet documented.
     """
 
+    # If True, _validate parses and hashes the file again instead of
+    # using the data kept by _get_psf_info for its size and
+    # modification time (to find a change that keeps both)
+    strict_validation = False
+
     @classmethod
     def get_or_create(cls, filename, use_first=False, store_psf=True):
         """
@@ -276,17 +734,16 @@ class PsfData(SinglefileData):
     def store(self, *args, **kwargs):
         """
         Store the node, reparsing the file so that the md5 and the element
-        are correctly reset.
+        are correctly reset (unless the file is unchanged since it was
+        parsed, see _get_psf_info).
         """
         from aiida.common.exceptions import ParsingError, ValidationError
-        import aiida.common.utils
 
         psf_abspath = self.get_file_abs_path()
         if not psf_abspath:
             raise ValidationError("No valid PSF was passed!")
 
-        parsed_data = parse_psf(psf_abspath)
-        md5sum = aiida.common.utils.md5_file(psf_abspath)
+        parsed_data, md5sum = self._get_psf_info(psf_abspath)
 
         try:
             element = parsed_data['element']
@@ -296,6 +753,7 @@ class PsfData(SinglefileData):
 
         self._set_attr('element', str(element))
         self._set_attr('md5', md5sum)
+        self._set_header_attrs(parsed_data)
 
         return super(PsfData, self).store(*args, **kwargs)
 
@@ -307,18 +765,44 @@ class PsfData(SinglefileData):
         Note that the hash has to be stored in a _md5 attribute, otherwise
         the pseudo will not be found.
         """
-        queryset = cls.query(dbattributes__key='md5', dbattributes__tval=md5)
-        return list(queryset)
+        from aiida.orm.querybuilder import QueryBuilder
+
+        qb = QueryBuilder()
+        qb.append(cls, filters={'attributes.md5': {'==': md5}})
+        return [pseudo for pseudo, in qb.all()]
+
+    def _get_psf_info(self, path):
+        """
+        Returns the parsed data (see parse_psf) and the md5 of a file.
+
+        While the node is unstored, they are kept for the size and
+        modification time of the file, so that the file is read once
+        by set_file, store and _validate (as long as it is unchanged;
+        only AiiDA writes to the copy of an unstored node).
+        """
+        import os
+        import aiida.common.utils
+
+        stat = os.stat(path)
+        key = (path, stat.st_size, stat.st_mtime)
+        cached = getattr(self, '_psf_info', None)
+        if cached is not None and cached[0] == key and not self.is_stored:
+            return cached[1]
+
+        info = parse_psf(path), aiida.common.utils.md5_file(path)
+        if not self.is_stored:
+            self._psf_info = (key, info)
+        return info
 
     def set_file(self, filename):
         """
         I pre-parse the file to store the attributes.
         """
+        import os
         from aiida.common.exceptions import ParsingError
-        import aiida.common.utils
 
-        parsed_data = parse_psf(filename)
-        md5sum = aiida.common.utils.md5_file(filename)
+        source_stat = os.stat(filename)
+        parsed_data, md5sum = self._get_psf_info(filename)
 
         try:
             element = parsed_data['element']
@@ -328,8 +812,38 @@ class PsfData(SinglefileData):
 
         super(PsfData, self).set_file(filename)
 
+        # The same data hold for the copy in the repository, unless the
+        # file was changed meanwhile
+        stat = os.stat(filename)
+        if (stat.st_size, stat.st_mtime) == (source_stat.st_size,
+                                             source_stat.st_mtime):
+            psf_abspath = self.get_file_abs_path()
+            stat = os.stat(psf_abspath)
+            self._psf_info = ((psf_abspath, stat.st_size, stat.st_mtime),
+                              (parsed_data, md5sum))
+
         self._set_attr('element', str(element))
         self._set_attr('md5', md5sum)
+        self._set_header_attrs(parsed_data)
+
+    def _set_header_attrs(self, parsed_data):
+        """
+        Set the attributes in PSF_HEADER_ATTRIBUTES that were parsed.
+        """
+        for key in PSF_HEADER_ATTRIBUTES:
+            if key in parsed_data:
+                self._set_attr(key, parsed_data[key])
+
+    def get_radial_arrays(self):
+        """
+        Return the radial grid and the functions on it (see
+        read_psf_radial_arrays), read from the file on the first call.
+        """
+        arrays = getattr(self, '_radial_arrays', None)
+        if arrays is None or not self.is_stored:
+            arrays = read_psf_radial_arrays(self.get_file_abs_path())
+            self._radial_arrays = arrays
+        return arrays
 
     def get_psf_family_names(self):
         """
@@ -351,9 +865,33 @@ class PsfData(SinglefileData):
     def md5sum(self):
         return self.get_attr('md5', None)
 
+    @property
+    def z_valence(self):
+        return self.get_attr('z_valence', None)
+
+    @property
+    def xc_functional(self):
+        return self.get_attr('xc_functional', None)
+
+    @property
+    def relativistic(self):
+        return self.get_attr('relativistic', None)
+
+    @property
+    def core_correction(self):
+        return self.get_attr('core_correction', None)
+
+    @property
+    def cutoff_radii(self):
+        return self.get_attr('cutoff_radii', None)
+
+    @property
+    def num_grid_points(self):
+        return self.get_attr('num_grid_points', None)
+
     def _validate(self):
-        from aiida.common.exceptions import ValidationError, ParsingError
         import aiida.common.utils
+        from aiida.common.exceptions import ValidationError, ParsingError
 
         super(PsfData, self)._validate()
 
@@ -361,12 +899,16 @@ class PsfData(SinglefileData):
         if not psf_abspath:
             raise ValidationError("No valid PSF was passed!")
 
+        # (see strict_validation)
         try:
-            parsed_data = parse_psf(psf_abspath)
+            if self.strict_validation:
+                parsed_data = parse_psf(psf_abspath)
+                md5 = aiida.common.utils.md5_file(psf_abspath)
+            else:
+                parsed_data, md5 = self._get_psf_info(psf_abspath)
         except ParsingError:
             raise ValidationError("The file '{}' could not be "
                                   "parsed".format(psf_abspath))
-        md5 = aiida.common.utils.md5_file(psf_abspath)
 
         try:
             element = parsed_data['element']
@@ -0,0 +1,182 @@
+# -*- coding: utf-8 -*-
+"""
+Readers for the band-structure (SystemLabel.bands) and eigenvalue
+(SystemLabel.EIG) files written by Siesta, shared by the parsers.
+
+The band-structure file has a header, followed by a block per k-point
+with its coordinate(s) and then the energies of every band, spin-up
+first:
+
+* BandLines: ef; kmin kmax; emin emax; nbands nspin nk; then, for each
+  k-point, its coordinate along the path and nspin*nbands energies.
+  The labels of the path come after the last block.
+* BandPoints: ef; emin emax; nbands nspin nk; then, for each k-point,
+  its three coordinates and nspin*nbands energies.
+
+The eigenvalue file has the header ef; nbands nspin nk, and then, for
+each k-point, its index and nspin*nbands energies. The k-point file
+(SystemLabel.KP) has the number of k-points, and then, for each one,
+its index, its cartesian coordinates (Bohr^-1) and its weight.
+
+The numbers are read in chunks of text and converted straight into a
+preallocated array, so the peak memory stays close to the size of the
+final array, whatever the size of the file.
+"""
+import numpy as np
+
+# Number of characters read (and converted) at a time
+CHUNK_SIZE = 4 * 1024 * 1024
+
+
+def read_values(f, out, chunk_size=None):
+    """
+    Fills the 1-d array out with the next len(out) numbers of the
+    (whitespace separated) text file f.
+
+    :return: the number of values read, smaller than len(out) if the
+        file ends before. Anything after those values (e.g. the labels
+        of a BandLines file) is ignored.
+    """
+    if chunk_size is None:
+        chunk_size = CHUNK_SIZE
+    nread = 0
+    tail = ''
+    while nread < len(out):
+        chunk = f.read(chunk_size)
+        if chunk:
+            text = tail + chunk
+            # The last token may go on in the next chunk
+            cut = max(text.rfind(c) for c in ' \t\r\n')
+            if cut < 0:
+                tail = text
+                continue
+            text, tail = text[:cut], text[cut:]
+        elif tail.strip():
+            text, tail = tail, ''
+        else:
+            break
+
+        if not text.strip():
+            # (np.fromstring would return a spurious -1)
+            continue
+        values = np.fromstring(text, dtype=out.dtype, sep=' ')
+        count = min(len(values), len(out) - nread)
+        out[nread:nread + count] = values[:count]
+        nread += count
+
+    return nread
+
+
+def _read_header(f, ntokens):
+    tokens = []
+    while len(tokens) < ntokens:
+        line = f.readline()
+        if not line:
+            raise ValueError("Incomplete header")
+        tokens.extend(line.split())
+    return tokens
+
+
+def _read_kpoint_blocks(f, path, nkpoints, row_length, dtype):
+    data = np.empty((nkpoints, row_length), dtype=dtype)
+    nread = read_values(f, data.reshape(-1))
+    if nread < data.size:
+        raise ValueError("Found {} values in {} instead of {}".format(
+            nread, path, data.size))
+    return data
+
+
+def _split_spins(energies, nspins, nbands):
+    """
+    Returns a view (nk, nbands), or (2, nk, nbands) for spin-polarized
+    calculations, of the energies (nk, nspins*nbands) of each k-point.
+    """
+    energies = energies.reshape(len(energies), nspins, nbands)
+    if nspins == 2:
+        return energies.transpose(1, 0, 2)
+    return energies[:, 0, :]
+
+
+def read_bands_file(bands_path, band_lines, dtype=np.float64):
+    """
+    Reads the energies in a Siesta band-structure file.
+
+    :param bands_path: path to the file
+    :param band_lines: True for a BandLines file (k-point path with
+        labels), False for a BandPoints one
+    :param dtype: the float type of the arrays (e.g. np.float32 to
+        halve the memory used)
+    :return: a tuple (bands, coords). bands is an array (nk, nbands),
+        or (2, nk, nbands) for spin-polarized calculations. coords
+        holds the coordinate of each k-point along the path
+        (zeros for BandPoints files).
+    :raise NotImplementedError: for non-collinear spin
+    :raise ValueError: if the file is truncated
+    """
+    if band_lines:
+        nheader, ncoords = 8, 1
+    else:
+        nheader, ncoords = 6, 3
+
+    with open(bands_path) as f:
+        tokens = _read_header(f, nheader)
+        nbands, nspins, nkpoints = [int(t) for t in tokens[nheader - 3:]]
+        if nspins not in (1, 2):
+            raise NotImplementedError(
+                'nspins=4: non collinear bands not implemented yet')
+        data = _read_kpoint_blocks(f, bands_path, nkpoints,
+                                   ncoords + nspins * nbands, dtype)
+
+    if band_lines:
+        coords = data[:, 0].copy()
+    else:
+        coords = np.zeros(nkpoints, dtype=dtype)
+
+    bands = _split_spins(data[:, ncoords:], nspins, nbands)
+
+    return bands, coords
+
+
+def read_eig_file(eig_path, dtype=np.float64):
+    """
+    Reads the eigenvalues in a Siesta .EIG file.
+
+    :param eig_path: path to the file
+    :param dtype: the float type of the array
+    :return: a tuple (ef, bands), with the Fermi energy and an array
+        (nk, nbands), or (2, nk, nbands) for spin-polarized
+        calculations, in the order of the k-points of the .KP file
+    :raise NotImplementedError: for non-collinear spin
+    :raise ValueError: if the file is truncated
+    """
+    with open(eig_path) as f:
+        tokens = _read_header(f, 4)
+        ef = float(tokens[0])
+        nbands, nspins, nkpoints = [int(t) for t in tokens[1:4]]
+        if nspins not in (1, 2):
+            raise NotImplementedError(
+                'nspins=4: non collinear bands not implemented yet')
+        # Each block starts with the index of the k-point
+        data = _read_kpoint_blocks(f, eig_path, nkpoints,
+                                   1 + nspins * nbands, dtype)
+
+    bands = _split_spins(data[:, 1:], nspins, nbands)
+
+    return ef, bands
+
+
+def read_kp_file(kp_path, dtype=np.float64):
+    """
+    Reads the k-points in a Siesta .KP file.
+
+    :param kp_path: path to the file
+    :param dtype: the float type of the arrays
+    :return: a tuple (kpoints, weights), with the cartesian coordinates
+        (nk, 3) of the k-points, in Bohr^-1, and their weights (nk)
+    :raise ValueError: if the file is truncated
+    """
+    with open(kp_path) as f:
+        nkpoints = int(_read_header(f, 1)[0])
+        data = _read_kpoint_blocks(f, kp_path, nkpoints, 5, dtype)
+
+    return data[:, 1:4], data[:, 4]
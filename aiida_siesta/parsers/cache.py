@@ -0,0 +1,193 @@
+# -*- coding: utf-8 -*-
+"""
+On-disk cache of the results extracted by the Siesta parser, keyed by
+the contents of the retrieved files and of the parser modules, so
+that parsing byte-identical files again (e.g. when re-parsing) does
+not read them.
+
+The cache is enabled by setting the AIIDA_SIESTA_PARSE_CACHE
+environment variable to a directory. Its size is bounded by
+AIIDA_SIESTA_PARSE_CACHE_MB (default 1024 MB): when it is exceeded, the
+least recently used entries are removed.
+
+The entries are unpickled when they are read, so the directory must
+not be writable by other users.
+"""
+import errno
+import hashlib
+import os
+import tempfile
+
+try:
+    import cPickle as pickle
+except ImportError:
+    import pickle
+
+CACHE_DIR_VARIABLE = 'AIIDA_SIESTA_PARSE_CACHE'
+CACHE_SIZE_VARIABLE = 'AIIDA_SIESTA_PARSE_CACHE_MB'
+DEFAULT_MAX_SIZE_MB = 1024
+
+# Bytes hashed at a time
+_HASH_BLOCK_SIZE = 1024 * 1024
+_SUFFIX = '.pickle'
+
+
+def hash_file(path):
+    """
+    Returns the SHA-1 hex digest of the contents of a file, or 'none'
+    if path is None.
+    """
+    if path is None:
+        return 'none'
+    sha = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(_HASH_BLOCK_SIZE), b''):
+            sha.update(block)
+    return sha.hexdigest()
+
+
+def hash_modules(modules):
+    """
+    Returns the SHA-1 hex digest of the source files of a list of
+    modules, so that cached results are not used after the code that
+    extracted them changes.
+    """
+    sha = hashlib.sha1()
+    for module in modules:
+        path = module.__file__
+        source = os.path.splitext(path)[0] + '.py'
+        if os.path.exists(source):
+            path = source
+        sha.update(hash_file(path).encode('ascii'))
+    return sha.hexdigest()
+
+
+class ParseCache(object):
+    """
+    A directory of pickled results, one file per key, with LRU
+    eviction (by modification time, which is updated on every hit).
+    Entries are written to a temporary file and renamed, so that
+    several processes can share the cache.
+    """
+
+    def __init__(self, directory, max_size_mb=DEFAULT_MAX_SIZE_MB):
+        self.directory = directory
+        self.max_size = int(max_size_mb * 1024 * 1024)
+        try:
+            os.makedirs(directory)
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+
+    def make_key(self, paths, *extra):
+        """
+        Returns the key for the files in paths (a list, with None for
+        the missing ones) and any extra values that affect the results
+        (e.g. the parser version).
+        """
+        sha = hashlib.sha1()
+        for path in paths:
+            sha.update(hash_file(path).encode('ascii'))
+        for value in extra:
+            sha.update(repr(value).encode('utf-8'))
+        return sha.hexdigest()
+
+    def _path(self, key):
+        return os.path.join(self.directory, key + _SUFFIX)
+
+    def get(self, key):
+        """
+        Returns the results stored for key, or None.
+
+        The entry is unpickled: the directory must not be writable by
+        other users.
+        """
+        path = self._path(key)
+        try:
+            with open(path, 'rb') as f:
+                results = pickle.load(f)
+        except (IOError, OSError):
+            return None
+        except Exception:
+            # A corrupted entry
+            self._remove(path)
+            return None
+
+        try:
+            os.utime(path, None)
+        except OSError:
+            pass
+        return results
+
+    def put(self, key, results):
+        """
+        Stores the results for key, and evicts the least recently
+        used entries if the cache is over its size.
+        """
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                pickle.dump(results, f, pickle.HIGHEST_PROTOCOL)
+            os.rename(tmp_path, self._path(key))
+        except Exception:
+            self._remove(tmp_path)
+            raise
+        self.evict()
+
+    def evict(self):
+        """
+        Removes the least recently used entries until the cache is
+        within its size.
+        """
+        entries = []
+        total = 0
+        for name in os.listdir(self.directory):
+            if not name.endswith(_SUFFIX):
+                continue
+            path = os.path.join(self.directory, name)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                # Removed by another process
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+            total += stat.st_size
+
+        entries.sort()
+        for _, size, path in entries:
+            if total <= self.max_size:
+                break
+            self._remove(path)
+            total -= size
+
+    def clear(self):
+        """
+        Removes all the entries.
+        """
+        for name in os.listdir(self.directory):
+            if name.endswith(_SUFFIX):
+                self._remove(os.path.join(self.directory, name))
+
+    @staticmethod
+    def _remove(path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+
+def get_parse_cache():
+    """
+    Returns the ParseCache set up by the environment variables, or
+    None if the cache is not enabled.
+
+    :raise ValueError: if the size in AIIDA_SIESTA_PARSE_CACHE_MB is
+        not a number
+    :raise OSError: if the directory cannot be created
+    """
+    directory = os.environ.get(CACHE_DIR_VARIABLE)
+    if not directory:
+        return None
+    max_size_mb = float(
+        os.environ.get(CACHE_SIZE_VARIABLE, DEFAULT_MAX_SIZE_MB))
+    return ParseCache(directory, max_size_mb)
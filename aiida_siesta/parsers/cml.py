@@ -0,0 +1,431 @@
+# -*- coding: utf-8 -*-
+"""
+Streaming reader for the CML (XML) file written by Siesta.
+
+The file is scanned with incremental parsing events, and every <module>
+element is discarded as soon as it has been closed and inspected. Only
+the elements that the parser helpers need are kept, in a CMLIndex, so
+the memory used does not grow with the number of geometry (or SCF)
+steps of the run, and the helpers do not need to search the document.
+"""
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
+
+import numpy as np
+
+
+def local_name(tag):
+    """
+    Strips the namespace from an ElementTree tag
+    ('{http://www.xml-cml.org/schema}module' -> 'module')
+    """
+    return tag.rsplit('}', 1)[-1]
+
+
+def is_geometry_step(module):
+    """
+    Geometry modules are "step" modules (with a 'serial' attribute)
+    which are not SCF iterations.
+    """
+    return ('serial' in module.attrib
+            and module.get('dictRef') != "SCF")
+
+
+def properties_by_dictref(module):
+    """
+    Maps the 'dictRef' of every <property> element in the module
+    (nested ones included) to the element. Later entries win.
+    """
+    return dict((p.get('dictRef'), p) for p in module.iter('property')
+                if 'dictRef' in p.attrib)
+
+
+def matrix_to_array(matrix):
+    """
+    Converts the text of a CML <matrix> element into an array, in one
+    go. The values are stored column after column (Fortran order), so
+    the array has one row per column of the matrix: its shape is
+    ('columns', 'rows').
+
+    :param matrix: the <matrix> element
+    :raise ValueError: if the number of values is wrong
+    """
+    nrows = int(matrix.get('rows'))
+    ncols = int(matrix.get('columns'))
+
+    text = matrix.text or ''
+    if text.strip():
+        values = np.fromstring(text, sep=' ')
+    else:
+        # (np.fromstring would return a spurious -1)
+        values = np.empty(0)
+    if len(values) != nrows * ncols:
+        raise ValueError("Matrix with {} values instead of {} x {}".format(
+            len(values), nrows, ncols))
+
+    return values.reshape(ncols, nrows)
+
+
+def get_forces_and_stress(properties, natoms=None):
+    """
+    Returns the forces (natoms x 3) and stress (3 x 3) arrays in
+    the properties (by dictRef) of an "SCF Finalization" module,
+    None for those missing.
+
+    Siesta writes the forces as a matrix with 3 rows and one column
+    per atom. A matrix with one row per atom and 3 columns is only
+    accepted when its size says so unambiguously (natoms != 3).
+
+    :param natoms: the number of atoms, to validate the forces
+    :raise ValueError: if the matrices have a wrong size
+    """
+    forces = None
+    stress = None
+    if 'siesta:forces' in properties:
+        matrix = properties['siesta:forces'].find('matrix')
+        nrows = int(matrix.get('rows'))
+        ncols = int(matrix.get('columns'))
+        forces = matrix_to_array(matrix)
+        if (natoms is not None and natoms != 3 and nrows == natoms
+                and ncols == 3):
+            forces = forces.T
+        elif nrows != 3 or (natoms is not None and ncols != natoms):
+            raise ValueError(
+                "Forces matrix of {} rows x {} columns instead of 3 x "
+                "{}".format(nrows, ncols,
+                            natoms if natoms is not None else 'natoms'))
+    if 'siesta:stress' in properties:
+        stress = matrix_to_array(properties['siesta:stress'].find('matrix'))
+        if stress.shape != (3, 3):
+            raise ValueError("Stress matrix of {} rows x {} columns".format(
+                stress.shape[1], stress.shape[0]))
+    return forces, stress
+
+
+class RowBuffer(object):
+    """
+    A contiguous array that grows (by doubling its capacity) one row
+    at a time. Rows have a fixed shape.
+    """
+
+    def __init__(self, row_shape, dtype=float, capacity=16):
+        self._data = np.empty((capacity, ) + tuple(row_shape), dtype=dtype)
+        self._size = 0
+
+    def __len__(self):
+        return self._size
+
+    def next_row(self):
+        """
+        Returns a (writable) view of a new row, at the end of the array.
+        """
+        if self._size == len(self._data):
+            data = np.empty((2 * len(self._data), ) + self._data.shape[1:],
+                            dtype=self._data.dtype)
+            data[:self._size] = self._data
+            self._data = data
+        self._size += 1
+        # (a 0-d view, rather than a copy, for scalar rows)
+        return self._data[self._size - 1, ...]
+
+    def get_array(self):
+        return self._data[:self._size].copy()
+
+
+class CMLTrajectory(object):
+    """
+    Cells, positions, forces, stress and energies of every geometry
+    step, stored in contiguous arrays as the steps are read.
+
+    Values missing for a step (e.g. forces, if the step did not
+    reach its "SCF Finalization" module) are set to NaN.
+    """
+    energy_names = ['siesta:E_KS', 'siesta:FreeE']
+
+    def __init__(self):
+        self.symbols = None
+        self._steps = None
+
+    @property
+    def numsteps(self):
+        if self._steps is None:
+            return 0
+        return len(self._steps['steps'])
+
+    def _setup(self, natoms):
+        self._steps = {
+            'steps': RowBuffer((), dtype=int),
+            'cells': RowBuffer((3, 3)),
+            'positions': RowBuffer((natoms, 3)),
+            'forces': RowBuffer((natoms, 3)),
+            'stress': RowBuffer((3, 3)),
+        }
+        for name in self.energy_names:
+            self._steps[name] = RowBuffer(())
+
+    def add_step(self, module, final_properties):
+        """
+        Appends a geometry step.
+
+        :param module: the geometry (step) module
+        :param final_properties: the properties (by dictRef) of the
+            "SCF Finalization" module of the step, or None
+        """
+        atoms = list(module.iter('atom'))
+        if self.symbols is None:
+            self.symbols = [a.get('elementType') for a in atoms]
+            self._setup(len(atoms))
+        natoms = len(self.symbols)
+        if len(atoms) != natoms:
+            raise ValueError("Geometry step {} has {} atoms instead of "
+                             "{}".format(module.get('serial'), len(atoms),
+                                         natoms))
+
+        # The coordinates are converted in one go, without
+        # building per-atom lists
+        coords = " ".join(
+            " ".join((a.get('x3'), a.get('y3'), a.get('z3'))) for a in atoms)
+        self._steps['positions'].next_row()[...] = np.fromstring(
+            coords, sep=" ").reshape(natoms, 3)
+
+        vectors = " ".join(v.text for v in module.iter('latticeVector'))
+        self._steps['cells'].next_row()[...] = np.fromstring(
+            vectors, sep=" ").reshape(3, 3)
+
+        self._steps['steps'].next_row()[...] = int(module.get('serial'))
+
+        if final_properties is None:
+            final_properties = {}
+        forces, stress = get_forces_and_stress(final_properties, natoms)
+        for name, values in [('forces', forces), ('stress', stress)]:
+            row = self._steps[name].next_row()
+            if values is None:
+                row[...] = np.nan
+            else:
+                row[...] = values
+        for name in self.energy_names:
+            prop = final_properties.get(name)
+            if prop is None:
+                value = np.nan
+            else:
+                value = float(prop.find('scalar').text)
+            self._steps[name].next_row()[...] = value
+
+    def get_arrays(self):
+        """
+        Returns a dictionary with the arrays 'steps' (s), 'cells'
+        (s x 3 x 3), 'positions' and 'forces' (s x n x 3), 'stress'
+        (s x 3 x 3), and one array (s) per energy, named as the
+        scalars in the output parameters (e.g. 'E_KS'), for s steps
+        and n atoms.
+        """
+        if self._steps is None:
+            return {}
+        arrays = {}
+        for name, buf in self._steps.items():
+            arrays[name.split(':')[-1]] = buf.get_array()
+        return arrays
+
+
+class CMLSCFHistory(object):
+    """
+    The values of every SCF iteration, and the number of iterations
+    of every geometry step, stored in contiguous arrays as the
+    iterations are read.
+
+    Values missing for an iteration (or step) are set to NaN.
+    """
+    # Properties of the SCF modules
+    iteration_names = ['siesta:Eharrs', 'siesta:E_KS', 'siesta:FreeE',
+                       'siesta:Ef', 'siesta:dDmax', 'siesta:dHmax']
+    # Properties of the "SCF Finalization" module of each step
+    step_names = ['siesta:E_KS', 'siesta:E_Fermi']
+
+    def __init__(self):
+        self._iterations = {'iteration_step': RowBuffer((), dtype=int)}
+        for name in self.iteration_names:
+            self._iterations[name] = RowBuffer(())
+        self._steps = {
+            'steps': RowBuffer((), dtype=int),
+            'scf_iterations': RowBuffer((), dtype=int),
+        }
+        for name in self.step_names:
+            self._steps[self._step_key(name)] = RowBuffer(())
+        # Iterations of the geometry step being read
+        self._pending = 0
+
+    @staticmethod
+    def _step_key(name):
+        # 'siesta:E_KS' -> 'step_E_KS'
+        return 'step_' + name.split(':')[-1]
+
+    @property
+    def numiterations(self):
+        return len(self._iterations['iteration_step'])
+
+    def add_iteration(self, module):
+        """
+        Appends an SCF iteration (module), of the geometry step being
+        read.
+        """
+        props = properties_by_dictref(module)
+        for name in self.iteration_names:
+            prop = props.get(name)
+            if prop is None:
+                value = np.nan
+            else:
+                value = float(prop.find('scalar').text)
+            self._iterations[name].next_row()[...] = value
+        self._pending += 1
+
+    def end_step(self, module, final_properties):
+        """
+        Closes a geometry step, which owns the iterations added since
+        the previous one.
+
+        :param module: the geometry (step) module
+        :param final_properties: the properties (by dictRef) of the
+            "SCF Finalization" module of the step, or None
+        """
+        serial = int(module.get('serial'))
+        for _ in range(self._pending):
+            self._iterations['iteration_step'].next_row()[...] = serial
+        self._steps['steps'].next_row()[...] = serial
+        self._steps['scf_iterations'].next_row()[...] = self._pending
+        self._pending = 0
+
+        if final_properties is None:
+            final_properties = {}
+        for name in self.step_names:
+            prop = final_properties.get(name)
+            if prop is None:
+                value = np.nan
+            else:
+                value = float(prop.find('scalar').text)
+            self._steps[self._step_key(name)].next_row()[...] = value
+
+    def get_arrays(self):
+        """
+        Returns a dictionary with the arrays of the i SCF iterations:
+        'iteration_step' (the serial of the geometry step of each
+        iteration) and one array (i) per property, named as in the CML
+        file (e.g. 'dDmax'); and those of the s geometry steps:
+        'steps', 'scf_iterations' (the number of iterations of each
+        step) and the final 'step_E_KS' and 'step_E_Fermi'.
+        """
+        arrays = {}
+        for name, buf in self._iterations.items():
+            arrays[name.split(':')[-1]] = buf.get_array()
+        for name, buf in self._steps.items():
+            arrays[name.split(':')[-1]] = buf.get_array()
+        return arrays
+
+
+class CMLIndex(object):
+    """
+    The items of a Siesta CML file that the parser needs, recorded in
+    a single traversal of the file:
+
+    * metadata: a dictionary {name: content}
+    * first_step: the first geometry ("step") module
+    * last_step: the last geometry module (possibly the first one)
+    * scf_final: the last "SCF Finalization" module
+
+    plus the <property> elements of first_step and scf_final, keyed
+    by their 'dictRef' attribute (first_step_properties and
+    scf_final_properties), the data of every geometry step
+    (trajectory, a CMLTrajectory) and of every SCF iteration
+    (scf_history, a CMLSCFHistory). The geometry modules kept do not
+    include their nested (SCF) modules.
+    """
+
+    def __init__(self):
+        self.metadata = {}
+        self.first_step = None
+        self.last_step = None
+        self.scf_final = None
+        self.first_step_properties = {}
+        self.scf_final_properties = {}
+        self.trajectory = CMLTrajectory()
+        self.scf_history = CMLSCFHistory()
+        # "SCF Finalization" of the geometry step being read
+        self._step_final_properties = None
+
+    @property
+    def variable_geometry(self):
+        """
+        Whether the calculation involves changes in geometry, judging by
+        the type of the first step.
+        """
+        if self.first_step is None:
+            return False
+        return self.first_step.get('dictRef') != "Single-Point"
+
+    def add_metadata(self, elem):
+        self.metadata[elem.get('name')] = elem.get('content')
+
+    def add_module(self, elem):
+        """
+        Records a closed <module> element, if relevant.
+        """
+        if elem.get('title') == "SCF Finalization":
+            self.scf_final = elem
+            self.scf_final_properties = properties_by_dictref(elem)
+            self._step_final_properties = self.scf_final_properties
+        elif elem.get('dictRef') == "SCF":
+            self.scf_history.add_iteration(elem)
+        elif is_geometry_step(elem):
+            if self.first_step is None:
+                self.first_step = elem
+                self.first_step_properties = properties_by_dictref(elem)
+            self.last_step = elem
+            self.trajectory.add_step(elem, self._step_final_properties)
+            self.scf_history.end_step(elem, self._step_final_properties)
+            self._step_final_properties = None
+
+
+def parse_cml_file(xml_path):
+    """
+    Parses the CML file incrementally and returns its CMLIndex.
+
+    Every <module> and <metadata> element is detached from its parent
+    once it has been recorded, so the memory used does not grow with
+    the number of steps. Tags are stripped of their namespace.
+
+    :param xml_path: path to the CML file
+    :raise SyntaxError: (ElementTree.ParseError) if the file is malformed
+    """
+    cml_index = CMLIndex()
+
+    root = None
+    stack = []
+    for event, elem in ElementTree.iterparse(xml_path,
+                                             events=('start', 'end')):
+        if event == 'start':
+            if root is None:
+                root = elem
+            stack.append(elem)
+            continue
+
+        stack.pop()
+        elem.tag = local_name(elem.tag)
+        if not stack:
+            # End of the root element
+            break
+        parent = stack[-1]
+
+        if elem.tag == 'metadata':
+            cml_index.add_metadata(elem)
+        elif elem.tag == 'module':
+            cml_index.add_module(elem)
+        elif parent is not root:
+            # Leave it to the enclosing element
+            continue
+
+        # Finished elements are detached, so that nothing
+        # accumulates in the tree being built
+        parent.remove(elem)
+
+    return cml_index
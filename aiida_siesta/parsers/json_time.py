@@ -1,79 +1,158 @@
-def get_timing_info(json_file):
-    
+# -*- coding: utf-8 -*-
+"""
+Reader for the tree timer file (time.json) written by Siesta.
+
+The whole tree of sections under 'global_section' is flattened into
+arrays, with one entry per section (in the order of the file): its
+path (e.g. 'siesta/IterGeom/IterSCF/compute_dm'), total time, number
+of calls, own time (not spent in its subsections) and the index of its
+parent section.
+"""
+import numpy as np
+
+# Sections of the 'timing_decomposition' in the output parameters
+# (later entries win for the same name)
+DECOMPOSITION_SECTIONS = [
+    ("siesta", "siesta"),
+    ("state_init", "siesta/IterGeom/state_init"),
+    ("setup_H0", "siesta/IterGeom/Setup_H0"),
+    ("nlefsm-1", "siesta/IterGeom/Setup_H0/nlefsm"),
+    ("setup_H", "siesta/IterGeom/IterSCF/setup_H"),
+    ("compute_DM", "siesta/IterGeom/IterSCF/compute_dm"),
+    ("post-SCF", "siesta/IterGeom/PostSCF"),
+    ("nlefsm-2", "siesta/IterGeom/PostSCF/nlefsm"),
+    ("siesta_analysis", "siesta/siesta_analysis"),
+    # Alternate name
+    ("siesta_analysis", "siesta/Analysis"),
+]
+
+# Number of sections in the 'timing_hot_sections' summary
+NUM_HOT_SECTIONS = 10
+
+
+def read_timer_tree(json_file):
+    """
+    Returns the 'global_section' of the time.json file, keeping the
+    order of the sections, or None if the file cannot be parsed.
+    """
     import json
+    from collections import OrderedDict
 
-    timing_decomp = {}
-    global_time = None
-    
     try:
-        data = json.load(open(json_file))
-    except:
-        #
-        # The JSON file is not parseable...
-        # Emit message
-        return global_time, timing_decomp
+        with open(json_file) as f:
+            data = json.load(f, object_pairs_hook=OrderedDict)
+        return data["global_section"]
+    except (IOError, ValueError, KeyError, TypeError):
+        return None
 
-    try:
-        d1 = data["global_section"]["siesta"]
-        global_time = d1["_time"]
-        timing_decomp["siesta"] = global_time
-    except:
-        # wrong structure
-        return global_time, timing_decomp
-        
-    try:
-        d2 = d1["IterGeom"]
-        timing_decomp["state_init"] = d2["state_init"]["_time"]
-    except:
-        # This might not be present in a calculation
-        pass
 
-    try:
-        timing_decomp["setup_H0"] = d2["Setup_H0"]["_time"]
-    except:
-        # This might not be present in a calculation
-        pass
+def flatten_timer_tree(tree):
+    """
+    Flattens a tree of timer sections (dictionaries with the '_time'
+    and '_calls' of the section, and its subsections under their
+    names).
 
-    try:
-        timing_decomp["nlefsm-1"] = d2["Setup_H0"]["nlefsm"]["_time"]
-    except:
-        # This might not be present in a calculation
-        pass
-    try:
-        timing_decomp["setup_H"] = d2["IterSCF"]["setup_H"]["_time"]
-    except:
-        # This might not be present in a calculation
-        pass
-    try:
-        timing_decomp["compute_DM"] = d2["IterSCF"]["compute_dm"]["_time"]
-    except:
-        # This might not be present in a calculation
-        pass
-    try:
-        timing_decomp["post-SCF"] = d2["PostSCF"]["_time"]
-    except:
-        # This might not be present in a calculation
-        pass
-    try:
-        timing_decomp["nlefsm-2"] = d2["PostSCF"]["nlefsm"]["_time"]
-    except:
-        # This might not be present in a calculation
-        pass
-    try:
-        timing_decomp["siesta_analysis"] = d1["siesta_analysis"]["_time"]
-    except:
-        # This might not be present in a calculation
-        pass
-    # Alternate name
-    try:
-        timing_decomp["siesta_analysis"] = d1["Analysis"]["_time"]
-    except:
-        # This might not be present in a calculation
-        pass
+    :return: a dictionary with the arrays 'sections' (paths),
+        'times', 'calls' (0 if not recorded), 'self_times' and
+        'parents' (-1 for the top sections); empty if the tree is not
+        a dictionary (e.g. null in a truncated file)
+    """
+    sections = []
+    times = []
+    calls = []
+    parents = []
+
+    if not isinstance(tree, dict):
+        tree = {}
+
+    # Depth-first, in the order of the file
+    stack = [(name, node, -1)
+             for name, node in reversed(list(tree.items()))]
+    while stack:
+        path, node, parent = stack.pop()
+        if not isinstance(node, dict):
+            continue
+        index = len(sections)
+        sections.append(path)
+        times.append(float(node.get('_time', 0.0)))
+        calls.append(int(node.get('_calls', 0)))
+        parents.append(parent)
+        stack.extend((path + '/' + name, child, index)
+                     for name, child in reversed(list(node.items()))
+                     if not name.startswith('_'))
+
+    times = np.array(times, dtype=float)
+    parents = np.array(parents, dtype=int)
+
+    # Own time: the time of the section minus that of its subsections
+    self_times = times.copy()
+    children = parents >= 0
+    np.subtract.at(self_times, parents[children], times[children])
+
+    return {
+        'sections': np.array(sections, dtype=str),
+        'times': times,
+        'calls': np.array(calls, dtype=int),
+        'self_times': self_times,
+        'parents': parents,
+    }
+
+
+def get_timing_profile(json_file):
+    """
+    Returns the flattened tree (see flatten_timer_tree) of the
+    time.json file, or None if the file cannot be parsed.
+    """
+    tree = read_timer_tree(json_file)
+    if tree is None:
+        return None
+    return flatten_timer_tree(tree)
 
-    return global_time, timing_decomp
 
+def get_timing_decomposition(profile):
+    """
+    Returns the global time (or None if there is no 'siesta' section)
+    and a dictionary with the time of the sections in
+    DECOMPOSITION_SECTIONS that are present.
+    """
+    index = dict((path, i) for i, path in enumerate(profile['sections']))
+
+    timing_decomp = {}
+    for name, path in DECOMPOSITION_SECTIONS:
+        if path in index:
+            timing_decomp[name] = float(profile['times'][index[path]])
+
+    return timing_decomp.get("siesta"), timing_decomp
 
 
+def get_hot_sections(profile, num=NUM_HOT_SECTIONS):
+    """
+    Returns a list with the num sections with the largest own time
+    (the time not spent in their subsections), as dictionaries with
+    the 'section' (path), 'self_time', 'time' and 'calls'.
+    """
+    order = np.argsort(-profile['self_times'], kind='mergesort')[:num]
+    return [{
+        'section': str(profile['sections'][i]),
+        'self_time': float(profile['self_times'][i]),
+        'time': float(profile['times'][i]),
+        'calls': int(profile['calls'][i]),
+    } for i in order]
 
-    
+
+def get_timing_info(json_file):
+    """
+    Returns the global time and the timing decomposition (see
+    get_timing_decomposition) of the time.json file, or None and an
+    empty dictionary if the file cannot be parsed.
+    """
+    profile = get_timing_profile(json_file)
+    if profile is None:
+        return None, {}
+
+    global_time, timing_decomp = get_timing_decomposition(profile)
+    if global_time is None:
+        # wrong structure
+        return None, {}
+
+    return global_time, timing_decomp
@@ -0,0 +1,66 @@
+# -*- coding: utf-8 -*-
+"""
+Classifier for the MESSAGES file written by Siesta, which contains a
+line per message, prefixed with 'INFO', 'WARNING' or 'FATAL'.
+
+The lines are examined once, as they are read, and the conditions that
+the parser and the workchains act upon are recorded as flags.
+"""
+import re
+
+_CATEGORY_RE = re.compile(r'^(INFO|WARNING|FATAL):')
+_CODE_RE = re.compile(
+    r'(OUT_OF_TIME|SCF_NOT_CONV|GEOM_NOT_CONV|PSEUDO_CACHE_MISSING)')
+
+# Flag set by each code, wherever it appears in a line
+_CODE_FLAGS = {
+    'SCF_NOT_CONV': 'scf_not_conv',
+    'GEOM_NOT_CONV': 'geom_not_conv',
+    # (written by the parser, see the pseudo_cache module)
+    'PSEUDO_CACHE_MISSING': 'pseudo_cache_missing',
+}
+
+
+def classify_messages(lines):
+    """
+    Classifies the messages in an iterable of lines (e.g. an open
+    MESSAGES file, or the 'warnings' list of the output parameters).
+
+    :return: a tuple (messages, flags, counts): the list of lines
+        (without line terminators); a dictionary with the booleans
+        'fatal', 'completed' (normal end of the job), 'out_of_time',
+        'scf_not_conv', 'geom_not_conv' and 'pseudo_cache_missing'; and a dictionary with the
+        number of 'info', 'warning' and 'fatal' messages
+    """
+    flags = {
+        'fatal': False,
+        'completed': False,
+        'out_of_time': False,
+        'scf_not_conv': False,
+        'geom_not_conv': False,
+        'pseudo_cache_missing': False,
+    }
+    counts = {'info': 0, 'warning': 0, 'fatal': 0}
+    messages = []
+
+    for line in lines:
+        line = line.rstrip('\n')
+        messages.append(line)
+
+        match = _CATEGORY_RE.match(line)
+        category = match.group(1) if match else None
+        if category is not None:
+            counts[category.lower()] += 1
+            if category == 'FATAL':
+                flags['fatal'] = True
+            elif category == 'INFO' and line.startswith('INFO: Job completed'):
+                flags['completed'] = True
+
+        for code in _CODE_RE.findall(line):
+            if code == 'OUT_OF_TIME':
+                flags['out_of_time'] = flags['out_of_time'] or (
+                    category == 'FATAL')
+            else:
+                flags[_CODE_FLAGS[code]] = True
+
+    return messages, flags, counts
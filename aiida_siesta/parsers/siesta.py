@@ -2,6 +2,8 @@
 import numpy as np
 from aiida.parsers.parser import Parser
 from aiida_siesta.calculations.siesta import SiestaCalculation
+from aiida_siesta.calculations.pseudo_cache import (
+    CHECK_FILE_NAME, update_calculation_pseudos)
 from aiida.orm.data.parameter import ParameterData
 
 # TODO Get modules metadata from setup script.
@@ -19,6 +21,12 @@ standard_output_list = [ 'siesta:FreeE', 'siesta:E_KS',
                          'siesta:Ebs', 'siesta:E_Fermi',
                          'siesta:stot']  ## leave svec for later
 
+parser_version = 'aiida-0.12.0--plugin-0.9.10'
+
+# Hash of the sources of the modules that extract the results, part of
+# the keys of the parse cache (see get_parser_source_hash)
+_parser_source_hash = None
+
 
 def text_to_array(s, dtype):
     return np.array(s.replace("\n", "").split(), dtype=dtype)
@@ -26,59 +34,45 @@ def text_to_array(s, dtype):
 
 def get_parsed_xml_doc(xml_path):
 
-     from xml.dom import minidom
+     from aiida_siesta.parsers.cml import ElementTree, parse_cml_file
 
+     # The CML file is streamed, and the items needed below
+     # are recorded in a CMLIndex (see the 'cml' module)
+     # (a ValueError for an inconsistent trajectory)
      try:
-          xmldoc = minidom.parse(xml_path)
-     except:
-          xmldoc = None
+          cml_index = parse_cml_file(xml_path)
+     except (ElementTree.ParseError, ValueError) as e:
+          raise SiestaCMLParsingError("Malformed CML file: {}".format(e))
 
      # We might want to add some extra consistency checks
      
-     return xmldoc
+     return cml_index
 
-def get_dict_from_xml_doc(xmldoc):
+def get_dict_from_xml_doc(cml_index):
 
      # Scalar items
      
      scalar_dict = {}
      
      # Metadata items
-     itemlist = xmldoc.getElementsByTagName('metadata')
-     for s in itemlist:
-         #
-         # Maybe make sure that 'name' does not contain
-         # forbidden characters
-         #
-         name = s.attributes['name'].value
-         value = s.attributes['content'].value
-         scalar_dict[name] = value
+     #
+     # Maybe make sure that 'name' does not contain
+     # forbidden characters
+     #
+     scalar_dict.update(cml_index.metadata)
 
      # Scalar output items
      # From the last "SCF Finalization" module 
      # This means that we do not record non-converged values
      
-     itemlist = xmldoc.getElementsByTagName('module')
-
-     scf_final = None
-     for m in itemlist:
-       if 'title' in m.attributes.keys():
-          # Get last scf finalization module
-          if m.attributes['title'].value == "SCF Finalization":
-               scf_final = m
-
-     if scf_final is not None:
-
-      # wrapped in <property> elements with a <scalar> child
-      props = scf_final.getElementsByTagName('property')
-     
-      for s in props:
-        if 'dictRef' in s.attributes.keys():
-          name = s.attributes['dictRef'].value
-          if name in standard_output_list:
-             data = s.getElementsByTagName('scalar')[0]
-             value = data.childNodes[0].nodeValue
-             units = data.attributes['units'].value
+     props = cml_index.scf_final_properties
+
+     # wrapped in <property> elements with a <scalar> child
+     for name in standard_output_list:
+          if name in props:
+             data = props[name].find('scalar')
+             value = data.text
+             units = data.get('units')
              loc_colon = units.find(':')
              unit_name = units[loc_colon+1:]
              loc_colon = name.find(':')
@@ -90,11 +84,11 @@ def get_dict_from_xml_doc(xmldoc):
              scalar_dict[reduced_name] = float(value)
              scalar_dict[reduced_name+"_units"] = unit_name
 
-     scalar_dict['variable_geometry'] = is_variable_geometry(xmldoc)
+     scalar_dict['variable_geometry'] = is_variable_geometry(cml_index)
      #
      # Sizes of orbital set (and non-zero interactions), and mesh 
      #
-     no_u, nnz, mesh = get_sizes_info(xmldoc)
+     no_u, nnz, mesh = get_sizes_info(cml_index)
      if no_u is not None:
          scalar_dict['no_u'] = no_u
      if nnz is not None:
@@ -105,26 +99,16 @@ def get_dict_from_xml_doc(xmldoc):
      return scalar_dict
 
 
-def is_variable_geometry(xmldoc):
+def is_variable_geometry(cml_index):
      """
      Tries to guess whether the calculation involves changes in
      geometry.
      """
+     # Decided by the type of the first "step" module,
+     # which is a "geometry" one
+     return cml_index.variable_geometry
      
-     itemlist = xmldoc.getElementsByTagName('module')
-     for m in itemlist:
-       # Check the type of the first "step" module, which is a "geometry" one
-       if 'serial' in m.attributes.keys():
-           if 'dictRef' in m.attributes.keys():
-               if m.attributes['dictRef'].value == "Single-Point":
-                   return False
-               else:
-                   return True
-
-     # If we reach this point, something is very wrong
-     return False
-     
-def get_sizes_info(xmldoc):
+def get_sizes_info(cml_index):
      """
      Gets the number of orbitals and non-zero interactions
      """
@@ -132,69 +116,75 @@ def get_sizes_info(xmldoc):
      nnz = None
      mesh = None
      
-     itemlist = xmldoc.getElementsByTagName('module')
-     for m in itemlist:
-       # Process the first "step" module, which is a "geometry" one
-       if 'serial' in m.attributes.keys():
-           # Get properties here
-           props_list = m.getElementsByTagName('property')
-           for p in props_list:
-               if 'dictRef' in p.attributes.keys():
-                   if p.attributes['dictRef'].value == "siesta:no_u":
-                       scalar = p.getElementsByTagName('scalar')[0]
-                       no_u = int(scalar.childNodes[0].data)
-                   if p.attributes['dictRef'].value == "siesta:nnz":
-                       scalar = p.getElementsByTagName('scalar')[0]
-                       nnz = int(scalar.childNodes[0].data)
-                   if p.attributes['dictRef'].value == "siesta:ntm":
-                       array = p.getElementsByTagName('array')[0]
-                       mesh = [int(s) for s in array.childNodes[0].data.split()]
-               
-
-           return no_u, nnz, mesh
-
-def get_last_structure(xmldoc, input_structure):
-
-    from aiida.orm import DataFactory
-
-    itemlist = xmldoc.getElementsByTagName('module')
+     # Properties of the first "step" module, which is a "geometry" one
+     props = cml_index.first_step_properties
+
+     if "siesta:no_u" in props:
+         no_u = int(props["siesta:no_u"].find('scalar').text)
+     if "siesta:nnz" in props:
+         nnz = int(props["siesta:nnz"].find('scalar').text)
+     if "siesta:ntm" in props:
+         array = props["siesta:ntm"].find('array')
+         mesh = [int(s) for s in array.text.split()]
+
+     return no_u, nnz, mesh
+
+def get_last_geometry(cml_index):
+    """
+    Returns the cell and the atomic positions (as lists of lists)
+    of the last geometry step, or None if there are no steps.
+    """
     #
     # Use the last "geometry" module, and not the
     # "Finalization" one.
 
-    finalmodule = None
-    for m in itemlist:
-      # Get a "geometry" module by the criteria:
-      if 'serial' in m.attributes.keys():
-          if 'dictRef' in m.attributes.keys():
-              if m.attributes['dictRef'].value != "SCF":
-                  finalmodule = m
+    finalmodule = cml_index.last_step
 
-    # In case there is no appropriate data, fall back and
-    # at least return the initial structure
-    # (this should not be necessary, as the initial Geometry module
-    # is opened very soon)
     if finalmodule is None:
-         #self.logger.warning("Returning input structure in output_structure node")
-         return input_structure
+         return None
     
-    atoms = finalmodule.getElementsByTagName('atom')
-    cellvectors = finalmodule.getElementsByTagName('latticeVector')
+    atoms = finalmodule.iter('atom')
+    cellvectors = finalmodule.iter('latticeVector')
 
-    atomlist = []
+    positions = []
 
     for a in atoms:
-         kind = a.attributes['elementType'].value
-         x = a.attributes['x3'].value
-         y = a.attributes['y3'].value
-         z = a.attributes['z3'].value
-         atomlist.append([kind,[float(x),float(y),float(z)]])
+         x = a.get('x3')
+         y = a.get('y3')
+         z = a.get('z3')
+         positions.append([float(x),float(y),float(z)])
     
     cell = []
     for l in cellvectors:
-         data = l.childNodes[0].data.split()
+         data = l.text.split()
          cell.append([float(s) for s in data])
 
+    return cell, positions
+
+
+def get_last_structure(cml_index, input_structure):
+    """
+    Returns a copy of the input structure with the cell and positions
+    of the last geometry step.
+    """
+    return build_structure(get_last_geometry(cml_index), input_structure)
+
+
+def build_structure(geometry, input_structure):
+    """
+    Returns a copy of the input structure with the cell and positions
+    of get_last_geometry.
+    """
+    # In case there is no appropriate data, fall back and
+    # at least return the initial structure
+    # (this should not be necessary, as the initial Geometry module
+    # is opened very soon)
+    if geometry is None:
+         #self.logger.warning("Returning input structure in output_structure node")
+         return input_structure
+
+    cell, new_pos = geometry
+
     # Generally it is better to pass the input structure
     # and reset the data, since site 'names' are not handled by
     # the CML file (at least not in Siesta versions <= 4.0)
@@ -202,60 +192,104 @@ def get_last_structure(xmldoc, input_structure):
 
     s = input_structure.copy()
     s.reset_cell(cell)
-    new_pos = [atom[1] for atom in atomlist]
     s.reset_sites_positions(new_pos)
           
     return s
 
                         
-def get_final_forces_and_stress(xmldoc):
- #
- # Extracts final forces and stress as lists of lists...
- #
- itemlist = xmldoc.getElementsByTagName('module')
-
- # Note: In modern versions of Siesta, forces and stresses
- # are written in the "SCF Finalization" modules at the end
- # of each geometry step.
-
- # Search for the last one of those modules
- 
- scf_final = None
- for m in itemlist:
-     if 'title' in m.attributes.keys():
-          # Get last scf finalization module
-          if m.attributes['title'].value == "SCF Finalization":
-               scf_final = m
-
- forces = None
- stress = None
-
- if scf_final is not None:
-      props = scf_final.getElementsByTagName('property')
-      for p in props:
-        if 'dictRef' in p.attributes.keys():
-
-           if p.attributes['dictRef'].value=='siesta:forces':
-                mat = p.getElementsByTagName('matrix')[0]
-                # Get flat list and reshape as list of lists
-                # using info on rows and columns in CML file
-                rows = int(mat.attributes['rows'].value)
-                cols = int(mat.attributes['columns'].value)
-                f = mat.childNodes[0].data.split()
-                f = [float(x) for x in f]
-                forces = [ f[rows*i : rows*(i+1)] for i in range(cols)]
-
-           if p.attributes['dictRef'].value=='siesta:stress':
-                mat = p.getElementsByTagName('matrix')[0]
-                # Get flat list and reshape as list of lists
-                # using info on rows and columns in CML file
-                rows = int(mat.attributes['rows'].value)
-                cols = int(mat.attributes['columns'].value)
-                s = mat.childNodes[0].data.split()
-                s = [float(x) for x in s]
-                stress = [ s[rows*i : rows*(i+1)] for i in range(cols)]
-
- return forces, stress
+def get_final_forces_and_stress(cml_index):
+    """
+    Returns the final forces (natoms x 3) and stress (3 x 3) arrays,
+    None for those missing.
+
+    :raise ValueError: if the matrices in the CML file have a wrong
+        size (e.g. the forces of a different number of atoms)
+    """
+    from aiida_siesta.parsers.cml import get_forces_and_stress
+
+    # Note: In modern versions of Siesta, forces and stresses
+    # are written in the "SCF Finalization" modules at the end
+    # of each geometry step. The index keeps the last one.
+    # The same conversion is used for the forces of every step
+    # in the trajectory.
+
+    natoms = None
+    if cml_index.trajectory.symbols is not None:
+         natoms = len(cml_index.trajectory.symbols)
+
+    return get_forces_and_stress(cml_index.scf_final_properties, natoms)
+
+
+def get_trajectory_arrays(cml_index):
+    """
+    Returns the arrays of all the geometry steps (see
+    CMLTrajectory.get_arrays), plus 'symbols', or None if there are
+    no geometry steps in the CML file.
+    """
+    cml_trajectory = cml_index.trajectory
+    if cml_trajectory.numsteps == 0:
+        return None
+
+    arrays = cml_trajectory.get_arrays()
+    arrays['symbols'] = np.array(cml_trajectory.symbols)
+    return arrays
+
+
+def get_trajectory(cml_index):
+    """
+    Returns a TrajectoryData with the cells, positions, forces, stress
+    and energies of all the geometry steps, or None if there are no
+    geometry steps in the CML file.
+    """
+    arrays = get_trajectory_arrays(cml_index)
+    if arrays is None:
+        return None
+    return build_trajectory(arrays)
+
+
+def build_trajectory(arrays):
+    """
+    Returns a TrajectoryData with the arrays of get_trajectory_arrays.
+    """
+    from aiida.orm.data.array.trajectory import TrajectoryData
+
+    arrays = dict(arrays)
+    traj = TrajectoryData()
+    traj.set_trajectory(stepids=arrays.pop('steps'),
+                        cells=arrays.pop('cells'),
+                        symbols=arrays.pop('symbols'),
+                        positions=arrays.pop('positions'))
+    # Forces, stress and energies (one entry per step)
+    for name, array in arrays.items():
+        traj.set_array(name, array)
+
+    return traj
+
+
+def get_scf_history_arrays(cml_index):
+    """
+    Returns the arrays of all the SCF iterations and geometry steps
+    (see CMLSCFHistory.get_arrays), or None if there are no SCF
+    iterations in the CML file.
+    """
+    scf_history = cml_index.scf_history
+    if scf_history.numiterations == 0:
+        return None
+    return scf_history.get_arrays()
+
+
+def build_arraydata(arrays):
+    """
+    Returns an ArrayData with the arrays in a dictionary (e.g. those
+    of get_scf_history_arrays).
+    """
+    from aiida.orm.data.array import ArrayData
+
+    arraydata = ArrayData()
+    for name, array in arrays.items():
+        arraydata.set_array(name, array)
+
+    return arraydata
 
 
 #----------------------------------------------------------------------
@@ -269,6 +303,329 @@ class SiestaCMLParsingError(OutputParsingError):
 
 #---------------------------
 
+def extract_results(output_path, messages_path, xml_path, json_path,
+                    bands_path=None, band_lines=None, eig_path=None,
+                    kp_path=None):
+    """
+    Extracts the results of a Siesta calculation from its retrieved
+    files, without creating nodes or logging, so that it can run in
+    a separate process (see 'verdi data siesta reparse').
+
+    :param band_lines: whether the bands file (if any) is a BandLines
+        one (True) or a BandPoints one (False)
+    :return: a dictionary with the keys 'successful', 'log' (a list of
+        (level, message) tuples, for the logger of the calculation),
+        'parameters' (the output parameters), 'last_geometry',
+        'trajectory', 'forces_and_stress', 'scf_history' and
+        'timing_profile', and 'bands' and
+        'eigenvalues' if the corresponding files were retrieved
+    :raise SiestaOutputParsingError: if there is no CML file
+    :raise SiestaCMLParsingError: if the CML file is malformed
+    """
+    parser_info = {}
+    parser_info['parser_info'] = 'AiiDA Siesta Parser V. {}'.format(parser_version)
+    parser_info['parser_warnings'] = []
+
+    log = []
+
+    if xml_path is None:
+        # NOTE aiida.xml is not there?
+        raise SiestaOutputParsingError("Could not find a CML file to parse")
+
+    # We get everything from the CML file
+
+    cml_index = get_parsed_xml_doc(xml_path)
+
+    result_dict = get_dict_from_xml_doc(cml_index)
+
+    try:
+        forces_and_stress = get_final_forces_and_stress(cml_index)
+    except ValueError as e:
+        raise SiestaCMLParsingError("Malformed CML file: {}".format(e))
+
+    # Add timing information
+
+    timing_profile = None
+    if json_path is None:
+        log.append(('info', "Could not find a time.json file to parse"))
+    else:
+         from json_time import (get_timing_profile, get_timing_decomposition,
+                                get_hot_sections)
+         timing_profile = get_timing_profile(json_path)
+         global_time = None
+         if timing_profile is not None:
+              global_time, timing_decomp = \
+                   get_timing_decomposition(timing_profile)
+         if global_time is None:
+              log.append(('info', "Cannot fully parse the time.json file"))
+              timing_profile = None
+         else:
+              result_dict["global_time"] = global_time
+              result_dict["timing_decomposition"] = timing_decomp
+              # Sections with the largest own time (the whole
+              # tree is in the timing_profile output)
+              result_dict["timing_hot_sections"] = \
+                   get_hot_sections(timing_profile)
+    
+    # Memory used (per process), for the resource estimates
+    if output_path is not None:
+         memory = get_max_dynamic_memory(output_path)
+         if memory is not None:
+              result_dict["max_dynamic_memory"] = memory
+              result_dict["max_dynamic_memory_units"] = "MB"
+
+    # Add warnings
+    successful = True
+    if messages_path is None:
+         # Perhaps using an old version of Siesta
+         warnings_list = ['WARNING: No MESSAGES file...']
+    else:
+         successful, warnings_list, flags, counts, messages_log = \
+              read_messages_file(messages_path)
+         log.extend(messages_log)
+         # Conditions found in the messages, so that they do
+         # not need to be searched for again (e.g. by the workchains)
+         result_dict["message_flags"] = flags
+         result_dict["message_counts"] = counts
+
+    result_dict["warnings"] = warnings_list
+
+    # Total number of SCF iterations (those of each
+    # step are in the scf_history output)
+    result_dict["num_scf_iterations"] = cml_index.scf_history.numiterations
+    
+    # Add parser info dictionary
+    parsed_dict = dict(result_dict.items() + parser_info.items())
+
+    results = {
+        'successful': successful,
+        'log': log,
+        'parameters': parsed_dict,
+        'last_geometry': get_last_geometry(cml_index),
+        'trajectory': None,
+        'forces_and_stress': forces_and_stress,
+        'scf_history': get_scf_history_arrays(cml_index),
+        'timing_profile': timing_profile,
+    }
+    if result_dict['variable_geometry']:
+         results['trajectory'] = get_trajectory_arrays(cml_index)
+
+    # Band-structure information, if available
+    if bands_path is not None:
+         from aiida_siesta.parsers.bands import read_bands_file
+         results['bands'] = read_bands_file(bands_path, band_lines)
+
+    # Eigenvalues of the (last) SCF cycle, if retrieved
+    # (an optional output: the others are kept if they cannot be read)
+    if eig_path is not None and kp_path is not None:
+         from aiida_siesta.parsers.bands import read_eig_file, read_kp_file
+         try:
+              _, bands = read_eig_file(eig_path)
+              kpoints, weights = read_kp_file(kp_path)
+         except (NotImplementedError, ValueError) as e:
+              log.append(('warning',
+                          "Cannot parse the eigenvalues: {}".format(e)))
+         else:
+              results['eigenvalues'] = (bands, kpoints, weights)
+
+    return results
+
+
+def get_parser_source_hash():
+    """
+    Returns the hash of the sources of the modules used by
+    extract_results, so that the results in the parse cache are
+    extracted again when any of them changes.
+    """
+    global _parser_source_hash
+    if _parser_source_hash is None:
+        import sys
+        from aiida_siesta.parsers import bands, cml, json_time, messages
+        from aiida_siesta.parsers.cache import hash_modules
+
+        _parser_source_hash = hash_modules(
+            [sys.modules[__name__], bands, cml, json_time, messages])
+    return _parser_source_hash
+
+
+def extract_results_cached(output_path, messages_path, xml_path, json_path,
+                           bands_path=None, band_lines=None, eig_path=None,
+                           kp_path=None, cache=None):
+    """
+    As extract_results, but looking up the results first in the parse
+    cache (see the 'cache' module), keyed by the contents of the files
+    and of the parser modules, and storing them there.
+
+    The cache is optional: if it cannot be set up, read or written
+    (e.g. an unwritable directory, or a full disk), a warning is added
+    to the 'log' of the results, which are extracted as usual.
+
+    :param cache: a ParseCache. If None, the one set up by the
+        environment (if any) is used.
+    """
+    from aiida_siesta.parsers.cache import get_parse_cache, pickle
+
+    cache_errors = (IOError, OSError, ValueError, pickle.PicklingError)
+    args = (output_path, messages_path, xml_path, json_path, bands_path,
+            band_lines, eig_path, kp_path)
+
+    results = None
+    warning = None
+    try:
+        if cache is None:
+            cache = get_parse_cache()
+        if cache is not None:
+            key = cache.make_key(
+                [output_path, messages_path, xml_path, json_path,
+                 bands_path, eig_path, kp_path], parser_version,
+                get_parser_source_hash(), band_lines)
+            results = cache.get(key)
+    except cache_errors as e:
+        cache = None
+        warning = "Parse cache not used: {}".format(e)
+    if results is not None:
+        return results
+
+    results = extract_results(*args)
+    if warning is not None:
+        results['log'].append(('warning', warning))
+    if cache is not None:
+        try:
+            cache.put(key, results)
+        except cache_errors as e:
+            results['log'].append(
+                ('warning', "Results not stored in the parse cache: "
+                 "{}".format(e)))
+
+    return results
+
+
+def get_max_dynamic_memory(output_path):
+    """
+    Returns the largest 'Maximum dynamic memory allocated' (MB, per
+    MPI process) reported in the standard output of Siesta, or None.
+    """
+    import re
+
+    pattern = re.compile(
+        r'Maximum dynamic memory allocated.*=\s*([-+.0-9Ee]+)\s*MB')
+    memory = None
+    with open(output_path) as f:
+        for line in f:
+            if 'Maximum dynamic memory' not in line:
+                continue
+            match = pattern.search(line)
+            if match:
+                value = float(match.group(1))
+                if memory is None or value > memory:
+                    memory = value
+    return memory
+
+
+def read_messages_file(messages_path):
+     """
+     Generates a list of warnings from the 'MESSAGES' file, which
+     contains a line per message, prefixed with 'INFO',
+     'WARNING' or 'FATAL'. The file is classified in a single pass
+     (see the 'messages' module).
+
+     :param messages_path: 
+
+     Returns a boolean indicating success (True) or failure (False),
+     a list of strings, the dictionaries of flags and of counts
+     per category of message, and a list of (level, message) tuples
+     to be logged.
+     """
+     from aiida_siesta.parsers.messages import classify_messages
+
+     with open(messages_path) as f:
+          lines, flags, counts = classify_messages(f)
+
+     # Log 'FATAL:' messages, and return
+     if flags['fatal']:
+          log = [('error', line) for line in lines if line.startswith('FATAL:')]
+          return False, lines, flags, counts, log
+
+     # Make sure that the job did finish (and was not interrupted
+     # externally)
+
+     if not flags['completed']:
+          # (a fatal message, as if Siesta had written it)
+          lines.append('FATAL: ABNORMAL_EXTERNAL_TERMINATION')
+          flags['fatal'] = True
+          counts['fatal'] += 1
+          log = [('error', "Calculation interrupted externally")]
+          return False, lines, flags, counts, log
+
+     # (Insert any other "non-success" conditions before next section)
+     # (e.g.: be very picky about (some) 'WARNING:' messages)
+     
+     # Return with success flag
+     
+     return True, lines, flags, counts, []
+
+
+def get_pseudo_cache_parameters(calc, check_path):
+    """
+    Records the pseudos of a calculation that used the 'pseudo_cache'
+    setting that were found in the remote cache, and drops the records
+    of the missing ones (see update_calculation_pseudos), so that the
+    next calculation uploads them again.
+
+    :param check_path: the path of the retrieved CHECK_FILE_NAME
+    :return: None if no pseudo was missing, else the output parameters
+        of the calculation, which stopped before running Siesta: its
+        'warnings' have a 'FATAL: PSEUDO_CACHE_MISSING' message, the
+        'pseudo_cache_missing' flag of its 'message_flags' is set, and
+        'pseudo_cache_missing' lists the names of the pseudo files
+    """
+    from aiida_siesta.parsers.messages import classify_messages
+
+    missing = update_calculation_pseudos(calc, check_path)
+    if not missing:
+        return None
+
+    filenames = sorted(pseudo.filename for pseudo in missing)
+    # (a fatal message, as if Siesta had written it)
+    lines, flags, counts = classify_messages([
+        "FATAL: PSEUDO_CACHE_MISSING: Pseudos missing from the remote "
+        "cache: {}".format(", ".join(filenames))])
+    return {
+        'parser_info': 'AiiDA Siesta Parser V. {}'.format(parser_version),
+        'parser_warnings': [],
+        'warnings': lines,
+        'message_flags': flags,
+        'message_counts': counts,
+        'pseudo_cache_missing': filenames,
+    }
+
+
+def build_eigenvalues(eigenvalues, structure):
+    """
+    Builds a BandsData with the eigenvalues (eV) of the .EIG file at
+    the k-points (and with the weights) of the .KP file.
+
+    :param eigenvalues: a tuple (bands, kpoints, weights), with the
+        k-points in cartesian coordinates (Bohr^-1)
+    :param structure: the structure the k-points refer to, for the
+        conversion from cartesian coordinates
+    """
+    from aiida.common.constants import bohr_to_ang
+    from aiida.orm.data.array.bands import BandsData
+
+    bands, kpoints, weights = eigenvalues
+
+    arraybands = BandsData()
+    arraybands.set_cell_from_structure(structure)
+    # Siesta writes the k-points in Bohr^-1
+    arraybands.set_kpoints(kpoints / bohr_to_ang, cartesian=True,
+                           weights=weights)
+    arraybands.set_bands(bands, units="eV")
+
+    return arraybands
+
+#---------------------------
+
 class SiestaParser(Parser):
     """
     Parser for the output of Siesta.
@@ -285,91 +642,74 @@ class SiestaParser(Parser):
         if not isinstance(calc,SiestaCalculation):
             raise SiestaOutputParsingError("Input calc must be a SiestaCalculation")
 
-    def _get_output_nodes(self, output_path, messages_path, xml_path, json_path, bands_path):
+    def _get_output_nodes(self, output_path, messages_path, xml_path, json_path,
+                          bands_path, eig_path=None, kp_path=None):
         """
         Extracts output nodes from the standard output and standard error
         files. (And XML and JSON files)
         """
-        from aiida.orm.data.array.trajectory import TrajectoryData
-        import re
-
-        parser_version = 'aiida-0.12.0--plugin-0.9.10'
-        parser_info = {}
-        parser_info['parser_info'] = 'AiiDA Siesta Parser V. {}'.format(parser_version)
-        parser_info['parser_warnings'] = []
-
+        band_lines = None
+        if bands_path is not None:
+             band_lines = self._calc.inp.bandskpoints.labels is not None
 
-        result_list = []
+        try:
+             results = extract_results_cached(output_path, messages_path,
+                                              xml_path, json_path, bands_path,
+                                              band_lines, eig_path, kp_path)
+        except OutputParsingError as e:
+             self.logger.error(e.message)
+             raise
 
-        if xml_path is None:
-            self.logger.error("Could not find a CML file to parse")
-            # NOTE aiida.xml is not there?
-            raise SiestaOutputParsingError("Could not find a CML file to parse")
+        for level, message in results['log']:
+             getattr(self.logger, level)(message)
 
-        # We get everything from the CML file
+        return results['successful'], self.build_output_nodes(results)
 
-        xmldoc = get_parsed_xml_doc(xml_path)
-        if xmldoc is None:
-            self.logger.error("Malformed CML file: cannot parse")
-            raise SiestaCMLParsingError("Malformed CML file: cannot parse")
-        
-        # These are examples of how we can access input items
-        #
-        # Structure (mandatory)
-        #
-        in_struc = self._calc.get_inputs_dict()['structure']
-        #
-        # Settings (optional)
-        #
-        try:
-             in_settings = self._calc.get_inputs_dict()['settings']
-        except KeyError:
-             in_settings = None
-
-        result_dict = get_dict_from_xml_doc(xmldoc)
-
-        # Add timing information
-
-        if json_path is None:
-            self.logger.info("Could not find a time.json file to parse")
-        else:
-             from json_time import get_timing_info
-             global_time, timing_decomp = get_timing_info(json_path)
-             if global_time is None:
-                  self.logger.info("Cannot fully parse the time.json file")
-             else:
-                  result_dict["global_time"] = global_time
-                  result_dict["timing_decomposition"] = timing_decomp
-        
-        # Add warnings
-        successful = True
-        if messages_path is None:
-             # Perhaps using an old version of Siesta
-             warnings_list = ['WARNING: No MESSAGES file...']
-        else:
-             successful, warnings_list = self.get_warnings_from_file(messages_path)
-
-        result_dict["warnings"] = warnings_list
-        
-        # Add parser info dictionary
-        parsed_dict = dict(result_dict.items() + parser_info.items())
+    def build_output_nodes(self, results):
+        """
+        Creates the (unstored) output nodes for the results of
+        extract_results, and returns them as a list of
+        (link name, node) tuples.
+        """
+        result_list = []
 
-        output_data = ParameterData(dict=parsed_dict)
+        output_data = ParameterData(dict=results['parameters'])
         
         link_name = self.get_linkname_outparams()
         result_list.append((link_name,output_data))
 
+        # Structure (mandatory)
+        in_struc = self._calc.get_inputs_dict()['structure']
+
         # If the structure has changed, save it
-        if is_variable_geometry(xmldoc):
+        out_struc = in_struc
+        if results['parameters']['variable_geometry']:
              # Get the input structure to copy its site names,
              # as the CML file traditionally contained only the
              # atomic symbols.
              #
-             struc = get_last_structure(xmldoc,in_struc)
+             struc = build_structure(results['last_geometry'],in_struc)
              result_list.append((self.get_linkname_outstructure(),struc))
+             out_struc = struc
+
+             # All the geometry steps, in a single node
+             if results['trajectory'] is not None:
+                  traj = build_trajectory(results['trajectory'])
+                  result_list.append((self.get_linkname_outtrajectory(),traj))
+
+        # Convergence of every SCF iteration
+        if results.get('scf_history') is not None:
+             scf_history = build_arraydata(results['scf_history'])
+             result_list.append((self.get_linkname_scfhistory(),scf_history))
+
+        # The whole tree of the timer, flattened
+        if results.get('timing_profile') is not None:
+             timing_profile = build_arraydata(results['timing_profile'])
+             result_list.append((self.get_linkname_timingprofile(),
+                                 timing_profile))
 
         # Save forces and stress in an ArrayData object
-        forces, stress = get_final_forces_and_stress(xmldoc)
+        forces, stress = results['forces_and_stress']
 
         if forces is not None and stress is not None:
              from aiida.orm.data.array import ArrayData
@@ -378,9 +718,9 @@ class SiestaParser(Parser):
              arraydata.set_array('stress', np.array(stress))
              result_list.append((self.get_linkname_outarray(),arraydata))
 
-        # Parse band-structure information if available
-        if bands_path is not None:
-             bands, coords = self.get_bands(bands_path)
+        # Band-structure information, if available
+        if 'bands' in results:
+             bands, coords = results['bands']
              from aiida.orm.data.array.bands import BandsData
              arraybands = BandsData()
              arraybands.set_kpoints(self._calc.inp.bandskpoints.get_kpoints(cartesian=True))
@@ -389,7 +729,12 @@ class SiestaParser(Parser):
              bandsparameters = ParameterData(dict={"kp_coordinates": coords})
              result_list.append((self.get_linkname_bandsparameters(), bandsparameters))
 
-        return successful, result_list
+        # Eigenvalues of the (last) SCF cycle, if retrieved
+        if 'eigenvalues' in results:
+             eigenvalues = build_eigenvalues(results['eigenvalues'], out_struc)
+             result_list.append((self.get_linkname_eigenvalues(), eigenvalues))
+
+        return result_list
 
     def parse_with_retrieved(self,retrieved):
         """
@@ -405,21 +750,42 @@ class SiestaParser(Parser):
         xml_path  = None
         json_path  = None
         bands_path = None
+        eig_path = None
+        kp_path = None
+        check_path = None
         try:
-            output_path, messages_path, xml_path, json_path, bands_path = \
-                             self._fetch_output_files(retrieved)
+            output_path, messages_path, xml_path, json_path, bands_path, \
+                eig_path, kp_path, check_path = \
+                self._fetch_output_files(retrieved)
         except InvalidOperation:
             raise
         except IOError as e:
             self.logger.error(e.message)
             return False, ()
 
+        # The pseudos verified to be in the remote cache (if the
+        # 'pseudo_cache' setting was used) are recorded, and the
+        # missing ones dropped, so that they are uploaded again.
+        # If any was missing, Siesta did not run, and the output
+        # parameters flag it (e.g. for the workchains to resubmit)
+        if check_path is not None:
+            parameters = get_pseudo_cache_parameters(self._calc, check_path)
+            if parameters is not None:
+                self.logger.error(
+                    "Pseudos missing from the remote cache (the "
+                    "calculation did not run): {}; they will be uploaded "
+                    "by the next calculation".format(", ".join(
+                        parameters['pseudo_cache_missing'])))
+                output_data = ParameterData(dict=parameters)
+                return False, [(self.get_linkname_outparams(), output_data)]
+
         if output_path is None and messages_path is None and xml_path is None:
             self.logger.error("No output files found")
             return False, ()
 
         successful, out_nodes = self._get_output_nodes(output_path, messages_path,
-                                                       xml_path, json_path, bands_path)
+                                                       xml_path, json_path, bands_path,
+                                                       eig_path, kp_path)
         
         return successful, out_nodes
 
@@ -454,6 +820,9 @@ class SiestaParser(Parser):
         xml_path  = None
         json_path  = None
         bands_path = None
+        eig_path = None
+        kp_path = None
+        check_path = None
 
         if self._calc._DEFAULT_OUTPUT_FILE in list_of_files:
             output_path = os.path.join( out_folder.get_abs_path('.'),
@@ -470,119 +839,33 @@ class SiestaParser(Parser):
         if self._calc._DEFAULT_BANDS_FILE in list_of_files:
             bands_path  = os.path.join( out_folder.get_abs_path('.'),
                                         self._calc._DEFAULT_BANDS_FILE )
-
-        return output_path, messages_path, xml_path, json_path, bands_path
+        if self._calc._DEFAULT_EIG_FILE in list_of_files:
+            eig_path  = os.path.join( out_folder.get_abs_path('.'),
+                                        self._calc._DEFAULT_EIG_FILE )
+        if self._calc._DEFAULT_KP_FILE in list_of_files:
+            kp_path  = os.path.join( out_folder.get_abs_path('.'),
+                                        self._calc._DEFAULT_KP_FILE )
+        if CHECK_FILE_NAME in list_of_files:
+            check_path = os.path.join( out_folder.get_abs_path('.'),
+                                       CHECK_FILE_NAME )
+
+        return (output_path, messages_path, xml_path, json_path, bands_path,
+                eig_path, kp_path, check_path)
 
     def get_warnings_from_file(self,messages_path):
      """
-     Generates a list of warnings from the 'MESSAGES' file, which
-     contains a line per message, prefixed with 'INFO',
-     'WARNING' or 'FATAL'.
+     Generates a list of warnings from the 'MESSAGES' file (see the
+     module-level read_messages_file), logging the errors found.
 
-     :param messages_path: 
-
-     Returns a boolean indicating success (True) or failure (False)
-     and a list of strings.
+     Returns a boolean indicating success (True) or failure (False),
+     a list of strings, and the dictionaries of flags and of counts
+     per category of message.
      """
-     f=open(messages_path)
-     lines=f.read().split('\n')   # There will be a final '' element
-
-     import re
-     
-     # Search for 'FATAL:' messages, log them, and return immediately
-     there_are_fatals = False 
-     for line in lines:
-          if re.match('^FATAL:.*$',line):
-               self.logger.error(line)
-               there_are_fatals = True
-               
-     if there_are_fatals:
-          return False, lines[:-1]  # Remove last (empty) element
-
-     # Make sure that the job did finish (and was not interrupted
-     # externally)
-
-     normal_end = False
-     for line in lines:
-          if re.match('^INFO: Job completed.*$',line):
-               normal_end = True
-               
-     if normal_end == False:
-          lines[-1] = 'FATAL: ABNORMAL_EXTERNAL_TERMINATION'
-          self.logger.error("Calculation interrupted externally")
-          return False, lines
-
-     # (Insert any other "non-success" conditions before next section)
-     # (e.g.: be very picky about (some) 'WARNING:' messages)
-     
-     # Return with success flag
-     
-     return True, lines[:-1]  # Remove last (empty) element
-
-    def get_bands(self, bands_path):
-        # The parsing is different depending on whether I have Bands or Points.
-        # I recognise these two situations by looking at bandskpoints.label
-        # (like I did in the plugin)
-        from aiida.common.exceptions import InputValidationError
-        from aiida.common.exceptions import ValidationError
-        tottx = []
-        f = open(bands_path)
-        tottx = f.read().split()
-
-        ef = float(tottx[0])
-        if self._calc.inp.bandskpoints.labels == None:
-            minfreq, maxfreq = float(tottx[1]), float(tottx[2])
-            nbands, nspins, nkpoints = int(tottx[3]), int(tottx[4]), int(
-                tottx[5])
-            spinup = np.zeros((nkpoints, nbands))
-            spindown = np.zeros((nkpoints, nbands))
-            coords = np.zeros(nkpoints)
-            if (nspins == 2):
-                block_length = nbands * 2
-            else:
-                block_length = nbands
-            for i in range(nkpoints):
-                # coords[i] = float(tottx[i * (block_length + 3) + 6])
-                for j in range(nbands):
-                    spinup[i, j] = (
-                        float(tottx[i * (block_length + 3) + 6 + j + 3]))
-                    if (nspins == 2):
-                        # Probably wrong! - need to test!!!
-                        spindown[i, j] = (float(
-                            tottx[i * (nbands * 2 + 3) + 6 + j + 3 + nbands]))
-        else:
-            mink, maxk = float(tottx[1]), float(tottx[2])
-            minfreq, maxfreq = float(tottx[3]), float(tottx[4])
-            nbands, nspins, nkpoints = int(tottx[5]), int(tottx[6]), int(
-                tottx[7])
-            spinup = np.zeros((nkpoints, nbands))
-            spindown = np.zeros((nkpoints, nbands))
-            coords = np.zeros(nkpoints)
-            if (nspins == 2):
-                block_length = nbands * 2
-            else:
-                block_length = nbands
-
-            for i in range(nkpoints):
-                coords[i] = float(tottx[i * (block_length + 1) + 8])
-
-                for j in range(nbands):
-                    spinup[i, j] = (
-                        float(tottx[i * (block_length + 1) + 8 + j + 1]))
-                    if (nspins == 2):
-                        # Probably wrong! - need to test!!!
-                        spindown[i, j] = (float(
-                            tottx[i * (nbands * 2 + 1) + 8 + j + 1 + nbands]))
-        if (nspins == 2):
-            bands = (spinup, spindown)
-        elif (nspins == 1):
-            bands = spinup
-        else:
-            raise NotImplementedError(
-                'nspins=4: non collinear bands not implemented yet')
-
-        return (bands, coords)
-
+     successful, lines, flags, counts, log = \
+          read_messages_file(messages_path)
+     for level, message in log:
+          getattr(self.logger, level)(message)
+     return successful, lines, flags, counts
 
     def get_linkname_outstructure(self):
         """
@@ -591,6 +874,30 @@ class SiestaParser(Parser):
         """
         return 'output_structure'
 
+    def get_linkname_outtrajectory(self):
+        """
+        Returns the name of the link to the output_trajectory.
+        Node exists if the geometry changed, and holds the cell,
+        positions, forces, stress and energies of every step.
+        """
+        return 'output_trajectory'
+
+    def get_linkname_scfhistory(self):
+        """
+        Returns the name of the link to the scf_history.
+        Node holds the energies and residuals of every SCF iteration,
+        and the number of iterations of every geometry step.
+        """
+        return 'scf_history'
+
+    def get_linkname_timingprofile(self):
+        """
+        Returns the name of the link to the timing_profile.
+        Node exists if the time.json file was parsed, and holds the
+        times and calls of every section of the timer of Siesta.
+        """
+        return 'timing_profile'
+
     def get_linkname_outarray(self):
         """                                                                     
         Returns the name of the link to the output_array                        
@@ -607,6 +914,14 @@ class SiestaParser(Parser):
         """
         return 'bands_array'
 
+    def get_linkname_eigenvalues(self):
+        """
+        Returns the name of the link to the eigenvalues_array.
+        Node exists if the .EIG and .KP files were retrieved, and
+        holds the eigenvalues of the SCF cycle and the k-point weights.
+        """
+        return 'eigenvalues_array'
+
     def get_linkname_bandsparameters(self):
         """
         Returns the name of the link to the bands_path.
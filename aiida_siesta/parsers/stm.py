@@ -11,6 +11,52 @@ __contributors__ = "Alberto Garcia"
 
 # -*- coding: utf-8 -*-
 
+def read_stm_file(plot_path):
+    """
+    Reads the STM plot file, and returns the X, Y, and Z arrays in
+    the 'meshgrid' setting (see STMParser.get_stm_data).
+    """
+    import numpy as np
+    from itertools import groupby
+
+    file=open(plot_path,"r")  # aiida.CH.STM or aiida.CC.STM...
+    data = file.read().split('\n')
+    data = [ i.split() for i in data]
+
+    # The data in the file is organized in "lines" parallel to the Y axes
+    # (that is, for constant X) separated by blank lines.
+    # In the following we use the 'groupby' function to get at the individual
+    # blocks one by one, and set the appropriate arrays.
+
+    # I am not sure about the mechanics of groupby,
+    # so repeat
+    xx=[]
+    yy=[]
+    zz=[]
+    #
+    # Function to separate the blocks
+    h = lambda x: len(x)==0
+    #
+    for k,g in groupby(data, h):
+         if not k:
+              xx.append([i[0] for i in g])
+    for k,g in groupby(data, h):
+         if not k:
+              yy.append([i[1] for i in g])
+    for k,g in groupby(data, h):
+         if not k:
+              zz.append([i[2] for i in g])
+
+    # Now, transpose, since x runs fastest in our fortran code,
+    # the opposite convention of the meshgrid paradigm.
+
+    X = np.array(xx,dtype=float).transpose()
+    Y = np.array(yy,dtype=float).transpose()
+    Z = np.array(zz,dtype=float).transpose()
+
+    return X, Y, Z
+
+
 from aiida.parsers.exceptions import OutputParsingError
 
 class STMOutputParsingError(OutputParsingError):
@@ -177,46 +223,9 @@ class STMParser(Parser):
         """
         
         import numpy as np
-        from itertools import groupby
-
-        from aiida.common.exceptions import InputValidationError
-        from aiida.common.exceptions import ValidationError
 
-        file=open(plot_path,"r")  # aiida.CH.STM or aiida.CC.STM...
-        data = file.read().split('\n')
-        data = [ i.split() for i in data]
+        X, Y, Z = read_stm_file(plot_path)
 
-        # The data in the file is organized in "lines" parallel to the Y axes
-        # (that is, for constant X) separated by blank lines.
-        # In the following we use the 'groupby' function to get at the individual
-        # blocks one by one, and set the appropriate arrays.
-
-        # I am not sure about the mechanics of groupby,
-        # so repeat
-        xx=[]
-        yy=[]
-        zz=[]
-        #
-        # Function to separate the blocks
-        h = lambda x: len(x)==0
-        #
-        for k,g in groupby(data, h):
-             if not k:
-                  xx.append([i[0] for i in g])
-        for k,g in groupby(data, h):
-             if not k:
-                  yy.append([i[1] for i in g])
-        for k,g in groupby(data, h):
-             if not k:
-                  zz.append([i[2] for i in g])
-
-        # Now, transpose, since x runs fastest in our fortran code,
-        # the opposite convention of the meshgrid paradigm.
-
-        X = np.array(xx,dtype=float).transpose()
-        Y = np.array(yy,dtype=float).transpose()
-        Z = np.array(zz,dtype=float).transpose()
-        
         from aiida.orm.data.array import ArrayData
         
         arraydata = ArrayData()
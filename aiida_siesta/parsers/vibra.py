@@ -15,6 +15,102 @@ __contributors__ = "Victor M. Garcia-Suarez"
 class VibraOutputParsingError(OutputParsingError):
      pass
 
+# The files of a Vibra calculation are read by module-level functions,
+# which do not need the calculation (e.g. for the benchmark suite)
+
+def _read_lines(output_path):
+    with open(output_path) as f:
+        return f.read().split('\n')   # There will be a final '' element
+
+def read_vibra_errors(output_path):
+    """
+    Generates a list of errors from the 'aiida.out' file.
+
+    Returns a boolean indicating success (True) or failure (False),
+    a list of strings, and a list of (level, message) tuples to be
+    logged.
+    """
+    import re
+
+    lines = _read_lines(output_path)
+
+    # Search for 'Error' messages, log them, and return immediately
+    lineerror = []
+    for line in lines:
+        if re.match('^.*Error.*$',line):
+            lineerror.append(line)
+
+    if lineerror:
+        log = [('error', line) for line in lineerror]
+        lineerror.append(lines[-1])
+        return False, lineerror, log
+
+    # Make sure that the job did finish (and was not interrupted
+    # externally)
+
+    normal_end = False
+    for line in lines:
+        if re.match('^.*Zero point energy.*$',line):
+            normal_end = True
+
+    if normal_end == False:
+        lines[-1] = 'FATAL: ABNORMAL_EXTERNAL_TERMINATION'
+        log = [('error', "Calculation interrupted externally")]
+        return False, lines[-2:], log # Return also last line of the file
+
+    return True, lineerror, []
+
+def read_vibra_warnings(output_path):
+    """
+    Generates a list of warnings from the 'aiida.out' file.
+
+    Returns a list of strings.
+    """
+    import re
+
+    # Find warnings
+    linewarning = []
+    for line in _read_lines(output_path):
+        if re.match('^.*Warning.*$',line):
+            linewarning.append(line)
+
+    return linewarning
+
+def read_vibra_output(output_path):
+    """
+    Generates a dictionary of variables from the 'aiida.out' file.
+    """
+    import re
+
+    # Find data
+    output_dict = {}
+    for line in _read_lines(output_path):
+        if re.match('^.*System Name.*$',line):
+            output_dict['system_name'] = line.split()[-1]
+        if re.match('^.*System Label.*$',line):
+            output_dict['system_label'] = line.split()[-1]
+        if re.match('^.*Number of unit cells in Supercell.*$',line):
+            output_dict['number_of_unit_cells'] = int(line.split()[-1])
+        if re.match('^.*Eigenvectors =.*$',line):
+            output_dict['eigenvectors_calc'] = line.split()[-1]
+        if re.match('^.*Zero point energy.*$',line):
+            output_dict['zero_point_energy'] = float(line.split()[-2])
+
+    return output_dict
+
+def read_vibra_bands(bands_path, band_lines):
+    """
+    Reads the phonon bands, which Vibra writes in the format of the
+    Siesta band-structure files (see bands.read_bands_file).
+
+    :param band_lines: True for bands along lines (with labels), False
+        for bands at a list of points
+    :return: a tuple (bands, coords)
+    """
+    from aiida_siesta.parsers.bands import read_bands_file
+
+    return read_bands_file(bands_path, band_lines)
+
 class VibraParser(Parser):
     """
     Parser for the output of a Vibra calculation.
@@ -147,45 +243,19 @@ class VibraParser(Parser):
 
     def get_errors_from_file(self,output_path):
         """
-        Generates a list of errors from the 'aiida.out' file.
+        Generates a list of errors from the 'aiida.out' file (see
+        read_vibra_errors), logging them.
 
         :param output_path: 
 
         Returns a boolean indicating success (True) or failure (False)
         and a list of strings.
         """
-        f = open(output_path)
-        lines = f.read().split('\n')   # There will be a final '' element
+        successful, lineerror, log = read_vibra_errors(output_path)
+        for level, message in log:
+            getattr(self.logger, level)(message)
 
-        import re
-     
-        # Search for 'Error' messages, log them, and return immediately
-        lineerror = []
-        there_are_fatals = False 
-        for line in lines:
-            if re.match('^.*Error.*$',line):
-                self.logger.error(line)
-                lineerror.append(line)
-                there_are_fatals = True
-               
-        if there_are_fatals:
-            lineeror.append(lines[-1])
-            return False, lineerror
-
-        # Make sure that the job did finish (and was not interrupted
-        # externally)
-
-        normal_end = False
-        for line in lines:
-            if re.match('^.*Zero point energy.*$',line):
-                normal_end = True
-               
-        if normal_end == False:
-            lines[-1] = 'FATAL: ABNORMAL_EXTERNAL_TERMINATION'
-            self.logger.error("Calculation interrupted externally")
-            return False, lines[-2:] # Return also last line of the file
-
-        return True, lineerror
+        return successful, lineerror
 
     def get_warnings_from_file(self,output_path):
         """
@@ -195,18 +265,7 @@ class VibraParser(Parser):
 
         Returns a list of strings.
         """
-        f = open(output_path)
-        lines = f.read().split('\n')   # There will be a final '' element
-
-        import re
-
-        # Find warnings
-        linewarning = []
-        for line in lines:
-            if re.match('^.*Warning.*$',line):
-                linewarning.append(line)
-     
-        return linewarning
+        return read_vibra_warnings(output_path)
 
     def get_output_from_file(self,output_path):
         """
@@ -216,88 +275,14 @@ class VibraParser(Parser):
 
         Returns a list of strings.
         """
-        f = open(output_path)
-        lines = f.read().split('\n')   # There will be a final '' element
-
-        import re
-
-        # Find data
-        output_dict = {}
-        for line in lines:
-            if re.match('^.*System Name.*$',line):
-                output_dict['system_name'] = line.split()[-1]
-            if re.match('^.*System Label.*$',line):
-                output_dict['system_label'] = line.split()[-1]
-            if re.match('^.*Number of unit cells in Supercell.*$',line):
-                output_dict['number_of_unit_cells'] = int(line.split()[-1])
-            if re.match('^.*Eigenvectors =.*$',line):
-                output_dict['eigenvectors_calc'] = line.split()[-1]
-            if re.match('^.*Zero point energy.*$',line):
-                output_dict['zero_point_energy'] = float(line.split()[-2])
-     
-        return output_dict
+        return read_vibra_output(output_path)
 
     def get_bands(self, bands_path):
         # The parsing is different depending on whether I have Bands or Points.
         # I recognise these two situations by looking at bandskpoints.label
         # (like I did in the plugin)
-        from aiida.common.exceptions import InputValidationError
-        from aiida.common.exceptions import ValidationError
-        tottx = []
-        f = open(bands_path)
-        tottx = f.read().split()
-
-        ef = float(tottx[0])
-        if self._calc.inp.bandskpoints.labels == None:
-            minfreq, maxfreq = float(tottx[1]), float(tottx[2])
-            nbands, nspins, nkpoints = int(tottx[3]), int(tottx[4]), int(
-                tottx[5])
-            spinup = np.zeros((nkpoints, nbands))
-            spindown = np.zeros((nkpoints, nbands))
-            coords = np.zeros(nkpoints)
-            if (nspins == 2):
-                block_length = nbands * 2
-            else:
-                block_length = nbands
-            for i in range(nkpoints):
-                # coords[i] = float(tottx[i * (block_length + 3) + 6])
-                for j in range(nbands):
-                    spinup[i, j] = (
-                        float(tottx[i * (block_length + 3) + 6 + j + 3]))
-                    if (nspins == 2):
-                        # Probably wrong! - need to test!!!
-                        spindown[i, j] = (float(
-                            tottx[i * (nbands * 2 + 3) + 6 + j + 3 + nbands]))
-        else:
-            mink, maxk = float(tottx[1]), float(tottx[2])
-            minfreq, maxfreq = float(tottx[3]), float(tottx[4])
-            nbands, nspins, nkpoints = int(tottx[5]), int(tottx[6]), int(
-                tottx[7])
-            spinup = np.zeros((nkpoints, nbands))
-            spindown = np.zeros((nkpoints, nbands))
-            coords = np.zeros(nkpoints)
-            if (nspins == 2):
-                block_length = nbands * 2
-            else:
-                block_length = nbands
-
-            for i in range(nkpoints):
-                coords[i] = float(tottx[i * (block_length + 1) + 8])
-
-                for j in range(nbands):
-                    spinup[i, j] = (
-                        float(tottx[i * (block_length + 1) + 8 + j + 1]))
-                    if (nspins == 2):
-                        # Probably wrong! - need to test!!!
-                        spindown[i, j] = (float(
-                            tottx[i * (nbands * 2 + 1) + 8 + j + 1 + nbands]))
-        if (nspins == 2):
-            bands = (spinup, spindown)
-        elif (nspins == 1):
-            bands = spinup
-        else:
-            raise NotImplementedError(
-                'nspins=4: non collinear bands not implemented yet')
+        band_lines = self._calc.inp.bandskpoints.labels is not None
+        bands, coords = read_vibra_bands(bands_path, band_lines)
 
         return (bands, coords)
 
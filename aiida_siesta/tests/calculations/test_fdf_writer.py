@@ -0,0 +1,52 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+def test_atomic_positions_card():
+    """The card is the same as formatting each site with str.format."""
+    import numpy as np
+    from aiida_siesta.calculations.fdf_writer import get_atomic_positions_card
+
+    rng = np.random.RandomState(0)
+    positions = rng.uniform(-50.0, 50.0, (25, 3))
+    positions[0] = [-0.0, 1e-12, -5e-11]
+    kind_names = [[u'Si', u'H', u'Fe_long'][i % 3] for i in range(25)]
+    spind = {u'Si': 1, u'H': 2, u'Fe_long': 3}
+
+    expected = "%block atomiccoordinatesandatomicspecies\n"
+    for i, (position, name) in enumerate(zip(positions, kind_names)):
+        expected += (
+            "{0:18.10f} {1:18.10f} {2:18.10f} {3:4} {4:6} {5:6}\n".format(
+                position[0], position[1], position[2], spind[name],
+                name.rjust(6), i + 1))
+    expected += "%endblock atomiccoordinatesandatomicspecies\n"
+
+    card = get_atomic_positions_card(positions, kind_names, spind,
+                                     chunk_size=10)
+    assert card == expected
+    assert isinstance(card, str)
+
+    assert get_atomic_positions_card(np.zeros((0, 3)), [], spind) == (
+        "%block atomiccoordinatesandatomicspecies\n"
+        "%endblock atomiccoordinatesandatomicspecies\n")
+
+
+def test_atomic_positions_file(tmpdir):
+    """The file has the contents of the block."""
+    import numpy as np
+    from aiida_siesta.calculations.fdf_writer import (
+        get_atomic_positions_card, write_atomic_positions_file)
+
+    positions = np.arange(30.0).reshape(10, 3)
+    kind_names = ['Si'] * 5 + ['O'] * 5
+    spind = {'Si': 1, 'O': 2}
+
+    path = str(tmpdir.join('aiida.coords'))
+    card = write_atomic_positions_file(path, positions, kind_names, spind,
+                                       chunk_size=3)
+    assert card == "%block atomiccoordinatesandatomicspecies < aiida.coords\n"
+
+    lines = get_atomic_positions_card(positions, kind_names,
+                                      spind).splitlines(True)
+    with open(path) as f:
+        assert f.read() == "".join(lines[1:-1])
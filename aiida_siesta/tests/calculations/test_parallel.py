@@ -0,0 +1,45 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+def test_count_irreducible_kpoints():
+    from aiida_siesta.calculations.parallel import count_irreducible_kpoints
+
+    assert count_irreducible_kpoints([1, 1, 1]) == 1
+    assert count_irreducible_kpoints([4, 4, 4]) == 32
+    assert count_irreducible_kpoints([3, 3, 1]) == 5
+
+
+def test_get_num_threads():
+    from aiida_siesta.calculations.parallel import get_num_threads
+
+    class JobResource(object):
+        num_cores_per_mpiproc = None
+        num_cores_per_machine = None
+        num_mpiprocs_per_machine = 4
+
+    resource = JobResource()
+    assert get_num_threads(resource) is None
+    resource.num_cores_per_machine = 16
+    assert get_num_threads(resource) == 4
+    resource.num_cores_per_mpiproc = 2
+    assert get_num_threads(resource) == 2
+
+
+def test_get_parallel_settings():
+    from aiida_siesta.calculations.parallel import get_parallel_settings
+
+    # Many k-points: over k
+    assert get_parallel_settings(8, 32, 100) == [('diag-parallelOverK', 'T')]
+    # Serial run
+    assert get_parallel_settings(1, 32, 100) == [('diag-parallelOverK', 'F')]
+    # Few k-points: blocks of orbitals
+    assert get_parallel_settings(16, 1, 1000) == [
+        ('diag-parallelOverK', 'F'), ('blocksize', 32)]
+    assert get_parallel_settings(16, 1, 100000) == [
+        ('diag-parallelOverK', 'F'), ('blocksize', 64)]
+    assert get_parallel_settings(16, 1, 10) == [
+        ('diag-parallelOverK', 'F'), ('blocksize', 1)]
+    # Too many orbitals to hold whole k-points
+    assert get_parallel_settings(4, 32, 10000) == [
+        ('diag-parallelOverK', 'F'), ('blocksize', 64)]
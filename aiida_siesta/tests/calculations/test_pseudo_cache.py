@@ -0,0 +1,196 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+class _Node(object):
+    # The extras and md5 of a PsfData
+    md5sum = '0123abcd'
+
+    def __init__(self):
+        self.extras = {}
+
+    def get_extra(self, key, *args):
+        return self.extras.get(key, *args)
+
+    def set_extra(self, key, value):
+        self.extras[key] = value
+
+
+class _Computer(object):
+    uuid = 'c0ffee'
+
+
+def test_mark_cached():
+    from aiida_siesta.calculations.pseudo_cache import (
+        get_cache_path, is_cached, mark_cached)
+
+    pseudo = _Node()
+    computer = _Computer()
+    assert get_cache_path('/scratch/psf', pseudo) == '/scratch/psf/0123abcd.psf'
+    assert not is_cached(pseudo, computer, '/scratch/psf')
+    mark_cached(pseudo, computer, '/scratch/psf/')
+    mark_cached(pseudo, computer, '/scratch/psf')
+    assert is_cached(pseudo, computer, '/scratch/psf')
+    assert len(pseudo.get_extra('siesta_remote_caches')) == 1
+    assert not is_cached(pseudo, computer, '/other')
+
+
+def test_cache_commands(tmpdir):
+    """The pseudos are copied into the cache once, and checked."""
+    import os
+    import subprocess
+    from aiida_siesta.calculations.pseudo_cache import (CHECK_FILE_NAME,
+                                                        get_cache_commands,
+                                                        read_check_file)
+
+    workdir = tmpdir.mkdir('work')
+    workdir.join('Si.psf').write('new')
+    cache_dir = str(tmpdir.join('cache dir'))
+    seeds = [('Si.psf', os.path.join(cache_dir, 'a.psf'), 'a'),
+             ('Si.psf', os.path.join(cache_dir, 'b.psf'), 'b')]
+
+    commands = get_cache_commands(cache_dir, seeds, [])
+    os.makedirs(cache_dir)
+    with open(os.path.join(cache_dir, 'b.psf'), 'w') as f:
+        f.write('cached')
+    subprocess.check_call(['sh', '-c', commands], cwd=str(workdir))
+
+    assert sorted(os.listdir(cache_dir)) == ['a.psf', 'b.psf']
+    with open(os.path.join(cache_dir, 'a.psf')) as f:
+        assert f.read() == 'new'
+    with open(os.path.join(cache_dir, 'b.psf')) as f:
+        assert f.read() == 'cached'
+    # b.psf differs from the uploaded file, so it is not verified
+    check_path = str(workdir.join(CHECK_FILE_NAME))
+    assert read_check_file(check_path) == (set(['a']), set())
+
+    # A dangling link stops the script
+    os.symlink(os.path.join(cache_dir, 'a.psf'), str(workdir.join('O.psf')))
+    os.symlink(os.path.join(cache_dir, 'c.psf'), str(workdir.join('H.psf')))
+    commands = get_cache_commands(cache_dir, [],
+                                  [('O.psf', 'a'), ('H.psf', 'c')])
+    assert subprocess.call(['sh', '-c', commands], cwd=str(workdir)) != 0
+    assert read_check_file(check_path) == (set(['a']), set(['c']))
+
+    # The seeding is not verified if the cache cannot be created
+    cache_dir = str(workdir.join('Si.psf', 'cache'))
+    commands = get_cache_commands(
+        cache_dir, [('Si.psf', os.path.join(cache_dir, 'a.psf'), 'a')], [])
+    subprocess.call(['sh', '-c', commands], cwd=str(workdir))
+    assert read_check_file(check_path) == (set(), set())
+
+
+class _Settings(object):
+
+    def __init__(self, settings_dict):
+        self._dict = settings_dict
+
+    def get_dict(self):
+        return self._dict
+
+
+class _Calculation(object):
+    # The inputs of a SiestaCalculation with the 'pseudo_cache' setting
+    # (and, once parsed, its outputs)
+    pk = 1
+
+    def __init__(self, cache_dir, pseudos):
+        self.inputs = {'settings': _Settings({'pseudo_cache': cache_dir})}
+        for kind, pseudo in pseudos.items():
+            self.inputs['pseudo_' + kind] = pseudo
+        self.out = _Outputs()
+
+    def get_inputs_dict(self):
+        return self.inputs
+
+    def get_linkname(self, name):
+        return name
+
+    def get_computer(self):
+        return _Computer()
+
+    def _get_linkname_pseudo_prefix(self):
+        return 'pseudo_'
+
+
+class _Outputs(dict):
+
+    def __getattr__(self, name):
+        return self[name]
+
+
+class _Context(object):
+    pass
+
+
+class _WorkChain(object):
+    # The state of a SiestaBaseWorkChain used by its failure handler
+
+    def __init__(self):
+        self.ctx = _Context()
+        self.ctx.restart_calc = None
+        self.ctx.scf_did_not_converge = False
+        self.ctx.geometry_did_not_converge = False
+        self.ctx.out_of_time = False
+        self.reports = []
+        self.aborted = None
+
+    def report(self, message):
+        self.reports.append(message)
+
+    def abort_nowait(self, message):
+        self.aborted = message
+
+
+def test_missing_cache_resubmitted(tmpdir):
+    """A calculation stopped by a missing pseudo is flagged, and resubmitted."""
+    from aiida.orm.data.parameter import ParameterData
+    from aiida_siesta.calculations.pseudo_cache import (CHECK_FILE_NAME,
+                                                        is_cached,
+                                                        mark_cached)
+    from aiida_siesta.parsers.siesta import get_pseudo_cache_parameters
+    from aiida_siesta.workflows.base import SiestaBaseWorkChain
+
+    pseudos = {'Si': _Node(), 'O': _Node()}
+    pseudos['Si'].md5sum, pseudos['Si'].filename = 'a', 'Si.psf'
+    pseudos['O'].md5sum, pseudos['O'].filename = 'b', 'O.psf'
+    computer = _Computer()
+    for pseudo in pseudos.values():
+        mark_cached(pseudo, computer, '/scratch/psf')
+    calc = _Calculation('/scratch/psf', pseudos)
+
+    # The cache was found complete
+    check_file = tmpdir.join(CHECK_FILE_NAME)
+    check_file.write('cached a\ncached b\n')
+    assert get_pseudo_cache_parameters(calc, str(check_file)) is None
+
+    check_file.write('cached a\nmissing b\n')
+    parameters = get_pseudo_cache_parameters(calc, str(check_file))
+    assert is_cached(pseudos['Si'], computer, '/scratch/psf')
+    assert not is_cached(pseudos['O'], computer, '/scratch/psf')
+    assert parameters['pseudo_cache_missing'] == ['O.psf']
+    assert parameters['message_flags']['pseudo_cache_missing']
+    assert parameters['message_flags']['fatal']
+    assert parameters['warnings'][0].startswith(
+        'FATAL: PSEUDO_CACHE_MISSING:')
+
+    # The workchain resubmits it, without restarting from it
+    handle_failure = SiestaBaseWorkChain._handle_calculation_failure.__func__
+    calc.out['output_parameters'] = ParameterData(dict=parameters)
+    workchain = _WorkChain()
+    handle_failure(workchain, calc)
+    assert workchain.aborted is None
+    assert workchain.ctx.restart_calc is None
+    assert 'resubmitting' in workchain.reports[-1]
+
+    # The same for an older output, with the 'warnings' only
+    del parameters['message_flags']
+    calc.out['output_parameters'] = ParameterData(dict=parameters)
+    handle_failure(workchain, calc)
+    assert workchain.aborted is None
+    assert workchain.ctx.restart_calc is None
+
+    # A failed calculation without output parameters
+    del calc.out['output_parameters']
+    handle_failure(workchain, calc)
+    assert workchain.aborted is not None
@@ -0,0 +1,217 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+import os.path as op
+
+
+def test_md5_files():
+    """The checksums are in the order of the files."""
+    import glob
+    import hashlib
+    from aiida_siesta.data.psf import md5_files
+
+    files = sorted(glob.glob(op.join(op.dirname(__file__), "..", "pseudos",
+                                     "*.psf")))
+    expected = []
+    for fname in files:
+        with open(fname, 'rb') as f:
+            expected.append(hashlib.md5(f.read()).hexdigest())
+
+    assert md5_files(files, num_threads=4) == expected
+    assert md5_files(files, num_threads=1) == expected
+    assert md5_files([]) == []
+
+
+def test_psf_hashed_once(monkeypatch):
+    """The file of a new PsfData is hashed once, unless it changes."""
+    import os
+    import aiida.common.utils
+    from aiida.common.exceptions import ValidationError
+    from aiida.orm import DataFactory
+
+    PsfData = DataFactory('siesta.psf')
+    md5_file = aiida.common.utils.md5_file
+    calls = []
+
+    def counting_md5_file(filename, *args, **kwargs):
+        calls.append(filename)
+        return md5_file(filename, *args, **kwargs)
+
+    monkeypatch.setattr(aiida.common.utils, 'md5_file', counting_md5_file)
+
+    fname = op.realpath(op.join(op.dirname(__file__), "..", "pseudos",
+                                "Si.psf"))
+    pseudo = PsfData(file=fname)
+    assert len(calls) == 1
+    assert pseudo._get_psf_info(pseudo.get_file_abs_path())[1] == \
+        md5_file(fname)
+    assert len(calls) == 1
+    assert pseudo.element == 'Si'
+    assert pseudo.md5sum == md5_file(fname)
+
+    pseudo._validate()
+    pseudo._validate()
+    assert len(calls) == 1
+
+    # A change of the file is noticed
+    path = pseudo.get_file_abs_path()
+    stat = os.stat(path)
+    os.utime(path, (stat.st_atime, stat.st_mtime + 10))
+    pseudo._validate()
+    assert len(calls) == 2
+
+    # A change with the same size and modification time is only found
+    # with strict_validation
+    stat = os.stat(path)
+    with open(path, 'r+') as f:
+        f.seek(-2, os.SEEK_END)
+        f.write('9')
+    os.utime(path, (stat.st_atime, stat.st_mtime))
+    pseudo._validate()
+    pseudo.strict_validation = True
+    try:
+        pseudo._validate()
+    except ValidationError:
+        pass
+    else:
+        raise AssertionError("The change of the file was not found")
+
+
+def test_parse_psf():
+    from aiida_siesta.data.psf import parse_psf
+
+    parsed_data = parse_psf(op.join(op.dirname(__file__), "..", "pseudos",
+                                    "Fe.psf"))
+    assert parsed_data == {
+        'element': 'Fe',
+        'xc_functional': 'pb',
+        'relativistic': True,
+        'core_correction': True,
+        'cutoff_radii': {
+            '4s': 2.0,
+            '4p': 2.0,
+            '3d': 2.0,
+            '4f': 2.0
+        },
+        'num_grid_points': 1123,
+        'z_valence': 8.0,
+    }
+
+    parsed_data = parse_psf(op.join(op.dirname(__file__), "..", "pseudos",
+                                    "Si.psf"))
+    assert not parsed_data['relativistic']
+    assert not parsed_data['core_correction']
+    assert parsed_data['z_valence'] == 4.0
+    assert parsed_data['cutoff_radii']['3p'] == 1.89
+
+
+def test_read_psf_radial_arrays():
+    from aiida_siesta.data.psf import read_psf_radial_arrays
+
+    arrays = read_psf_radial_arrays(
+        op.join(op.dirname(__file__), "..", "pseudos", "Si.psf"))
+    assert arrays['radial_grid'].shape == (1074, )
+    assert arrays['radial_grid'][0] == 0.222706172396E-05
+    assert list(arrays['down_l']) == [0, 1, 2, 3]
+    assert arrays['down'].shape == (4, 1074)
+    assert arrays['up'].shape == (0, 1074)
+    assert arrays['core_charge'].shape == (1074, )
+    assert arrays['valence_charge'].shape == (1074, )
+
+    # Fe.psf has up pseudopotentials, a core charge and values with
+    # exponents of three digits (written without the 'E')
+    arrays = read_psf_radial_arrays(
+        op.join(op.dirname(__file__), "..", "pseudos", "Fe.psf"))
+    assert arrays['radial_grid'].shape == (1123, )
+    assert list(arrays['down_l']) == [0, 1, 2, 3]
+    assert arrays['down'].shape == (4, 1123)
+    assert list(arrays['up_l']) == [1, 2, 3]
+    assert arrays['up'].shape == (3, 1123)
+    assert arrays['core_charge'].shape == (1123, )
+    assert arrays['valence_charge'].shape == (1123, )
+    assert arrays['valence_charge'].min() >= 0.0
+
+
+def test_family_element_index():
+    """The index is cached, and rebuilt when the family changes."""
+    import uuid
+    from aiida.orm import load_node
+    from aiida_siesta.data import psf
+
+    family_name = 'test_family_{}'.format(uuid.uuid4().hex)
+    folder = op.realpath(op.join(op.dirname(__file__), "..", "pseudos"))
+    psf.upload_psf_family(folder, family_name, "Test family",
+                          stop_if_existing=False)
+
+    family_index = psf.get_family_element_index(family_name)
+    assert sorted(family_index) == ['C', 'Fe', 'H', 'Mg', 'O', 'Si']
+    assert family_name in psf._family_index_cache
+    assert psf.get_family_element_index(family_name) == family_index
+
+    group = psf.PsfData.get_psf_group(family_name)
+    group.remove_nodes([load_node(family_index['Fe'])])
+    assert 'Fe' not in psf.get_family_element_index(family_name)
+
+
+def test_export_import_family(tmpdir):
+    """A family archive is imported again without new nodes."""
+    import tarfile
+    import uuid
+    from aiida_siesta.data import psf
+
+    family_name = 'test_family_{}'.format(uuid.uuid4().hex)
+    folder = op.realpath(op.join(op.dirname(__file__), "..", "pseudos"))
+    psf.upload_psf_family(folder, family_name, "Test family",
+                          stop_if_existing=False)
+
+    archive_path = str(tmpdir.join('family.tar.gz'))
+    assert psf.export_psf_family(family_name, archive_path) == 6
+
+    manifest = psf.read_psf_archive_manifest(archive_path)
+    assert manifest['name'] == family_name
+    assert manifest['description'] == "Test family"
+    elements = dict((entry['element'], entry)
+                    for entry in manifest['pseudos'])
+    assert sorted(elements) == ['C', 'Fe', 'H', 'Mg', 'O', 'Si']
+    assert elements['Fe']['z_valence'] == 8.0
+    with tarfile.open(archive_path, 'r:gz') as archive:
+        assert archive.getnames()[0] == psf.PSF_ARCHIVE_MANIFEST
+
+    # The pseudos are all in the database already
+    new_name = family_name + '_imported'
+    assert psf.import_psf_family(archive_path, new_name) == (6, 0)
+    assert (psf.get_family_element_index(new_name) ==
+            psf.get_family_element_index(family_name))
+    assert (psf.PsfData.get_psf_group(new_name).description ==
+            "Test family")
+
+
+def test_archive_manifest_checks(tmpdir):
+    """Entries that would be extracted out of place are rejected."""
+    import io
+    import json
+    import tarfile
+    import pytest
+    from aiida_siesta.data import psf
+
+    md5sum = '0123456789abcdef0123456789abcdef'
+    for md5, filename in [(md5sum, '../../x.psf'), (md5sum, 'a/x.psf'),
+                          ('../' + md5sum[3:], 'x.psf'), (md5sum, '..')]:
+        manifest = {
+            'version': psf.PSF_ARCHIVE_VERSION,
+            'name': 'test',
+            'description': '',
+            'pseudos': [{
+                'md5': md5,
+                'filename': filename,
+                'path': "pseudos/{}/{}".format(md5, filename),
+            }],
+        }
+        archive_path = str(tmpdir.join('family.tar.gz'))
+        data = json.dumps(manifest).encode('utf-8')
+        info = tarfile.TarInfo(psf.PSF_ARCHIVE_MANIFEST)
+        info.size = len(data)
+        with tarfile.open(archive_path, 'w:gz') as archive:
+            archive.addfile(info, io.BytesIO(data))
+
+        with pytest.raises(ValueError):
+            psf.read_psf_archive_manifest(archive_path)
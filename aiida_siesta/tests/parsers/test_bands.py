@@ -0,0 +1,57 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+def test_read_bands_file(tmpdir):
+    """Both layouts and both spin channels are read."""
+    from aiida_siesta.benchmarks.generators import write_bands_file
+    from aiida_siesta.parsers.bands import read_bands_file
+
+    bands_path = str(tmpdir.join('aiida.bands'))
+
+    write_bands_file(bands_path, nkpoints=7, nbands=12, nspin=1,
+                     band_lines=True)
+    bands, coords = read_bands_file(bands_path, band_lines=True)
+    assert bands.shape == (7, 12)
+    assert coords[0] == 0.0 and coords[-1] == 3.0
+
+    write_bands_file(bands_path, nkpoints=7, nbands=12, nspin=2,
+                     band_lines=False)
+    bands, coords = read_bands_file(bands_path, band_lines=False)
+    assert bands.shape == (2, 7, 12)
+    assert not coords.any()
+    # Header, three coordinates, and then spin-up before spin-down
+    tokens = open(bands_path).read().split()
+    assert bands[0, 0, 0] == float(tokens[9])
+    assert bands[1, 0, 0] == float(tokens[21])
+
+
+def test_read_eig_file(tmpdir):
+    """The values are the same whatever the size of the chunks read."""
+    import numpy as np
+    from aiida_siesta.benchmarks.generators import (write_eig_file,
+                                                    write_kp_file)
+    from aiida_siesta.parsers.bands import (read_eig_file, read_kp_file,
+                                            read_values)
+
+    eig_path = str(tmpdir.join('aiida.EIG'))
+    write_eig_file(eig_path, nkpoints=5, nbands=23, nspin=2)
+    kp_path = str(tmpdir.join('aiida.KP'))
+    write_kp_file(kp_path, nkpoints=5)
+
+    ef, bands = read_eig_file(eig_path)
+    assert ef == -4.0
+    assert bands.shape == (2, 5, 23)
+    kpoints, weights = read_kp_file(kp_path)
+    assert kpoints.shape == (5, 3)
+    assert abs(weights.sum() - 1.0) < 1e-5
+
+    with open(eig_path) as f:
+        f.readline()
+        f.readline()
+        out = np.empty(5 * (1 + 2 * 23))
+        assert read_values(f, out, chunk_size=7) == len(out)
+    out = out.reshape(5, 47)
+    assert (out[:, 0] == np.arange(1, 6)).all()
+    assert (out[:, 1:24] == bands[0]).all()
+    assert (out[:, 24:] == bands[1]).all()
@@ -0,0 +1,98 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+def test_parse_cache(tmpdir):
+    """Results are found again for byte-identical files only."""
+    import numpy as np
+    from aiida_siesta.parsers.cache import ParseCache
+
+    xml_path = str(tmpdir.join('aiida.xml'))
+    with open(xml_path, 'w') as f:
+        f.write('<cml/>\n')
+
+    cache = ParseCache(str(tmpdir.join('cache')))
+    key = cache.make_key([xml_path, None], 'version')
+    assert cache.get(key) is None
+
+    cache.put(key, {'forces': np.arange(6.0).reshape(2, 3)})
+    results = cache.get(key)
+    assert results['forces'].shape == (2, 3)
+
+    assert cache.make_key([xml_path, None], 'version') == key
+    assert cache.make_key([xml_path, None], 'other version') != key
+    with open(xml_path, 'w') as f:
+        f.write('<cml></cml>\n')
+    assert cache.make_key([xml_path, None], 'version') != key
+
+
+def test_parse_cache_eviction(tmpdir):
+    """The least recently used entries are removed first."""
+    import os
+    import time
+    from aiida_siesta.parsers.cache import ParseCache
+
+    # Room for about two entries
+    cache = ParseCache(str(tmpdir), max_size_mb=2.5 / 1024)
+    value = 'x' * 1000
+    cache.put('a', value)
+    cache.put('b', value)
+    # Make 'a' the most recently used
+    past = time.time() - 10
+    os.utime(cache._path('b'), (past, past))
+    assert cache.get('a') == value
+
+    cache.put('c', value)
+    assert cache.get('b') is None
+    assert cache.get('a') == value
+    assert cache.get('c') == value
+
+
+def test_hash_modules(tmpdir):
+    """The hash changes with the sources of the modules."""
+    import imp
+    from aiida_siesta.parsers.cache import hash_modules
+
+    source = tmpdir.join('module.py')
+    source.write('x = 1\n')
+    module = imp.load_source('parse_cache_test_module', str(source))
+
+    hash_value = hash_modules([module])
+    assert hash_modules([module]) == hash_value
+    source.write('x = 2\n')
+    assert hash_modules([module]) != hash_value
+
+
+def test_parse_cache_unwritable(tmpdir, monkeypatch):
+    """The results are extracted as usual if the cache cannot be used."""
+    from aiida_siesta.benchmarks.generators import write_cml_file
+    from aiida_siesta.parsers.cache import (CACHE_DIR_VARIABLE,
+                                            CACHE_SIZE_VARIABLE, ParseCache)
+    from aiida_siesta.parsers.siesta import extract_results_cached
+
+    xml_path = str(tmpdir.join('aiida.xml'))
+    write_cml_file(xml_path, natoms=2, nsteps=1, nscf=2)
+    # (a directory under a regular file, which cannot be written even
+    # by root)
+    tmpdir.join('file').write('')
+    unwritable = str(tmpdir.join('file', 'cache'))
+
+    # The cache directory cannot be created
+    monkeypatch.setenv(CACHE_DIR_VARIABLE, unwritable)
+    results = extract_results_cached(None, None, xml_path, None)
+    assert 'E_KS' in results['parameters']
+    assert any(level == 'warning' for level, _ in results['log'])
+
+    # The size of the cache is not a number
+    monkeypatch.setenv(CACHE_DIR_VARIABLE, str(tmpdir.join('cache')))
+    monkeypatch.setenv(CACHE_SIZE_VARIABLE, 'large')
+    results = extract_results_cached(None, None, xml_path, None)
+    assert 'E_KS' in results['parameters']
+    assert any(level == 'warning' for level, _ in results['log'])
+
+    # The entries cannot be written
+    cache = ParseCache(str(tmpdir.join('cache')))
+    cache.directory = unwritable
+    results = extract_results_cached(None, None, xml_path, None, cache=cache)
+    assert 'E_KS' in results['parameters']
+    assert any('not stored' in message for _, message in results['log'])
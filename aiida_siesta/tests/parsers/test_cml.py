@@ -0,0 +1,195 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+def test_cml_index(tmpdir):
+    """The index only keeps the modules used by the parser."""
+    from aiida_siesta.benchmarks.generators import write_cml_file
+    from aiida_siesta.parsers.cml import parse_cml_file
+
+    xml_path = str(tmpdir.join('aiida.xml'))
+    write_cml_file(xml_path, natoms=4, nsteps=5, nscf=3)
+    cml_index = parse_cml_file(xml_path)
+
+    assert cml_index.variable_geometry
+    assert cml_index.first_step.get('serial') == '1'
+    assert cml_index.last_step.get('serial') == '5'
+    assert len(list(cml_index.last_step.iter('atom'))) == 4
+    # SCF iterations are not kept in the geometry modules
+    assert len(list(cml_index.last_step.iter("module"))) == 1
+    assert 'siesta:no_u' in cml_index.first_step_properties
+    assert 'siesta:forces' in cml_index.scf_final_properties
+    assert cml_index.metadata['siesta:Program'] == 'Siesta'
+
+
+def test_parser_helpers_on_cml_index(tmpdir):
+    from aiida_siesta.benchmarks.generators import write_cml_file
+    from aiida_siesta.parsers.siesta import (get_parsed_xml_doc,
+                                             get_dict_from_xml_doc,
+                                             get_final_forces_and_stress)
+
+    xml_path = str(tmpdir.join('aiida.xml'))
+    write_cml_file(xml_path, natoms=4, nsteps=5, nscf=3)
+    cml_index = get_parsed_xml_doc(xml_path)
+
+    result_dict = get_dict_from_xml_doc(cml_index)
+    assert result_dict['variable_geometry']
+    assert result_dict['no_u'] == 52
+    assert result_dict['mesh'] == [30, 30, 30]
+    assert result_dict['E_KS_units'] == 'eV'
+
+    forces, stress = get_final_forces_and_stress(cml_index)
+    assert forces.shape == (4, 3)
+    assert stress.shape == (3, 3)
+    # The same values as the last step of the trajectory
+    arrays = cml_index.trajectory.get_arrays()
+    assert (forces == arrays['forces'][-1]).all()
+    assert (stress == arrays['stress'][-1]).all()
+
+
+def test_cml_trajectory(tmpdir):
+    """Every geometry step is recorded, with its final forces."""
+    import numpy as np
+    from aiida_siesta.benchmarks.generators import write_cml_file
+    from aiida_siesta.parsers.cml import parse_cml_file
+
+    xml_path = str(tmpdir.join('aiida.xml'))
+    write_cml_file(xml_path, natoms=4, nsteps=5, nscf=3)
+    cml_index = parse_cml_file(xml_path)
+
+    trajectory = cml_index.trajectory
+    assert trajectory.numsteps == 5
+    assert trajectory.symbols == ['Si', 'O', 'H', 'C']
+
+    arrays = trajectory.get_arrays()
+    assert list(arrays['steps']) == [1, 2, 3, 4, 5]
+    assert arrays['cells'].shape == (5, 3, 3)
+    assert arrays['positions'].shape == (5, 4, 3)
+    assert arrays['forces'].shape == (5, 4, 3)
+    assert arrays['stress'].shape == (5, 3, 3)
+    assert list(arrays['E_KS']) == [-400.0 - i for i in range(5)]
+    assert not np.isnan(arrays['forces']).any()
+
+    # The last step is the one in the output structure
+    last_atom = list(cml_index.last_step.iter('atom'))[-1]
+    assert arrays['positions'][-1, -1, 0] == float(last_atom.get('x3'))
+
+
+def test_cml_scf_history(tmpdir):
+    """Every SCF iteration is recorded, with its geometry step."""
+    import numpy as np
+    from aiida_siesta.benchmarks.generators import write_cml_file
+    from aiida_siesta.parsers.cml import parse_cml_file
+
+    xml_path = str(tmpdir.join('aiida.xml'))
+    write_cml_file(xml_path, natoms=4, nsteps=5, nscf=3)
+    cml_index = parse_cml_file(xml_path)
+
+    scf_history = cml_index.scf_history
+    assert scf_history.numiterations == 15
+
+    arrays = scf_history.get_arrays()
+    assert list(arrays['steps']) == [1, 2, 3, 4, 5]
+    assert list(arrays['scf_iterations']) == [3] * 5
+    assert list(arrays['iteration_step'][:4]) == [1, 1, 1, 2]
+    assert list(arrays['dDmax'][:3]) == [1.0, 0.1, 0.01]
+    assert list(arrays['step_E_KS']) == [-400.0 - i for i in range(5)]
+    for name in ['Eharrs', 'E_KS', 'FreeE', 'Ef', 'dDmax', 'dHmax']:
+        assert arrays[name].shape == (15, )
+        assert not np.isnan(arrays[name]).any()
+
+
+def test_matrix_to_array():
+    """The matrices are read column after column, and validated."""
+    import pytest
+    from xml.etree import ElementTree
+    from aiida_siesta.parsers.cml import matrix_to_array
+
+    matrix = ElementTree.fromstring(
+        '<matrix rows="3" columns="2">1 2 3\n4 5 6</matrix>')
+    array = matrix_to_array(matrix)
+    assert array.shape == (2, 3)
+    assert list(array[1]) == [4.0, 5.0, 6.0]
+
+    matrix = ElementTree.fromstring(
+        '<matrix rows="2" columns="3">1 2 3 4 5</matrix>')
+    with pytest.raises(ValueError):
+        matrix_to_array(matrix)
+
+
+def _forces_properties(rows, columns, text):
+    from xml.etree import ElementTree
+
+    prop = ElementTree.fromstring(
+        '<property dictRef="siesta:forces"><matrix rows="{}" columns="{}">'
+        '{}</matrix></property>'.format(rows, columns, text))
+    return {'siesta:forces': prop}
+
+
+def test_forces_layout():
+    """The forces are read as Siesta writes them, one column per atom."""
+    import pytest
+    from aiida_siesta.parsers.cml import get_forces_and_stress
+
+    # 2 atoms, 3 rows x 2 columns
+    properties = _forces_properties(3, 2, '1 2 3 4 5 6')
+    forces, stress = get_forces_and_stress(properties, natoms=2)
+    assert stress is None
+    assert forces.tolist() == [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]
+    forces, _ = get_forces_and_stress(properties)
+    assert forces.shape == (2, 3)
+
+    # The wrong number of atoms
+    with pytest.raises(ValueError):
+        get_forces_and_stress(properties, natoms=4)
+
+    # One row per atom is only accepted when unambiguous
+    properties = _forces_properties(2, 3, '1 4 2 5 3 6')
+    forces, _ = get_forces_and_stress(properties, natoms=2)
+    assert forces.tolist() == [[1.0, 2.0, 3.0], [4.0, 5.0, 6.0]]
+    with pytest.raises(ValueError):
+        get_forces_and_stress(properties)
+
+    # 3 atoms: the Siesta layout, not transposed
+    properties = _forces_properties(3, 3, '1 2 3 4 5 6 7 8 9')
+    forces, _ = get_forces_and_stress(properties, natoms=3)
+    assert forces.tolist()[0] == [1.0, 2.0, 3.0]
+
+
+def test_final_forces_values(tmpdir):
+    """The forces of a generated file are those of each atom."""
+    import numpy as np
+    from aiida_siesta.benchmarks.generators import write_cml_file
+    from aiida_siesta.parsers.siesta import (get_parsed_xml_doc,
+                                             get_final_forces_and_stress)
+
+    xml_path = str(tmpdir.join('aiida.xml'))
+    write_cml_file(xml_path, natoms=5, nsteps=1, nscf=2, seed=3)
+    cml_index = get_parsed_xml_doc(xml_path)
+    forces, _ = get_final_forces_and_stress(cml_index)
+    assert forces.shape == (5, 3)
+
+    matrix = cml_index.scf_final_properties['siesta:forces'].find('matrix')
+    assert matrix.get('rows') == '3'
+    assert matrix.get('columns') == '5'
+    values = [float(v) for v in matrix.text.split()]
+    assert np.allclose(forces[1], values[3:6])
+
+
+def test_parsed_xml_doc_malformed(tmpdir):
+    """The error of a malformed CML file is reported."""
+    import pytest
+    from aiida_siesta.benchmarks.generators import write_cml_file
+    from aiida_siesta.parsers.siesta import (get_parsed_xml_doc,
+                                             SiestaCMLParsingError)
+
+    xml_path = str(tmpdir.join('aiida.xml'))
+    write_cml_file(xml_path, natoms=4, nsteps=2, nscf=3)
+    with open(xml_path) as f:
+        text = f.read()
+    with open(xml_path, 'w') as f:
+        f.write(text[:len(text) // 2])
+
+    with pytest.raises(SiestaCMLParsingError) as excinfo:
+        get_parsed_xml_doc(xml_path)
+    assert 'Malformed CML file: ' in str(excinfo.value)
@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+def test_timing_profile(tmpdir):
+    """The whole timer tree is flattened, in the order of the file."""
+    import numpy as np
+    from aiida_siesta.parsers.json_time import (get_timing_profile,
+                                                get_hot_sections,
+                                                get_timing_info)
+
+    json_path = str(tmpdir.join('time.json'))
+    with open(json_path, 'w') as f:
+        f.write('{"global_section": {"siesta": {"_time": 10.0, "_calls": 1, '
+                '"IterGeom": {"_time": 9.0, "_calls": 1, '
+                '"IterSCF": {"_time": 8.0, "_calls": 20, '
+                '"compute_dm": {"_time": 5.0, "_calls": 20}}, '
+                '"state_init": {"_time": 0.5, "_calls": 1}}}}}')
+
+    profile = get_timing_profile(json_path)
+    assert list(profile['sections']) == [
+        'siesta', 'siesta/IterGeom', 'siesta/IterGeom/IterSCF',
+        'siesta/IterGeom/IterSCF/compute_dm', 'siesta/IterGeom/state_init'
+    ]
+    assert list(profile['parents']) == [-1, 0, 1, 2, 1]
+    assert list(profile['calls']) == [1, 1, 20, 20, 1]
+    assert np.allclose(profile['self_times'], [1.0, 0.5, 3.0, 5.0, 0.5])
+
+    hot = get_hot_sections(profile, 2)
+    assert [h['section'] for h in hot] == [
+        'siesta/IterGeom/IterSCF/compute_dm', 'siesta/IterGeom/IterSCF'
+    ]
+    assert hot[0]['calls'] == 20
+
+    global_time, timing_decomp = get_timing_info(json_path)
+    assert global_time == 10.0
+    assert timing_decomp == {
+        'siesta': 10.0,
+        'compute_DM': 5.0,
+        'state_init': 0.5
+    }
+
+
+def test_timing_info_unparseable(tmpdir):
+    from aiida_siesta.parsers.json_time import (flatten_timer_tree,
+                                                get_timing_info)
+
+    json_path = str(tmpdir.join('time.json'))
+    with open(json_path, 'w') as f:
+        f.write('{"global_section": ')
+    assert get_timing_info(json_path) == (None, {})
+
+    with open(json_path, 'w') as f:
+        f.write('{"other_section": {}}')
+    assert get_timing_info(json_path) == (None, {})
+
+    # A tree that is not a dictionary gives an empty profile
+    assert len(flatten_timer_tree(None)['sections']) == 0
+    with open(json_path, 'w') as f:
+        f.write('{"global_section": [1, 2]}')
+    assert get_timing_info(json_path) == (None, {})
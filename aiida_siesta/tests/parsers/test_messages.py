@@ -0,0 +1,24 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+def test_classify_messages():
+    from aiida_siesta.parsers.messages import classify_messages
+
+    lines = [
+        "INFO: Some information\n",
+        "WARNING: SCF_NOT_CONV: SCF did not converge at wall time exhaustion\n",
+        "FATAL: OUT_OF_TIME: Time is up.\n",
+    ]
+    messages, flags, counts = classify_messages(lines)
+    assert messages[-1] == "FATAL: OUT_OF_TIME: Time is up."
+    assert flags['fatal'] and flags['out_of_time'] and flags['scf_not_conv']
+    assert not flags['completed'] and not flags['geom_not_conv']
+    assert counts == {'info': 1, 'warning': 1, 'fatal': 1}
+
+    # The same flags are found in the 'warnings' list of old outputs
+    _, old_flags, _ = classify_messages(messages)
+    assert old_flags == flags
+
+    _, flags, _ = classify_messages(["INFO: Job completed\n"])
+    assert flags['completed'] and not flags['fatal']
@@ -0,0 +1,55 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+def test_extract_results_bad_eigenvalues(tmpdir):
+    """The other results are kept if the eigenvalues cannot be read."""
+    from aiida_siesta.benchmarks.generators import (write_cml_file,
+                                                    write_eig_file,
+                                                    write_kp_file)
+    from aiida_siesta.parsers.siesta import extract_results
+
+    xml_path = str(tmpdir.join('aiida.xml'))
+    write_cml_file(xml_path)
+    eig_path = str(tmpdir.join('aiida.EIG'))
+    write_eig_file(eig_path, nkpoints=5, nbands=23)
+    kp_path = str(tmpdir.join('aiida.KP'))
+    write_kp_file(kp_path, nkpoints=5)
+
+    results = extract_results(None, None, xml_path, None, eig_path=eig_path,
+                              kp_path=kp_path)
+    assert results['eigenvalues'][0].shape == (5, 23)
+
+    # Truncated
+    with open(eig_path) as f:
+        lines = f.readlines()
+    with open(eig_path, 'w') as f:
+        f.writelines(lines[:len(lines) // 2])
+
+    results = extract_results(None, None, xml_path, None, eig_path=eig_path,
+                              kp_path=kp_path)
+    assert 'eigenvalues' not in results
+    assert 'E_KS' in results['parameters']
+    assert any(level == 'warning' for level, _ in results['log'])
+
+
+def test_read_messages_interrupted(tmpdir):
+    """A job that did not complete is flagged as fatal."""
+    from aiida_siesta.benchmarks.generators import write_messages_file
+    from aiida_siesta.parsers.siesta import read_messages_file
+
+    messages_path = str(tmpdir.join('MESSAGES'))
+    write_messages_file(messages_path, nwarnings=3, completed=True)
+    successful, lines, flags, counts, _ = read_messages_file(
+        messages_path)
+    assert successful
+    assert not flags['fatal']
+    assert counts['fatal'] == 0
+
+    write_messages_file(messages_path, nwarnings=3, completed=False)
+    successful, lines, flags, counts, _ = read_messages_file(
+        messages_path)
+    assert not successful
+    assert lines[-1] == 'FATAL: ABNORMAL_EXTERNAL_TERMINATION'
+    assert flags['fatal']
+    assert counts['fatal'] == 1
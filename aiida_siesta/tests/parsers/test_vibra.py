@@ -0,0 +1,26 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+def test_read_vibra_output(tmpdir):
+    """The output of Vibra is read without a calculation."""
+    from aiida_siesta.benchmarks.generators import write_vibra_output
+    from aiida_siesta.parsers.vibra import (read_vibra_errors,
+                                            read_vibra_output,
+                                            read_vibra_warnings)
+
+    output_path = str(tmpdir.join('aiida.out'))
+    write_vibra_output(output_path, natoms=2, ncells=8, nwarnings=3)
+
+    assert read_vibra_errors(output_path) == (True, [], [])
+    assert len(read_vibra_warnings(output_path)) == 3
+    output_dict = read_vibra_output(output_path)
+    assert output_dict['number_of_unit_cells'] == 8
+    assert output_dict['zero_point_energy'] == 0.1
+
+    with open(output_path, 'a') as f:
+        f.write('Error: something went wrong\n')
+    successful, errors, log = read_vibra_errors(output_path)
+    assert not successful
+    assert errors[0] == 'Error: something went wrong'
+    assert log == [('error', 'Error: something went wrong')]
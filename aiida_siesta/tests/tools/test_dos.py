@@ -0,0 +1,76 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+PDOS_FILE = """<pdos>
+<nspin>2</nspin>
+<norbitals>3</norbitals>
+<energy_values units="eV">
+  -2.0
+  -1.0
+   0.0
+</energy_values>
+<orbital index="1" atom_index="1" species="Si" position="0 0 0"
+ n="3" l="0" m="0" z="1" P="false">
+<data>
+  0.1 0.2
+  0.3 0.4
+  0.5 0.6
+</data>
+</orbital>
+<orbital index="2" atom_index="1" species="Si" position="0 0 0"
+ n="3" l="1" m="-1" z="1" P="false">
+<data>
+  1.0 1.0
+  1.0 1.0
+  1.0 1.0
+</data>
+</orbital>
+<orbital index="3" atom_index="2" species="O" position="1 1 1"
+ n="2" l="1" m="-1" z="1" P="false">
+<data>
+  2.0 3.0
+  2.0 3.0
+  2.0 3.0
+</data>
+</orbital>
+</pdos>
+"""
+
+
+def test_dos_normalization():
+    """The DOS integrates to the number of bands, whatever the chunks."""
+    import numpy as np
+    from aiida_siesta.tools.dos import compute_dos
+
+    rng = np.random.RandomState(0)
+    eigenvalues = rng.uniform(-5.0, 5.0, size=(2, 10, 8))
+    energies = np.linspace(-10.0, 10.0, 2001)
+    step = energies[1] - energies[0]
+
+    dos = compute_dos(eigenvalues, energies, 0.1)
+    assert dos.shape == (2, 2001)
+    assert np.allclose(dos.sum(axis=1) * step, 8.0)
+
+    chunked = compute_dos(eigenvalues, energies, 0.1, max_chunk_elements=100)
+    assert np.allclose(chunked, dos)
+
+    dos = compute_dos(eigenvalues[0], energies, 0.1, weights=np.arange(10),
+                      method='methfessel-paxton', order=2)
+    assert dos.shape == (2001, )
+    assert np.allclose(dos.sum() * step, 8.0)
+
+
+def test_read_pdos_file(tmpdir):
+    import numpy as np
+    from aiida_siesta.tools.dos import read_pdos_file
+
+    pdos_path = tmpdir.join('aiida.PDOS')
+    pdos_path.write(PDOS_FILE)
+
+    pdos = read_pdos_file(str(pdos_path))
+    assert pdos.pdos.shape == (2, 3, 3)
+    assert list(pdos.energies) == [-2.0, -1.0, 0.0]
+    assert np.allclose(pdos.pdos[1, 0], [0.2, 0.4, 0.6])
+    assert pdos.orbitals[2]['species'] == 'O'
+    assert list(pdos.select(l=1)) == [1, 2]
+    assert np.allclose(pdos.get_projection(species='Si')[0], [1.1, 1.3, 1.5])
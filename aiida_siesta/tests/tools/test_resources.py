@@ -0,0 +1,61 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+def test_estimate_num_orbitals():
+    from aiida_siesta.tools.resources import (estimate_num_orbitals,
+                                              parse_mesh_cutoff)
+
+    kinds = [('Si', 'Si'), ('Si', 'Si'), ('H', 'H'), ('Fe', 'Fe')]
+    assert estimate_num_orbitals(kinds, {}) == 13 + 13 + 5 + 15
+    basis = {
+        'pao-basis-size': 'SZ',
+        '%block pao-basis-sizes': "\nSi DZP\n",
+    }
+    assert estimate_num_orbitals(kinds, basis) == 13 + 13 + 1 + 6
+
+    assert parse_mesh_cutoff('200.000 Ry') == 200.0
+    assert abs(parse_mesh_cutoff('2721.1396 eV') - 200.0) < 1e-3
+
+
+def test_resource_estimator():
+    """The model reproduces a power law, and picks the machines."""
+    import itertools
+    import pytest
+    from aiida_siesta.tools.resources import ResourceEstimator
+
+    def time(no_u, nprocs):
+        return 1e-3 * no_u**2 * 10 / nprocs
+
+    records = [{
+        'no_u': no_u,
+        'mesh_points': 1000 * no_u,
+        'nkpoints': nkpoints,
+        'nprocs': nprocs,
+        'global_time': time(no_u, nprocs),
+        'max_dynamic_memory': None,
+    } for no_u, nkpoints, nprocs in itertools.product(
+        [100, 200, 400], [1, 8], [4, 16])]
+
+    estimator = ResourceEstimator.fit(records)
+    assert estimator.memory_coefficients is None
+    sizes = {'no_u': 1000, 'mesh_points': 10**6, 'nkpoints': 1}
+    assert abs(estimator.predict_time(sizes, 8) - time(1000, 8)) < 1e-6
+
+    # 1250 s with 8 processes, 625 s with 16
+    suggestion = estimator.suggest_resources(
+        sizes, 8, max_wallclock_seconds=1000, safety_factor=1.2)
+    assert suggestion['resources']['num_machines'] == 2
+    assert abs(suggestion['max_wallclock_seconds'] - 750) <= 1
+    assert suggestion['fits']
+
+    # 1250 s with 8 processes, 625 s with 16: neither fits
+    suggestion = estimator.suggest_resources(
+        sizes, 8, max_num_machines=2, max_wallclock_seconds=500,
+        safety_factor=1.2)
+    assert not suggestion['fits']
+    assert suggestion['resources']['num_machines'] == 2
+    assert suggestion['max_wallclock_seconds'] == 500
+
+    with pytest.raises(ValueError):
+        ResourceEstimator.fit(records[:3])
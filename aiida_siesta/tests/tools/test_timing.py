@@ -0,0 +1,33 @@
+#!/usr/bin/env python
+# -*- coding: utf-8 -*-
+
+
+def test_analyze_timings():
+    """The calculations far from the rest are flagged."""
+    import numpy as np
+    from aiida_siesta.tools.timing import analyze_timings, summarize_by
+
+    records = [{
+        'pk': pk,
+        'computer': 'cluster',
+        'code': 'siesta',
+        'global_time': 100.0 + pk,
+        'no_u': 1000,
+        'mesh': [30, 30, 30],
+        'num_scf_iterations': 20,
+    } for pk in range(10)]
+    # Ten times slower than the others
+    records[3]['global_time'] = 1000.0
+    # Without SCF iterations recorded, and outside of the mesh range
+    records[5]['num_scf_iterations'] = None
+    records[7]['mesh'] = [60, 60, 60]
+
+    table = analyze_timings(records, mesh_range=(None, 30**3))
+    assert list(table['pk']) == [0, 1, 2, 3, 4, 5, 6, 8, 9]
+    assert list(table['pk'][table['outlier']]) == [3]
+    assert table['time_per_orbital'][0] == 0.1
+    assert np.isnan(table['time_per_scf_iteration'][5])
+
+    (name, count, outliers, medians), = summarize_by(table, 'computer')
+    assert (name, count, outliers) == ('cluster', 9, 1)
+    assert np.isclose(medians['time_per_scf_iteration'], 5.25)
@@ -0,0 +1,229 @@
+# -*- coding: utf-8 -*-
+"""
+Density of states from the eigenvalues of a Siesta calculation, with the
+broadening chosen after the run, and a reader for the projected density
+of states (SystemLabel.PDOS) file.
+
+The eigenvalues can be those of an **eigenvalues_array** output node
+(see the 'retrieve_eigenvalues' setting) or of a **bands_array** one.
+The PDOS file has to be retrieved with the 'additional_retrieve_list'
+setting.
+"""
+import math
+
+import numpy as np
+
+try:
+    from xml.etree import cElementTree as ElementTree
+except ImportError:
+    from xml.etree import ElementTree
+
+# Maximum number of (energy, eigenvalue) pairs evaluated at a time
+MAX_CHUNK_ELEMENTS = 4 * 1024 * 1024
+
+
+def gaussian(x):
+    """
+    Gaussian approximation to the delta function, of unit width.
+    """
+    return np.exp(-x * x) / math.sqrt(math.pi)
+
+
+def methfessel_paxton(x, order=1):
+    """
+    Methfessel-Paxton approximation of the given order to the delta
+    function, of unit width (Phys. Rev. B 40, 3616 (1989)). Order 0 is
+    the gaussian one.
+    """
+    gauss = np.exp(-x * x)
+    delta = gauss.copy()
+    # Hermite polynomials, by H_{k+1} = 2x H_k - 2k H_{k-1}
+    h_prev, h = np.ones_like(x), 2.0 * x
+    k = 1
+    coeff = 1.0
+    for n in range(1, order + 1):
+        h_prev, h = h, 2.0 * x * h - 2.0 * k * h_prev
+        k += 1
+        # h is H_{2n} here
+        coeff *= -1.0 / (4.0 * n)
+        delta += coeff * h * gauss
+        h_prev, h = h, 2.0 * x * h - 2.0 * k * h_prev
+        k += 1
+    return delta / math.sqrt(math.pi)
+
+
+def compute_dos(eigenvalues, energies, sigma, weights=None,
+                method='gaussian', order=1,
+                max_chunk_elements=MAX_CHUNK_ELEMENTS):
+    """
+    Computes the density of states on a grid of energies.
+
+    :param eigenvalues: array (nk, nbands), or (nspin, nk, nbands)
+    :param energies: 1-d array with the energy grid
+    :param sigma: the broadening (same units as the energies)
+    :param weights: the weights (nk) of the k-points. If None, all the
+        k-points have the same weight. They are normalized to 1.
+    :param method: 'gaussian' or 'methfessel-paxton'
+    :param order: the order of the Methfessel-Paxton broadening
+    :param max_chunk_elements: the grid is evaluated in slices, so that
+        no more than this number of (energy, eigenvalue) pairs are held
+        in memory at a time
+    :return: array (len(energies)), or (nspin, len(energies)), in
+        states per unit energy and per spin channel
+    """
+    if method == 'gaussian':
+        delta = gaussian
+    elif method == 'methfessel-paxton':
+        delta = lambda x: methfessel_paxton(x, order)
+    else:
+        raise ValueError("Unknown broadening method '{}'".format(method))
+
+    eigenvalues = np.asarray(eigenvalues, dtype=float)
+    energies = np.asarray(energies, dtype=float)
+    spin_polarized = eigenvalues.ndim == 3
+    if not spin_polarized:
+        eigenvalues = eigenvalues[np.newaxis]
+    nspin, nkpoints, nbands = eigenvalues.shape
+
+    if weights is None:
+        weights = np.ones(nkpoints)
+    weights = np.asarray(weights, dtype=float)
+    weights = weights / weights.sum()
+    # One weight per eigenvalue
+    eig_weights = np.repeat(weights, nbands)
+
+    chunk = max(1, max_chunk_elements // (nkpoints * nbands))
+    dos = np.zeros((nspin, len(energies)))
+    for ispin in range(nspin):
+        eigs = eigenvalues[ispin].reshape(-1)
+        for start in range(0, len(energies), chunk):
+            grid = energies[start:start + chunk]
+            x = (grid[:, np.newaxis] - eigs[np.newaxis, :]) / sigma
+            dos[ispin, start:start + chunk] = np.dot(delta(x), eig_weights)
+    dos /= sigma
+
+    if spin_polarized:
+        return dos
+    return dos[0]
+
+
+def get_dos_from_bands(bandsdata, energies, sigma, **kwargs):
+    """
+    Computes the density of states for the eigenvalues in a BandsData
+    node (with its k-point weights, if it has them). The other
+    arguments are those of compute_dos.
+    """
+    eigenvalues = bandsdata.get_bands()
+    try:
+        _, weights = bandsdata.get_kpoints(also_weights=True)
+    except AttributeError:
+        weights = None
+    return compute_dos(eigenvalues, energies, sigma, weights=weights,
+                       **kwargs)
+
+
+class ProjectedDOS(object):
+    """
+    The contents of a Siesta PDOS file:
+
+    * energies: the energy grid (eV)
+    * pdos: array (norbitals, nenergies), or (nspin, norbitals,
+      nenergies) for spin-polarized calculations
+    * orbitals: a list with a dictionary per orbital, with its
+      'index', 'atom_index', 'species', 'n', 'l', 'm', 'z' and 'P'
+    """
+
+    def __init__(self, energies, pdos, orbitals):
+        self.energies = energies
+        self.pdos = pdos
+        self.orbitals = orbitals
+
+    def select(self, **filters):
+        """
+        Returns the indices of the orbitals with the given attributes,
+        e.g. select(species='Si', l=1).
+        """
+        return np.array([
+            i for i, orbital in enumerate(self.orbitals)
+            if all(orbital.get(k) == v for k, v in filters.items())
+        ], dtype=int)
+
+    def get_projection(self, **filters):
+        """
+        Returns the sum of the PDOS over the orbitals with the given
+        attributes (see select).
+        """
+        return self.pdos[..., self.select(**filters), :].sum(axis=-2)
+
+
+_INT_ATTRIBUTES = ['index', 'atom_index', 'n', 'l', 'm', 'z']
+
+
+def read_pdos_file(pdos_path, dtype=np.float64):
+    """
+    Reads a Siesta PDOS (XML) file, incrementally: the text of each
+    orbital is converted into its slice of a preallocated array, and
+    discarded.
+
+    :param pdos_path: path to the file
+    :param dtype: the float type of the PDOS array
+    :return: a ProjectedDOS
+    :raise ValueError: if the file is inconsistent
+    """
+    nspin = None
+    norbitals = None
+    energies = None
+    pdos = None
+    orbitals = []
+
+    context = ElementTree.iterparse(pdos_path, events=('start', 'end'))
+    root = None
+    for event, elem in context:
+        if event == 'start':
+            if root is None:
+                root = elem
+            continue
+
+        tag = elem.tag
+        if tag == 'nspin':
+            nspin = int(elem.text)
+        elif tag == 'norbitals':
+            norbitals = int(elem.text)
+        elif tag == 'energy_values':
+            energies = np.fromstring(elem.text, sep=' ')
+        elif tag == 'orbital':
+            if pdos is None:
+                if nspin is None or norbitals is None or energies is None:
+                    raise ValueError("Missing header in {}".format(pdos_path))
+                pdos = np.empty((nspin, norbitals, len(energies)),
+                                dtype=dtype)
+            iorb = len(orbitals)
+            if iorb >= norbitals:
+                raise ValueError("More than {} orbitals in {}".format(
+                    norbitals, pdos_path))
+            # One line per energy, with a column per spin
+            data = np.fromstring(elem.find('data').text, dtype=dtype,
+                                 sep=' ')
+            if len(data) != nspin * len(energies):
+                raise ValueError("Wrong number of values for orbital {} "
+                                 "in {}".format(iorb + 1, pdos_path))
+            pdos[:, iorb, :] = data.reshape(len(energies), nspin).T
+
+            orbital = dict(elem.attrib)
+            for name in _INT_ATTRIBUTES:
+                if name in orbital:
+                    orbital[name] = int(orbital[name])
+            orbitals.append(orbital)
+        else:
+            continue
+
+        if elem is not root:
+            root.remove(elem)
+
+    if pdos is None or len(orbitals) != norbitals:
+        raise ValueError("Found {} orbitals in {} instead of {}".format(
+            len(orbitals), pdos_path, norbitals))
+
+    if nspin == 1:
+        pdos = pdos[0]
+    return ProjectedDOS(energies, pdos, orbitals)
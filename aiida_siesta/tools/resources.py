@@ -0,0 +1,344 @@
+# -*- coding: utf-8 -*-
+"""
+Estimates of the wall time and memory of a Siesta calculation, from a
+model fitted to past calculations in the database, and the resources
+and 'max_wallclock_seconds' to request for it.
+
+The model is a power law in quantities that are known before the
+calculation is submitted (see get_input_sizes): the number of orbitals,
+of mesh points and of k-points, and the number of MPI processes. It is
+fitted by least squares on the logarithms of the values recorded by
+the parser ('no_u', 'mesh', 'global_time' and 'max_dynamic_memory').
+"""
+import math
+
+import numpy as np
+
+# Variables of the model
+FEATURES = ['no_u', 'mesh_points', 'nkpoints', 'nprocs']
+
+# Orbitals per atom for each basis size, for elements with a valence
+# s shell only (H, He), s and p shells, or s and d shells (transition
+# metals), with polarization orbitals of the next l
+ORBITALS_PER_ATOM = {
+    'SZ': {'s': 1, 'sp': 4, 'sd': 6},
+    'SZP': {'s': 4, 'sp': 9, 'sd': 9},
+    'DZ': {'s': 2, 'sp': 8, 'sd': 12},
+    'DZP': {'s': 5, 'sp': 13, 'sd': 15},
+}
+
+_S_ELEMENTS = ['H', 'He']
+_D_ELEMENTS = [
+    'Sc', 'Ti', 'V', 'Cr', 'Mn', 'Fe', 'Co', 'Ni', 'Cu', 'Zn', 'Y', 'Zr',
+    'Nb', 'Mo', 'Tc', 'Ru', 'Rh', 'Pd', 'Ag', 'Cd', 'La', 'Hf', 'Ta', 'W',
+    'Re', 'Os', 'Ir', 'Pt', 'Au', 'Hg'
+]
+
+# Rydberg in eV
+_RY_TO_EV = 13.605698066
+
+# Number of the most recent calculations the model is fitted to
+DEFAULT_HISTORY_LIMIT = 500
+
+
+def _fdf_key(key):
+    # Siesta ignores case, '-', '_' and '.' in the fdf labels
+    return key.lower().replace('-', '').replace('_', '').replace('.', '')
+
+
+def _get_fdf_value(dictionary, key, default=None):
+    for k, v in dictionary.items():
+        if _fdf_key(k) == _fdf_key(key):
+            return v
+    return default
+
+
+def get_basis_sizes(basis):
+    """
+    Returns the default basis size and a dictionary {species: size}
+    of the 'pao-basis-size' and '%block pao-basis-sizes' entries of a
+    basis dictionary (as the 'basis' input of SiestaCalculation).
+    """
+    default = _get_fdf_value(basis, 'pao-basis-size', 'DZP').upper()
+    sizes = {}
+    block = _get_fdf_value(basis, '%block pao-basis-sizes')
+    if block:
+        for line in block.splitlines():
+            tokens = line.split()
+            if len(tokens) >= 2:
+                sizes[tokens[0]] = tokens[1].upper()
+    return default, sizes
+
+
+def estimate_num_orbitals(kinds, basis):
+    """
+    Returns the number of orbitals of a structure for a basis.
+
+    :param kinds: a list with the (kind name, element symbol) of every
+        site
+    :param basis: the basis dictionary
+    :raise ValueError: for basis sizes other than those of
+        ORBITALS_PER_ATOM
+    """
+    default, sizes = get_basis_sizes(basis)
+    no_u = 0
+    for name, symbol in kinds:
+        size = sizes.get(name, default)
+        if size not in ORBITALS_PER_ATOM:
+            raise ValueError("Unknown basis size '{}'".format(size))
+        if symbol in _S_ELEMENTS:
+            shells = 's'
+        elif symbol in _D_ELEMENTS:
+            shells = 'sd'
+        else:
+            shells = 'sp'
+        no_u += ORBITALS_PER_ATOM[size][shells]
+    return no_u
+
+
+def parse_mesh_cutoff(value):
+    """
+    Returns the mesh cutoff, in Ry, of an fdf value such as '200 Ry'
+    or '2720 eV' (Ry if there are no units).
+    """
+    tokens = str(value).split()
+    cutoff = float(tokens[0])
+    if len(tokens) > 1 and tokens[1].lower() == 'ev':
+        cutoff /= _RY_TO_EV
+    return cutoff
+
+
+def estimate_mesh_points(cell, mesh_cutoff):
+    """
+    Returns the number of points of the real-space mesh of a cell
+    (in Angstrom) for a mesh cutoff (in Ry). Siesta takes a mesh
+    spacing of at most pi/sqrt(cutoff) Bohr along each lattice vector.
+    """
+    from aiida.common.constants import bohr_to_ang
+
+    spacing = math.pi / math.sqrt(mesh_cutoff) * bohr_to_ang
+    lengths = np.sqrt((np.asarray(cell, dtype=float)**2).sum(axis=1))
+    return int(np.prod(np.ceil(lengths / spacing)))
+
+
+def count_kpoints(kpoints):
+    """
+    Returns the number of k-points of a KpointsData (given as a mesh
+    or as a list).
+    """
+    try:
+        mesh, _ = kpoints.get_kpoints_mesh()
+        return int(np.prod(mesh))
+    except AttributeError:
+        return len(kpoints.get_kpoints())
+
+
+def get_input_sizes(structure, parameters, basis, kpoints=None):
+    """
+    Returns the number of orbitals, of mesh points and of k-points of
+    the inputs of a SiestaCalculation (the structure, the parameters
+    and basis dictionaries, and the KpointsData, if any).
+    """
+    kinds = [(site.kind_name, structure.get_kind(site.kind_name).symbol)
+             for site in structure.sites]
+    mesh_cutoff = parse_mesh_cutoff(
+        _get_fdf_value(parameters, 'mesh-cutoff', '100 Ry'))
+    return {
+        'no_u': estimate_num_orbitals(kinds, basis),
+        'mesh_points': estimate_mesh_points(structure.cell, mesh_cutoff),
+        'nkpoints': count_kpoints(kpoints) if kpoints is not None else 1,
+    }
+
+
+def query_history(code=None, computer=None, filters=None, limit=None,
+                  batch_size=500):
+    """
+    Yields the sizes, number of MPI processes, global time and
+    maximum memory per process (None if not recorded) of past
+    SiestaCalculations, as dictionaries with the keys of FEATURES and
+    'global_time' and 'max_dynamic_memory'. The values are fetched
+    with batched QueryBuilder projections, newest calculations first.
+
+    :param code: the label of the code
+    :param computer: the name of the computer
+    :param filters: other QueryBuilder filters on the calculations
+    :param limit: the maximum number of calculations (the most recent
+        ones), or None for all
+    """
+    from aiida.orm.querybuilder import QueryBuilder
+    from aiida.orm.code import Code
+    from aiida.orm.computer import Computer
+    from aiida.orm.data.parameter import ParameterData
+    from aiida.orm.data.array.kpoints import KpointsData
+    from aiida_siesta.calculations.siesta import SiestaCalculation
+
+    qb = QueryBuilder()
+    qb.append(SiestaCalculation, tag='calc', filters=filters or {},
+              project=['attributes.jobresource_params'])
+    if computer:
+        qb.append(Computer, computer_of='calc',
+                  filters={'name': computer})
+    if code:
+        qb.append(Code, input_of='calc', filters={'label': code})
+    qb.append(ParameterData, output_of='calc',
+              edge_filters={'label': 'output_parameters'},
+              project=[
+                  'attributes.no_u', 'attributes.mesh',
+                  'attributes.global_time', 'attributes.max_dynamic_memory'
+              ])
+    qb.append(KpointsData, input_of='calc', outerjoin=True,
+              edge_filters={'label': 'kpoints'},
+              project=['attributes.mesh', 'attributes.array|kpoints'])
+
+    qb.order_by({'calc': [{'id': {'order': 'desc'}}]})
+    if limit:
+        qb.limit(limit)
+
+    for resources, no_u, mesh, global_time, memory, kmesh, klist in \
+            qb.iterall(batch_size=batch_size):
+        if not (no_u and mesh and global_time and resources):
+            continue
+        nprocs = resources.get('num_machines', 1) * resources.get(
+            'num_mpiprocs_per_machine', 1)
+        if kmesh:
+            nkpoints = int(np.prod(kmesh))
+        elif klist:
+            nkpoints = int(klist[0])
+        else:
+            nkpoints = 1
+        yield {
+            'no_u': no_u,
+            'mesh_points': int(np.prod(mesh)),
+            'nkpoints': nkpoints,
+            'nprocs': nprocs,
+            'global_time': global_time,
+            'max_dynamic_memory': memory,
+        }
+
+
+def _design_matrix(records):
+    return np.array(
+        [[1.0] + [math.log(r[f]) for f in FEATURES] for r in records])
+
+
+def _fit(records, target):
+    records = [r for r in records if r.get(target)]
+    if len(records) <= len(FEATURES):
+        return None
+    y = np.log([r[target] for r in records])
+    # (degenerate directions, e.g. all runs with a single k-point,
+    # get a zero coefficient)
+    coefficients = np.linalg.lstsq(_design_matrix(records), y, rcond=-1)[0]
+    return coefficients
+
+
+class ResourceEstimator(object):
+    """
+    Power-law model of the global time (s) and of the memory per
+    process (MB) of Siesta calculations:
+
+        time = exp(c0) * no_u**c1 * mesh_points**c2 * nkpoints**c3 * nprocs**c4
+
+    with the coefficients (c0, ..., c4) fitted to past calculations
+    (see fit). The memory model is None if no calculations with the
+    memory recorded were available.
+    """
+
+    def __init__(self, time_coefficients, memory_coefficients=None):
+        self.time_coefficients = np.asarray(time_coefficients)
+        self.memory_coefficients = None
+        if memory_coefficients is not None:
+            self.memory_coefficients = np.asarray(memory_coefficients)
+
+    @classmethod
+    def fit(cls, records):
+        """
+        Fits the model to a list of dictionaries, as those of
+        query_history.
+
+        :raise ValueError: if there are not enough calculations
+        """
+        records = list(records)
+        time_coefficients = _fit(records, 'global_time')
+        if time_coefficients is None:
+            raise ValueError("At least {} calculations are needed to fit "
+                             "the model, found {}".format(
+                                 len(FEATURES) + 1, len(records)))
+        return cls(time_coefficients, _fit(records, 'max_dynamic_memory'))
+
+    @classmethod
+    def from_database(cls, code=None, computer=None, filters=None,
+                      limit=DEFAULT_HISTORY_LIMIT):
+        """
+        Fits the model to the most recent past calculations (at most
+        limit, or all if None) of a code and/or on a computer (see
+        query_history).
+        """
+        return cls.fit(query_history(code, computer, filters, limit))
+
+    def _evaluate(self, coefficients, sizes, nprocs):
+        record = dict(sizes, nprocs=nprocs)
+        return float(np.exp(np.dot(_design_matrix([record])[0],
+                                   coefficients)))
+
+    def predict_time(self, sizes, nprocs):
+        """
+        Returns the predicted wall time (s) for the sizes (a dictionary
+        as those of get_input_sizes) and the number of MPI processes.
+        """
+        return self._evaluate(self.time_coefficients, sizes, nprocs)
+
+    def predict_memory(self, sizes, nprocs):
+        """
+        Returns the predicted memory per process (MB), or None if
+        there is no memory model.
+        """
+        if self.memory_coefficients is None:
+            return None
+        return self._evaluate(self.memory_coefficients, sizes, nprocs)
+
+    def suggest_resources(self, sizes, num_mpiprocs_per_machine,
+                          max_num_machines=16, max_wallclock_seconds=None,
+                          memory_per_machine=None, safety_factor=1.5):
+        """
+        Returns the smallest number of machines for which the predicted
+        time (times safety_factor) is within max_wallclock_seconds and
+        the predicted memory fits in memory_per_machine (MB), or the
+        fastest one if none does.
+
+        :return: a dictionary with the 'resources' and
+            'max_wallclock_seconds' (the predicted time times
+            safety_factor, at most max_wallclock_seconds) to use in the
+            options of the calculation, the 'predicted_time' (s) and
+            'predicted_memory' (MB per process, or None), and 'fits'
+            (False if no number of machines meets the limits, so that
+            the calculation is expected to run out of time or memory)
+        """
+        best = None
+        for num_machines in range(1, max_num_machines + 1):
+            nprocs = num_machines * num_mpiprocs_per_machine
+            walltime = safety_factor * self.predict_time(sizes, nprocs)
+            memory = self.predict_memory(sizes, nprocs)
+            fits = (memory is None or memory_per_machine is None or
+                    memory * num_mpiprocs_per_machine <= memory_per_machine)
+            suggestion = {
+                'resources': {
+                    'num_machines': num_machines,
+                    'num_mpiprocs_per_machine': num_mpiprocs_per_machine,
+                },
+                'max_wallclock_seconds': int(math.ceil(walltime)),
+                'predicted_time': walltime / safety_factor,
+                'predicted_memory': memory,
+                'fits': False,
+            }
+            if fits and (max_wallclock_seconds is None
+                         or walltime <= max_wallclock_seconds):
+                suggestion['fits'] = True
+                return suggestion
+            if best is None or walltime < best['max_wallclock_seconds']:
+                best = suggestion
+
+        if max_wallclock_seconds is not None:
+            best['max_wallclock_seconds'] = min(
+                best['max_wallclock_seconds'], max_wallclock_seconds)
+        return best
@@ -0,0 +1,188 @@
+# -*- coding: utf-8 -*-
+"""
+Timing analytics across Siesta calculations: the global time of every
+calculation is normalized by its number of orbitals, of mesh points and
+of SCF iterations, and the calculations far from the rest are flagged
+as outliers (e.g. misconfigured nodes or bad parallel settings).
+
+The values are fetched from the output parameters with batched
+QueryBuilder projections (see query_timings), without loading the
+nodes, and analyzed in arrays (see analyze_timings).
+"""
+import numpy as np
+
+# Metrics of analyze_timings, by name
+METRICS = ['time_per_orbital', 'time_per_mesh_point', 'time_per_scf_iteration']
+
+# Threshold of the modified z-score (Iglewicz and Hoaglin) for outliers
+DEFAULT_THRESHOLD = 3.5
+
+# Attributes of the output parameters projected by query_timings
+_PROJECTED_ATTRIBUTES = [
+    'global_time', 'no_u', 'mesh', 'num_scf_iterations',
+    'timing_decomposition'
+]
+
+
+def query_timings(code=None, computer=None, no_u_range=None, filters=None,
+                  limit=None, batch_size=500):
+    """
+    Yields the timing information of the SiestaCalculations that match
+    the selection, as dictionaries with the 'pk', 'computer' and
+    'code' of the calculation, and the 'global_time', 'no_u', 'mesh',
+    'num_scf_iterations' and 'timing_decomposition' of its output
+    parameters (None if missing). Calculations without timing
+    information are skipped.
+
+    :param code: the label of the code
+    :param computer: the name of the computer
+    :param no_u_range: a tuple (min, max) of the number of orbitals,
+        either of them can be None
+    :param filters: other QueryBuilder filters on the calculations
+    :param batch_size: the number of rows fetched at a time
+    """
+    from aiida.orm.querybuilder import QueryBuilder
+    from aiida.orm.code import Code
+    from aiida.orm.computer import Computer
+    from aiida.orm.data.parameter import ParameterData
+    from aiida_siesta.calculations.siesta import SiestaCalculation
+
+    params_filters = {}
+    if no_u_range is not None:
+        no_u_min, no_u_max = no_u_range
+        conditions = []
+        if no_u_min is not None:
+            conditions.append({'>=': no_u_min})
+        if no_u_max is not None:
+            conditions.append({'<=': no_u_max})
+        if conditions:
+            params_filters['attributes.no_u'] = {'and': conditions}
+
+    qb = QueryBuilder()
+    qb.append(SiestaCalculation, tag='calc', filters=filters or {},
+              project=['id'])
+    qb.append(Computer, computer_of='calc', tag='computer',
+              filters={'name': computer} if computer else {},
+              project=['name'])
+    qb.append(Code, input_of='calc', tag='code',
+              filters={'label': code} if code else {}, project=['label'])
+    qb.append(ParameterData, output_of='calc', tag='params',
+              edge_filters={'label': 'output_parameters'},
+              filters=params_filters,
+              project=['attributes.' + a for a in _PROJECTED_ATTRIBUTES])
+    qb.order_by({'calc': ['id']})
+    if limit:
+        qb.limit(limit)
+
+    for row in qb.iterall(batch_size=batch_size):
+        record = {'pk': row[0], 'computer': row[1], 'code': row[2]}
+        record.update(zip(_PROJECTED_ATTRIBUTES, row[3:]))
+        if record['global_time'] is None:
+            continue
+        yield record
+
+
+def robust_zscores(values):
+    """
+    Returns the modified z-scores of the values (by the median and
+    the median absolute deviation), with NaN for the NaN values. All
+    the scores are 0 if most values are equal.
+    """
+    values = np.asarray(values, dtype=float)
+    scores = np.full(values.shape, np.nan)
+    valid = ~np.isnan(values)
+    if not valid.any():
+        return scores
+
+    median = np.median(values[valid])
+    mad = np.median(np.abs(values[valid] - median))
+    if mad == 0:
+        scores[valid] = 0.0
+    else:
+        scores[valid] = 0.6745 * (values[valid] - median) / mad
+    return scores
+
+
+def analyze_timings(records, mesh_range=None, threshold=DEFAULT_THRESHOLD):
+    """
+    Normalizes the global times of the calculations, and flags the
+    outliers.
+
+    :param records: an iterable of dictionaries, as those of
+        query_timings
+    :param mesh_range: a tuple (min, max) of the number of mesh points
+        of the calculations to keep, either of them can be None
+    :param threshold: calculations with a modified z-score above it,
+        in absolute value, for any metric are outliers
+    :return: a dictionary of arrays, with an entry per calculation:
+        'pk', 'computer', 'code', 'global_time', 'no_u',
+        'mesh_points', 'num_scf_iterations' (NaN when missing), the
+        METRICS, their z-scores (e.g. 'time_per_orbital_zscore') and
+        'outlier' (booleans)
+    """
+    columns = dict((name, []) for name in [
+        'pk', 'computer', 'code', 'global_time', 'no_u', 'mesh_points',
+        'num_scf_iterations'
+    ])
+
+    for record in records:
+        mesh = record.get('mesh')
+        mesh_points = float(np.prod(mesh)) if mesh else np.nan
+        if mesh_range is not None:
+            mesh_min, mesh_max = mesh_range
+            if mesh_min is not None and not mesh_points >= mesh_min:
+                continue
+            if mesh_max is not None and not mesh_points <= mesh_max:
+                continue
+        columns['pk'].append(record['pk'])
+        columns['computer'].append(record.get('computer') or '')
+        columns['code'].append(record.get('code') or '')
+        for name in ['global_time', 'no_u', 'num_scf_iterations']:
+            value = record.get(name)
+            columns[name].append(np.nan if value is None else value)
+        columns['mesh_points'].append(mesh_points)
+
+    table = {
+        'pk': np.array(columns['pk'], dtype=int),
+        'computer': np.array(columns['computer'], dtype=str),
+        'code': np.array(columns['code'], dtype=str),
+    }
+    for name in ['global_time', 'no_u', 'mesh_points', 'num_scf_iterations']:
+        table[name] = np.array(columns[name], dtype=float)
+
+    # Zero sizes (e.g. no SCF iterations recorded) give NaN
+    with np.errstate(divide='ignore', invalid='ignore'):
+        for metric, size in zip(METRICS,
+                                ['no_u', 'mesh_points', 'num_scf_iterations']):
+            sizes = np.where(table[size] > 0, table[size], np.nan)
+            table[metric] = table['global_time'] / sizes
+
+    outlier = np.zeros(len(table['pk']), dtype=bool)
+    for metric in METRICS:
+        scores = robust_zscores(table[metric])
+        table[metric + '_zscore'] = scores
+        with np.errstate(invalid='ignore'):
+            outlier |= np.abs(scores) > threshold
+    table['outlier'] = outlier
+
+    return table
+
+
+def summarize_by(table, key='computer'):
+    """
+    Returns a list of tuples (value of key, number of calculations,
+    number of outliers, {metric: median}) for every value of a column
+    of the table of analyze_timings (e.g. 'computer' or 'code').
+    """
+    summary = []
+    for value in sorted(set(table[key])):
+        selected = table[key] == value
+        medians = {}
+        for metric in METRICS:
+            values = table[metric][selected]
+            values = values[~np.isnan(values)]
+            medians[metric] = float(np.median(values)) if len(values) \
+                else np.nan
+        summary.append((value, int(selected.sum()),
+                        int(table['outlier'][selected].sum()), medians))
+    return summary
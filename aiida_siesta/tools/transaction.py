@@ -0,0 +1,51 @@
+# -*- coding: utf-8 -*-
+"""
+Database transactions that work with both AiiDA backends.
+"""
+
+
+class BatchTransaction(object):
+    """
+    Context manager that stores everything done within it in a single
+    database transaction. Parts of it can be done within a savepoint
+    (see savepoint), so that a failure does not affect the others.
+
+    Nodes stored within it should use store(with_transaction=False).
+    """
+
+    def __init__(self):
+        from aiida.backends import settings
+        from aiida.backends.profile import BACKEND_DJANGO
+
+        self._django = settings.BACKEND == BACKEND_DJANGO
+        self._atomic = None
+        self._session = None
+
+    def __enter__(self):
+        if self._django:
+            from django.db import transaction
+            self._atomic = transaction.atomic()
+            self._atomic.__enter__()
+        else:
+            from aiida.backends.sqlalchemy import get_scoped_session
+            self._session = get_scoped_session()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self._django:
+            return self._atomic.__exit__(exc_type, exc_value, traceback)
+        if exc_type is None:
+            self._session.commit()
+        else:
+            self._session.rollback()
+        return False
+
+    def savepoint(self):
+        """
+        Returns a context manager that rolls back what is done within
+        it (only) if an exception is raised.
+        """
+        if self._django:
+            from django.db import transaction
+            return transaction.atomic()
+        return self._session.begin_nested()
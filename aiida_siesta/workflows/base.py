@@ -11,6 +11,7 @@ from aiida.work.workchain import WorkChain, ToContext, while_
 
 from aiida_siesta.data.psf import PsfData, get_pseudos_from_structure
 from aiida_siesta.calculations.siesta import SiestaCalculation
+from aiida_siesta.parsers.messages import classify_messages
 
 
 class SiestaBaseWorkChain(WorkChain):
@@ -34,6 +35,7 @@ class SiestaBaseWorkChain(WorkChain):
         spec.input('basis', valid_type=ParameterData)
         spec.input('settings', valid_type=ParameterData)
         spec.input('options', valid_type=ParameterData)
+        spec.input('resource_estimator', valid_type=ParameterData, required=False)
         spec.input('clean_workdir', valid_type=Bool, default=Bool(False))
         spec.input('max_iterations', valid_type=Int, default=Int(10))
         spec.outline(
@@ -86,12 +88,67 @@ class SiestaBaseWorkChain(WorkChain):
             self.ctx.has_parent_folder = True
             self.ctx.inputs['parent_folder'] = self.inputs.parent_folder
 
+        if 'resource_estimator' in self.inputs:
+            self.estimate_resources()
+
         # Prevent SiestaCalculation from being terminated by scheduler
         max_wallclock_seconds = self.ctx.inputs['_options']['max_wallclock_seconds']
         self.ctx.inputs['parameters']['max-walltime'] = max_wallclock_seconds
 
         return
 
+    def estimate_resources(self):
+        """
+        Set the resources and max_wallclock_seconds of the options from
+        the predictions of a model fitted to the previous calculations
+        of the code (see aiida_siesta.tools.resources). The
+        'resource_estimator' input has the 'num_mpiprocs_per_machine',
+        and optionally the 'max_num_machines', 'max_wallclock_seconds',
+        'memory_per_machine' (MB), 'safety_factor' and 'history_limit'
+        (the number of the most recent calculations to fit).
+        """
+        from aiida_siesta.tools.resources import (DEFAULT_HISTORY_LIMIT,
+                                                  ResourceEstimator,
+                                                  get_input_sizes)
+
+        config = self.inputs.resource_estimator.get_dict()
+        options = self.ctx.inputs['_options']
+        code = self.inputs.code
+
+        if 'num_mpiprocs_per_machine' not in config:
+            self.report('cannot estimate the resources, keeping the options: '
+                        'no num_mpiprocs_per_machine in the resource_estimator input')
+            return
+
+        try:
+            estimator = ResourceEstimator.from_database(
+                code=code.label, computer=code.get_computer().name,
+                limit=config.get('history_limit', DEFAULT_HISTORY_LIMIT))
+            sizes = get_input_sizes(self.inputs.structure,
+                                    self.ctx.inputs['parameters'],
+                                    self.ctx.inputs['basis'],
+                                    self.inputs.kpoints)
+            suggestion = estimator.suggest_resources(
+                sizes,
+                config['num_mpiprocs_per_machine'],
+                max_num_machines=config.get('max_num_machines', 16),
+                max_wallclock_seconds=config.get('max_wallclock_seconds',
+                                                 options.get('max_wallclock_seconds')),
+                memory_per_machine=config.get('memory_per_machine'),
+                safety_factor=config.get('safety_factor', 1.5))
+        except ValueError as e:
+            self.report('cannot estimate the resources, keeping the options: {}'.format(e))
+            return
+
+        options['resources'] = suggestion['resources']
+        options['max_wallclock_seconds'] = suggestion['max_wallclock_seconds']
+        self.report('estimated resources: {} machines, {} s (predicted time {:.0f} s)'.format(
+            suggestion['resources']['num_machines'],
+            suggestion['max_wallclock_seconds'], suggestion['predicted_time']))
+        if not suggestion['fits']:
+            self.report('no number of machines up to {} meets the limits: the calculation is expected to '
+                        'run out of time or memory'.format(config.get('max_num_machines', 16)))
+
     def validate_pseudo_potentials(self):
         """
         Validate the inputs related to pseudopotentials to check that we have the minimum required
@@ -274,8 +331,18 @@ class SiestaBaseWorkChain(WorkChain):
 
         if 'output_structure' in self.ctx.restart_calc.out:
             self.out('output_structure', self.ctx.restart_calc.out.output_structure)
+        if 'output_trajectory' in self.ctx.restart_calc.out:
+            self.out('output_trajectory', self.ctx.restart_calc.out.output_trajectory)
         if 'bands_array' in self.ctx.restart_calc.out:
             self.out('bands_array', self.ctx.restart_calc.out.bands_array)
+        if 'scf_history' in self.ctx.restart_calc.out:
+            self.out('scf_history', self.ctx.restart_calc.out.scf_history)
+
+        if 'timing_profile' in self.ctx.restart_calc.out:
+            self.out('timing_profile', self.ctx.restart_calc.out.timing_profile)
+
+        if 'eigenvalues_array' in self.ctx.restart_calc.out:
+            self.out('eigenvalues_array', self.ctx.restart_calc.out.eigenvalues_array)
 
     def _handle_submission_failure(self, calculation):
 
@@ -301,8 +368,30 @@ class SiestaBaseWorkChain(WorkChain):
         #        "warnings": [
         #        "FATAL: GEOM_NOT_CONV: Geometry relaxation not converged",
         #        "FATAL: ABNORMAL_TERMINATION"
-        
-        warnings_list = calculation.out.output_parameters.get_dict()['warnings']
+
+        # (e.g. no output files were retrieved)
+        if 'output_parameters' not in calculation.out:
+            self.abort_nowait('SiestaCalculation<{}> failed without output parameters'.format(
+                calculation.pk))
+            return
+
+        output_dict = calculation.out.output_parameters.get_dict()
+
+        # The parser classifies the messages, but older outputs
+        # only have the 'warnings' list
+        if 'message_flags' in output_dict:
+            flags = output_dict['message_flags']
+        else:
+            _, flags, _ = classify_messages(output_dict['warnings'])
+
+        # Siesta did not run, as pseudos linked to the remote cache were
+        # missing. The parser has dropped their records, so that the
+        # same inputs upload them again: the calculation is resubmitted
+        # unchanged, and it is not a restart_calc
+        if flags.get('pseudo_cache_missing', False):
+            self.report('Pseudos missing from the remote cache in SiestaCalculation<{}>: resubmitting'.format(
+                calculation.pk))
+            return
 
         # Formally we should be checking also for an OUT_OF_TIME fatal message,
         # but in this case Siesta attaches SCF or GEOM 'WARNING' lines, so the
@@ -314,24 +403,15 @@ class SiestaBaseWorkChain(WorkChain):
         
         # We should, however, report it:
         
-        self.ctx.out_of_time = False
-        for line in warnings_list:
-            if u'FATAL: OUT_OF_TIME' in line:
-                self.ctx.out_of_time = True
-                self.report('Out of time in SiestaCalculation<{}>'.format(calculation.pk))
+        self.ctx.out_of_time = flags['out_of_time']
+        if self.ctx.out_of_time:
+            self.report('Out of time in SiestaCalculation<{}>'.format(calculation.pk))
 
-        # Note again that we check for the strings themselves, and not
-        # for 'FATAL' or 'WARNING' qualifiers
+        # Note again that the flags come from the strings themselves, and
+        # not from 'FATAL' or 'WARNING' qualifiers
         
-        self.ctx.geometry_did_not_converge = False
-        for line in warnings_list:
-            if u'GEOM_NOT_CONV' in line:
-                self.ctx.geometry_did_not_converge = True
-
-        self.ctx.scf_did_not_converge = False
-        for line in warnings_list:
-            if u'SCF_NOT_CONV' in line:
-                self.ctx.scf_did_not_converge = True
+        self.ctx.geometry_did_not_converge = flags['geom_not_conv']
+        self.ctx.scf_did_not_converge = flags['scf_not_conv']
 
         # We might have run out of time during the analysis stage, which
         # includes the bands calculation